@@ -0,0 +1,108 @@
+"""All description outputs from a single parse.
+
+clean_html, add_beta_classes and the h3 extraction each parse a
+description of their own. analyze_description parses it once and hands the
+parse to each of them: the beta classes and the h3 unification are put
+back after their output is taken, and the cleaning, which rebuilds the
+tree, comes last. The outputs are the same as those of the separate runs.
+
+Analyses, selected by name:
+
+    clean  new_description, as clean_html
+    beta   beta_description, as add_beta_classes
+    h3     the h3 columns of extract_h3_from_descriptions
+    tags   the 'HTML Tags' sequence of extract_h3_from_descriptions
+
+A description over the limits of GUARD_CONFIG is not parsed here: its beta
+description is the description unchanged, its h3 fields are those of
+unparsed_h3_fields and clean_description applies its own guards.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import metrics
+from compatibility import H3_COLUMNS, extract_h3_fields, unparsed_h3_fields
+from functions import add_beta_classes, clean_description, has_markup, make_soup
+from guards import ResourceLimitExceeded, check_markup
+from metrics import StageTimer
+
+ANALYSES = ('clean', 'beta', 'h3', 'tags')
+TAGS_COLUMN = 'HTML Tags'
+H3_FIELD_COLUMNS = [column for column in H3_COLUMNS if column != TAGS_COLUMN]
+
+def analysis_columns(analyses: Sequence[str] = ANALYSES) -> List[str]:
+    """Return the output columns of the selected analyses, in a fixed order."""
+    columns = []
+    if 'clean' in analyses:
+        columns.append('new_description')
+    if 'beta' in analyses:
+        columns.append('beta_description')
+    if 'h3' in analyses:
+        columns.extend(H3_FIELD_COLUMNS)
+    if 'tags' in analyses:
+        columns.append(TAGS_COLUMN)
+    return columns
+
+def analyze_description(html: str, analyses: Sequence[str] = ANALYSES, product_code: Optional[str] = None,
+                        parser: Optional[str] = None) -> dict:
+    """Parse a description once and compute the selected analyses from that parse.
+
+    Missing descriptions get the h3 fields of an empty one, as
+    extract_h3_from_descriptions fills them with '' first.
+    """
+    unknown = set(analyses) - set(ANALYSES)
+    if unknown:
+        raise ValueError(f"Unknown analyses {', '.join(sorted(unknown))}, expected some of {', '.join(ANALYSES)}")
+    timer = StageTimer(metrics.active())
+    text = html if isinstance(html, str) else ''
+    wants_h3 = 'h3' in analyses or 'tags' in analyses
+    try:
+        check_markup(text)
+    except ResourceLimitExceeded:
+        return analyze_unparsed(html, analyses, product_code, parser)
+    soup = None
+    # Cleaning alone parses only if it needs the tree path
+    if wants_h3 or ('beta' in analyses and has_markup(text)):
+        soup = make_soup(text, parser)
+        timer.lap('analysis.parse')
+
+    result = {}
+    if 'beta' in analyses:
+        result['beta_description'] = add_beta_classes(html, parser, soup)
+    if wants_h3:
+        fields = extract_h3_fields(text, parser, soup)
+        if 'h3' in analyses:
+            for column in H3_FIELD_COLUMNS:
+                result[column] = fields[column]
+        if 'tags' in analyses:
+            result[TAGS_COLUMN] = fields[TAGS_COLUMN]
+        timer.lap('analysis.h3')
+    if 'clean' in analyses:
+        result['new_description'] = clean_description(html, product_code, parser, soup)
+    return {column: result[column] for column in analysis_columns(analyses)}
+
+def analyze_unparsed(html: str, analyses: Sequence[str], product_code: Optional[str] = None,
+                     parser: Optional[str] = None) -> dict:
+    """Analyze a description over the resource limits without parsing it."""
+    metrics.count('analysis.guard_unparsed')
+    result = {'beta_description': html, **unparsed_h3_fields(html if isinstance(html, str) else '')}
+    if 'clean' in analyses:
+        result['new_description'] = clean_description(html, product_code, parser)
+    return {column: result[column] for column in analysis_columns(analyses)}
+
+def analyze_columns(rows: Iterable[Tuple[str, Optional[str]]], analyses: Sequence[str] = ANALYSES,
+                    parser: Optional[str] = None) -> Dict[str, List]:
+    """Analyze (description, product_code) rows and return one list per output column."""
+    columns: Dict[str, List] = {column: [] for column in analysis_columns(analyses)}
+    appends = [(columns[column].append, column) for column in columns]
+    for html, product_code in rows:
+        result = analyze_description(html, analyses, product_code, parser)
+        for append, column in appends:
+            append(result[column])
+    return columns
+
+def analyze_columns_with_metrics(rows: List[Tuple[str, Optional[str]]],
+                                 analyses: Sequence[str] = ANALYSES) -> Tuple[Dict[str, List], dict]:
+    """Analyze a chunk like analyze_columns and return its stage metrics as well."""
+    stage_metrics = metrics.StageMetrics()
+    with metrics.collecting(stage_metrics):
+        columns = analyze_columns(rows, analyses)
+    return columns, stage_metrics.to_dict()
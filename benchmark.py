@@ -0,0 +1,256 @@
+"""Throughput benchmark for the description cleaning functions.
+
+Generates a synthetic corpus of Shoper-style descriptions and measures
+docs/sec, per-document latency percentiles and peak memory for clean_html,
+add_beta_classes and the h3 extraction. Results can be stored as named
+baselines and later runs compared against them.
+
+    python benchmark.py --docs 500 --save-baseline main
+    python benchmark.py --docs 500 --compare main
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from config import BENCHMARK_CONFIG
+from compatibility import extract_h3_fields
+from fragments import shared_fragment_cache
+from functions import add_beta_classes, clean_description
+
+WORDS = [
+    'etui', 'pancernik', 'ochrona', 'wytrzymałe', 'szkło', 'hartowane', 'iPhone', 'Samsung',
+    'Galaxy', 'magnetyczne', 'ładowanie', 'bezprzewodowe', 'kolor', 'czarny', 'przezroczysty',
+    'odporność', 'na', 'upadki', 'i', 'zarysowania', 'idealnie', 'dopasowane', 'do', 'telefonu',
+    'materiał', 'TPU', 'poliwęglan', 'MagSafe', 'gwarancja', 'producenta', 'zestaw', 'zawiera',
+]
+STYLES = [
+    'font-size: 12pt;', 'color: #000000;', 'font-family: Arial, sans-serif;',
+    'line-height: 1.5;', 'text-align: justify;', 'margin: 0px;',
+]
+
+def sentence(rng: random.Random, min_words: int = 4, max_words: int = 18) -> str:
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return ' '.join(words).capitalize() + rng.choice(['.', '.', '!', ':'])
+
+def styled_soup(rng: random.Random, depth: int = 0) -> str:
+    """Nested span/div/font markup as pasted from old editors."""
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        roll = rng.random()
+        if depth < 4 and roll < 0.35:
+            tag = rng.choice(['span', 'div', 'font', 'span'])
+            attr = f' style="{rng.choice(STYLES)}"' if tag != 'font' else ' face="Arial" size="2"'
+            parts.append(f'<{tag}{attr}>{styled_soup(rng, depth + 1)}</{tag}>')
+        elif roll < 0.5:
+            parts.append(f'<strong>{sentence(rng, 2, 5)}</strong> ')
+        elif roll < 0.6:
+            parts.append(f'<b>{sentence(rng, 1, 3)}</b>&nbsp;')
+        elif roll < 0.7:
+            parts.append('<br>' * rng.randint(1, 3))
+        else:
+            parts.append(sentence(rng))
+    return ''.join(parts)
+
+def product_info_block(rng: random.Random) -> str:
+    rows = ''.join(
+        f'<div class="row"><span class="label">{rng.choice(WORDS)}</span>'
+        f'<span class="value">{sentence(rng, 1, 4)}</span></div>'
+        for _ in range(rng.randint(3, 8))
+    )
+    return f'<div class="product-info">{rows}</div>'
+
+def iframe_block(rng: random.Random) -> str:
+    iframe = (f'<iframe width="560" height="315" src="https://www.youtube.com/embed/{rng.randint(10**9, 10**10)}"'
+              ' frameborder="0" allowfullscreen></iframe>')
+    if rng.random() < 0.5:
+        return f'<div class="fx-iframeContainer">{iframe}</div>'
+    return f'<p>{iframe}</p>'
+
+def h3_run(rng: random.Random) -> str:
+    return ''.join(
+        f'<h3><strong>{sentence(rng, 2, 6)}</strong>{"<br>" if rng.random() < 0.5 else ""}</h3>'
+        for _ in range(rng.randint(1, 4))
+    )
+
+def feature_list(rng: random.Random) -> str:
+    items = ''.join(
+        f'<li><p><span style="{rng.choice(STYLES)}">{sentence(rng, 2, 8)}</span></p></li>'
+        for _ in range(rng.randint(3, 10))
+    )
+    return f'<ul>{items}</ul>'
+
+def br_chain(rng: random.Random) -> str:
+    return f'<p>{sentence(rng)}{"<br />" * rng.randint(3, 20)}{sentence(rng)}</p>'
+
+def image_block(rng: random.Random) -> str:
+    return (f'<p style="text-align: center;"><img src="/userdata/public/assets/{rng.randint(1, 9999)}.jpg"'
+            f' alt="{rng.choice(WORDS)}" width="800" style="max-width: 100%;"> {sentence(rng, 1, 3)}</p>')
+
+SECTIONS: List[Callable[[random.Random], str]] = [
+    styled_soup, styled_soup, styled_soup, product_info_block, iframe_block,
+    h3_run, h3_run, feature_list, br_chain, image_block,
+]
+
+def generate_description(rng: random.Random, sections: Optional[int] = None) -> str:
+    """Build one synthetic description from a random mix of typical sections."""
+    count = sections or rng.randint(3, 25)
+    return '\n'.join(rng.choice(SECTIONS)(rng) for _ in range(count))
+
+def generate_corpus(docs: int, seed: int = 0) -> List[str]:
+    """Build a reproducible corpus of synthetic descriptions."""
+    rng = random.Random(seed)
+    return [generate_description(rng) for _ in range(docs)]
+
+OPERATIONS: Dict[str, Callable[[str], object]] = {
+    'clean_html': clean_description,
+    'add_beta_classes': add_beta_classes,
+    'extract_h3': extract_h3_fields,
+}
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def clear_fragment_cache() -> None:
+    """Start every pass cold, so fragments cleaned in an earlier pass are not reused."""
+    fragment_cache = shared_fragment_cache()
+    if fragment_cache is not None:
+        fragment_cache.clear()
+
+def measure(operation: Callable[[str], object], corpus: List[str]) -> Dict[str, float]:
+    """Time every document, then re-run the corpus under tracemalloc for peak memory."""
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        clear_fragment_cache()
+        started = time.perf_counter()
+        for html in corpus:
+            doc_started = time.perf_counter()
+            operation(html)
+            latencies.append(time.perf_counter() - doc_started)
+        elapsed = time.perf_counter() - started
+
+        clear_fragment_cache()
+        tracemalloc.start()
+        for html in corpus:
+            operation(html)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'docs_per_sec': len(corpus) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        'peak_memory_mb': peak / (1024 * 1024),
+    }
+
+def run_benchmark(docs: int, seed: int, operations: Optional[List[str]] = None) -> Dict[str, object]:
+    """Benchmark the selected operations on a synthetic corpus."""
+    corpus = generate_corpus(docs, seed)
+    results: Dict[str, object] = {
+        'meta': {
+            'docs': docs,
+            'seed': seed,
+            'corpus_bytes': sum(len(html.encode('utf-8')) for html in corpus),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+        }
+    }
+    for name in operations or list(OPERATIONS):
+        results[name] = measure(OPERATIONS[name], corpus)
+    return results
+
+def load_baselines(path: Path) -> Dict[str, dict]:
+    if not path.exists():
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baseline(name: str, results: Dict[str, object], path: Path) -> None:
+    baselines = load_baselines(path)
+    baselines[name] = results
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, ensure_ascii=False)
+
+def compare(results: Dict[str, object], baseline: Dict[str, object],
+            threshold: float = BENCHMARK_CONFIG['regression_threshold']) -> List[str]:
+    """Return a description of every metric that regressed by more than ``threshold``."""
+    regressions = []
+    for name, metrics in results.items():
+        if name == 'meta' or name not in baseline:
+            continue
+        old = baseline[name]
+        checks = [
+            ('docs_per_sec', old['docs_per_sec'] / metrics['docs_per_sec'] - 1 if metrics['docs_per_sec'] else 1.0),
+            ('p90_ms', metrics['p90_ms'] / old['p90_ms'] - 1 if old['p90_ms'] else 0.0),
+            ('peak_memory_mb', metrics['peak_memory_mb'] / old['peak_memory_mb'] - 1 if old['peak_memory_mb'] else 0.0),
+        ]
+        for metric, change in checks:
+            if change > threshold:
+                regressions.append(
+                    f"{name} {metric}: {old[metric]:.2f} -> {metrics[metric]:.2f} ({change:+.0%} worse)"
+                )
+    return regressions
+
+def print_results(results: Dict[str, object]) -> None:
+    meta = results['meta']
+    print(f"Corpus: {meta['docs']} docs, {meta['corpus_bytes'] / 1024:.0f} KiB, seed {meta['seed']}")
+    print(f"{'operation':<18}{'docs/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'peak MiB':>10}")
+    for name, metrics in results.items():
+        if name == 'meta':
+            continue
+        print(f"{name:<18}{metrics['docs_per_sec']:>10.1f}{metrics['p50_ms']:>10.2f}{metrics['p90_ms']:>10.2f}"
+              f"{metrics['p99_ms']:>10.2f}{metrics['max_ms']:>10.2f}{metrics['peak_memory_mb']:>10.2f}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the description cleaning functions.')
+    parser.add_argument('--docs', type=int, default=BENCHMARK_CONFIG['docs'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--operation', action='append', choices=list(OPERATIONS),
+                        help='operation to benchmark, may be repeated (default: all)')
+    parser.add_argument('--baselines', type=Path, default=BENCHMARK_CONFIG['baseline_path'])
+    parser.add_argument('--save-baseline', metavar='NAME', help='store the results under this name')
+    parser.add_argument('--compare', metavar='NAME', help='compare the results with a stored baseline')
+    parser.add_argument('--threshold', type=float, default=BENCHMARK_CONFIG['regression_threshold'],
+                        help='relative slowdown reported as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.docs, args.seed, args.operation)
+    print_results(results)
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results, args.baselines)
+        print(f"Saved baseline '{args.save_baseline}' to {args.baselines}")
+
+    if args.compare:
+        baseline = load_baselines(args.baselines).get(args.compare)
+        if baseline is None:
+            print(f"Baseline '{args.compare}' not found in {args.baselines}")
+            return 2
+        if baseline['meta']['docs'] != args.docs or baseline['meta']['seed'] != args.seed:
+            print("Warning: baseline was recorded with a different corpus")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions against '{args.compare}':")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions against '{args.compare}'")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
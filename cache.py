@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+import bs4
+from config import (
+    ALLOWED_TAGS, ALLOWED_ATTRS, BASE_DIR, BETA_CLASS_SUFFIX, CACHE_CONFIG, CONVERTIBLE_TAGS, FLATTENING_TAGS,
+    GUARD_CONFIG, HEADING_TAGS, HTML_PARSER, INLINE_TAGS, PRESERVED_CLASSES, VOID_TAGS
+)
+from guards import PassedThrough
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the stored entries changes; changes to the
+# cleaning code are picked up by code_fingerprint
+CACHE_VERSION = 1
+# Modules whose code decides the cleaned and beta-classed output
+CLEANING_MODULES = ('functions.py', 'fastpath.py', 'sanitizer.py', 'fragments.py', 'guards.py')
+
+@lru_cache(maxsize=None)
+def code_fingerprint(modules: Tuple[str, ...] = CLEANING_MODULES) -> str:
+    """Hash the cleaning code and the BeautifulSoup version, which decide the output as much as the config."""
+    digest = hashlib.sha256(bs4.__version__.encode('utf-8'))
+    for module in modules:
+        digest.update(b'\0')
+        digest.update((BASE_DIR / module).read_bytes())
+    return digest.hexdigest()
+
+def config_fingerprint() -> str:
+    """Hash the cleaning configuration and code so changes to either invalidate cached results."""
+    settings = {
+        'version': CACHE_VERSION,
+        'code': code_fingerprint(),
+        'allowed_tags': sorted(ALLOWED_TAGS),
+        'allowed_attrs': {tag: sorted(attrs) for tag, attrs in sorted(ALLOWED_ATTRS.items())},
+        'tag_rules': {
+            name: sorted(tags) for name, tags in (
+                ('convertible', CONVERTIBLE_TAGS), ('inline', INLINE_TAGS), ('heading', HEADING_TAGS),
+                ('flattening', FLATTENING_TAGS), ('void', VOID_TAGS), ('preserved_classes', PRESERVED_CLASSES),
+            )
+        },
+        'beta_class_suffix': BETA_CLASS_SUFFIX,
+        'html_parser': HTML_PARSER,
+        'guards': GUARD_CONFIG,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+class DescriptionCache:
+    """SQLite store of cleaned descriptions keyed by the raw HTML and the config.
+
+    Entries are namespaced by operation (``clean_html``, ``add_beta_classes``)
+    and evicted least-recently-used first once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, path: Union[str, Path] = CACHE_CONFIG['path'],
+                 max_entries: int = CACHE_CONFIG['max_entries']):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.fingerprint = config_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Vendor jobs run in threads, each with its own connection to the same file
+        self.connection = sqlite3.connect(str(self.path), timeout=30)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS descriptions ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)'
+        )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS descriptions_last_used ON descriptions (last_used)'
+        )
+        self.connection.commit()
+
+    def key(self, operation: str, raw_html: str) -> str:
+        """Build the content-addressed key for a raw description."""
+        digest = hashlib.sha256()
+        for part in (self.fingerprint, operation, raw_html):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get_many(self, operation: str, raw_htmls: Iterable[str]) -> Dict[str, str]:
+        """Return cached results for the given raw descriptions, keyed by raw HTML."""
+        keys = {self.key(operation, raw_html): raw_html for raw_html in set(raw_htmls)}
+        found: Dict[str, str] = {}
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            batch = key_list[i:i + 500]
+            rows = self.connection.execute(
+                f"SELECT key, value FROM descriptions WHERE key IN ({','.join('?' * len(batch))})",
+                batch
+            ).fetchall()
+            for key, value in rows:
+                found[keys[key]] = value
+
+        now = time.time()
+        self.connection.executemany(
+            'UPDATE descriptions SET last_used = ? WHERE key = ?',
+            [(now, self.key(operation, raw_html)) for raw_html in found]
+        )
+        self.connection.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, operation: str, items: Iterable[Tuple[str, str]]) -> None:
+        """Store (raw_html, result) pairs and evict old entries over the size limit.
+
+        Descriptions passed through over a resource limit are not stored.
+        """
+        now = time.time()
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO descriptions (key, value, last_used) VALUES (?, ?, ?)',
+            [(self.key(operation, raw_html), value, now) for raw_html, value in items
+             if isinstance(raw_html, str) and isinstance(value, str) and not isinstance(value, PassedThrough)]
+        )
+        self.evict()
+        self.connection.commit()
+
+    def evict(self) -> int:
+        """Drop least recently used entries beyond ``max_entries``."""
+        count = self.connection.execute('SELECT COUNT(*) FROM descriptions').fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        self.connection.execute(
+            'DELETE FROM descriptions WHERE key IN '
+            '(SELECT key FROM descriptions ORDER BY last_used LIMIT ?)',
+            (excess,)
+        )
+        logger.info(f"Evicted {excess} entries from description cache")
+        return excess
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return hit/miss counters for this run and the number of stored entries."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self.connection.execute('SELECT COUNT(*) FROM descriptions').fetchone()[0],
+        }
+
+    def close(self) -> None:
+        """Log statistics and close the database."""
+        stats = self.stats()
+        logger.info(
+            f"Description cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} entries stored"
+        )
+        self.connection.close()
+
+def open_cache(enabled: Optional[bool] = None) -> Optional[DescriptionCache]:
+    """Open the configured cache, or return None when caching is disabled."""
+    enabled = CACHE_CONFIG['enabled'] if enabled is None else enabled
+    if not enabled:
+        return None
+    try:
+        return DescriptionCache()
+    except Exception as e:
+        logger.error(f"Error opening description cache: {str(e)}")
+        return None
@@ -0,0 +1,352 @@
+"""Structure index of the catalog descriptions.
+
+Keeps per product the tag and attribute histograms, the nesting depth and
+flags telling which cleaning rules a description needs, as NumPy columns
+saved in one compressed .npz file. Queries are vectorized over the whole
+catalog:
+
+    python catalog_index.py build
+    python catalog_index.py summary
+    python catalog_index.py query --flag has_iframe --without is_clean
+    python catalog_index.py query --rule convert_span_div_font --codes
+
+Rebuilding reuses the rows of products whose description did not change,
+unless the cleaning configuration or code changed since the index was built.
+Descriptions are walked with an explicit stack, so deeply nested markup
+does not hit the recursion limit.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Union
+import numpy as np
+from bs4 import Tag
+from cache import config_fingerprint
+from config import (
+    ALLOWED_ATTR_SETS, ALLOWED_TAG_SET, CONVERTIBLE_TAGS, CSV_DELIMITER, FILE_PATHS, FLATTENING_TAGS, HEADING_TAGS,
+    INDEX_CONFIG, NO_ATTRS, PRESERVED_CLASSES
+)
+from fastpath import is_clean_description
+from functions import is_empty_tag, make_soup
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the columns or the meaning of a flag change
+INDEX_VERSION = 2
+TAG_COLUMNS = sorted(ALLOWED_TAG_SET | CONVERTIBLE_TAGS | {
+    'b', 'i', 'u', 'h1', 'h4', 'table', 'tr', 'td', 'script', 'style',
+}) + ['other']
+ATTR_COLUMNS = [
+    'style', 'class', 'id', 'href', 'target', 'src', 'alt', 'width', 'height', 'align', 'title', 'other',
+]
+FLAGS = [
+    'is_clean',               # the fast path returns the description unchanged
+    'has_inline_style',
+    'has_nested_p',           # <p> inside p, h2, h3 or li
+    'has_iframe',
+    'has_preserved_block',    # product-info, iframe container or iframe
+    'has_convertible_tags',   # span, div or font
+    'has_disallowed_tags',
+    'has_disallowed_attrs',
+    'has_strong_in_heading',
+    'has_consecutive_br',
+    'has_empty_tags',
+    'has_img_outside_p',
+    'has_unwrapped_h3',       # h3 content not in a single <em>
+]
+# Cleaning rule -> flag of the descriptions it changes
+RULE_FLAGS = {
+    'convert_span_div_font': 'has_convertible_tags',
+    'unwrap_disallowed_tags': 'has_disallowed_tags',
+    'strip_attributes': 'has_disallowed_attrs',
+    'flatten_nested_tags': 'has_nested_p',
+    'unwrap_strong_inside_headings': 'has_strong_in_heading',
+    'remove_consecutive_brs': 'has_consecutive_br',
+    'remove_empty_tags': 'has_empty_tags',
+    'wrap_img_in_p': 'has_img_outside_p',
+    'wrap_h3_content_in_em': 'has_unwrapped_h3',
+    'preserve_blocks': 'has_preserved_block',
+}
+TAG_INDEX = {tag: i for i, tag in enumerate(TAG_COLUMNS)}
+ATTR_INDEX = {attr: i for i, attr in enumerate(ATTR_COLUMNS)}
+FLAG_BITS = {flag: 1 << i for i, flag in enumerate(FLAGS)}
+
+def description_digest(html) -> int:
+    """Return a 64-bit hash of a description, to tell which rows changed."""
+    data = html.encode('utf-8') if isinstance(html, str) else b'\0'
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+def describe_structure(html: str, parser: Optional[str] = None) -> dict:
+    """Walk one description and return its histograms, depth, node count and flags.
+
+    Preserved blocks count as one node; the cleaning keeps their content as it is.
+    """
+    html = html if isinstance(html, str) else ''
+    tags: Counter = Counter()
+    attrs: Counter = Counter()
+    flags = {'is_clean'} if is_clean_description(html) else set()
+    depth = nodes = 0
+    soup = make_soup(html, parser)
+    # Stack entries: (tag, depth, inside_p_h_or_li, inside_heading)
+    stack = [(child, 1, False, False) for child in reversed(soup.contents) if isinstance(child, Tag)]
+    while stack:
+        tag, level, in_block, in_heading = stack.pop()
+        nodes += 1
+        depth = max(depth, level)
+        name = tag.name
+        tags[name if name in TAG_INDEX else 'other'] += 1
+        allowed_attrs = ALLOWED_ATTR_SETS.get(name, NO_ATTRS)
+        for attr in tag.attrs:
+            attr = attr.lower()
+            attrs[attr if attr in ATTR_INDEX else 'other'] += 1
+            if attr == 'style':
+                flags.add('has_inline_style')
+            if name in ALLOWED_TAG_SET and attr not in allowed_attrs:
+                flags.add('has_disallowed_attrs')
+
+        if name == 'iframe' or (name == 'div' and not PRESERVED_CLASSES.isdisjoint(tag.get('class') or ())):
+            flags.add('has_preserved_block')
+            if name == 'iframe':
+                flags.add('has_iframe')
+            continue
+        if name in CONVERTIBLE_TAGS:
+            flags.add('has_convertible_tags')
+        elif name not in ALLOWED_TAG_SET:
+            flags.add('has_disallowed_tags')
+        elif is_empty_tag(tag):
+            flags.add('has_empty_tags')
+        if name == 'p' and in_block:
+            flags.add('has_nested_p')
+        elif name == 'strong' and in_heading:
+            flags.add('has_strong_in_heading')
+        elif name == 'br':
+            previous = tag.previous_sibling
+            if isinstance(previous, Tag) and previous.name == 'br':
+                flags.add('has_consecutive_br')
+        elif name == 'img':
+            if tag.parent.name != 'p' or len(tag.parent.contents) > 1:
+                flags.add('has_img_outside_p')
+        elif name == 'h3':
+            contents = tag.contents
+            if not (len(contents) == 1 and isinstance(contents[0], Tag) and contents[0].name == 'em'):
+                flags.add('has_unwrapped_h3')
+
+        child_flags = (in_block or name in FLATTENING_TAGS, in_heading or name in HEADING_TAGS)
+        stack.extend(
+            (child, level + 1, *child_flags) for child in reversed(tag.contents) if isinstance(child, Tag)
+        )
+    return {'tags': tags, 'attrs': attrs, 'depth': depth, 'nodes': nodes, 'chars': len(html), 'flags': flags}
+
+class CatalogIndex:
+    """Structure columns of the catalog, one row per product."""
+
+    COLUMNS = ('codes', 'digests', 'tag_counts', 'attr_counts', 'depth', 'nodes', 'chars', 'flags')
+
+    def __init__(self, codes: np.ndarray, digests: np.ndarray, tag_counts: np.ndarray, attr_counts: np.ndarray,
+                 depth: np.ndarray, nodes: np.ndarray, chars: np.ndarray, flags: np.ndarray,
+                 fingerprint: Optional[str] = None):
+        self.codes = codes
+        self.digests = digests
+        self.tag_counts = tag_counts
+        self.attr_counts = attr_counts
+        self.depth = depth
+        self.nodes = nodes
+        self.chars = chars
+        self.flags = flags
+        # Cleaning configuration and code the flags were computed with
+        self.fingerprint = fingerprint or config_fingerprint()
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, codes: Sequence, descriptions: Sequence, parser: Optional[str] = None,
+              previous: Optional['CatalogIndex'] = None) -> 'CatalogIndex':
+        """Index the descriptions, reusing rows of ``previous`` whose code and description match.
+
+        Nothing is reused if ``previous`` was built with another cleaning
+        configuration or code, which decide the flags.
+        """
+        count = len(codes)
+        index = cls(
+            codes=np.array([str(code) for code in codes], dtype=str),
+            digests=np.array([description_digest(html) for html in descriptions], dtype=np.uint64),
+            tag_counts=np.zeros((count, len(TAG_COLUMNS)), dtype=np.uint32),
+            attr_counts=np.zeros((count, len(ATTR_COLUMNS)), dtype=np.uint32),
+            depth=np.zeros(count, dtype=np.uint32),
+            nodes=np.zeros(count, dtype=np.uint32),
+            chars=np.zeros(count, dtype=np.uint32),
+            flags=np.zeros(count, dtype=np.uint32),
+        )
+        known = {}
+        if previous is not None and previous.fingerprint != index.fingerprint:
+            logger.info("Cleaning configuration or code changed, indexing every product again")
+        elif previous is not None:
+            known = {(code, digest): row for row, (code, digest)
+                     in enumerate(zip(previous.codes.tolist(), previous.digests.tolist()))}
+        reused = 0
+        for row, (code, digest, html) in enumerate(zip(index.codes.tolist(), index.digests.tolist(), descriptions)):
+            old_row = known.get((code, digest))
+            if old_row is not None:
+                index.copy_row(row, previous, old_row)
+                reused += 1
+                continue
+            structure = describe_structure(html, parser)
+            for tag, amount in structure['tags'].items():
+                index.tag_counts[row, TAG_INDEX[tag]] = amount
+            for attr, amount in structure['attrs'].items():
+                index.attr_counts[row, ATTR_INDEX[attr]] = amount
+            index.depth[row] = structure['depth']
+            index.nodes[row] = structure['nodes']
+            index.chars[row] = structure['chars']
+            index.flags[row] = sum(FLAG_BITS[flag] for flag in structure['flags'])
+        if reused:
+            logger.info(f"Reused {reused} of {count} index rows")
+        return index
+
+    def copy_row(self, row: int, other: 'CatalogIndex', other_row: int) -> None:
+        for column in self.COLUMNS[2:]:
+            getattr(self, column)[row] = getattr(other, column)[other_row]
+
+    def save(self, path: Union[str, Path] = INDEX_CONFIG['path']) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f, version=np.array(INDEX_VERSION), tag_columns=np.array(TAG_COLUMNS),
+                attr_columns=np.array(ATTR_COLUMNS), flag_names=np.array(FLAGS),
+                fingerprint=np.array(self.fingerprint),
+                **{column: getattr(self, column) for column in self.COLUMNS}
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path] = INDEX_CONFIG['path']) -> 'CatalogIndex':
+        """Load a saved index, raising ValueError if it was built with other columns or flags."""
+        with np.load(path, allow_pickle=False) as data:
+            if (int(data['version']) != INDEX_VERSION or data['tag_columns'].tolist() != TAG_COLUMNS
+                    or data['attr_columns'].tolist() != ATTR_COLUMNS or data['flag_names'].tolist() != FLAGS):
+                raise ValueError(f"Index {path} was built by another version, rebuild it")
+            return cls(**{column: data[column] for column in cls.COLUMNS}, fingerprint=str(data['fingerprint']))
+
+    def flag(self, name: str) -> np.ndarray:
+        """Return a boolean mask of the products with flag ``name``."""
+        return (self.flags & np.uint32(FLAG_BITS[name])) != 0
+
+    def tag_count(self, tag: str) -> np.ndarray:
+        return self.tag_counts[:, TAG_INDEX[tag]]
+
+    def attr_count(self, attr: str) -> np.ndarray:
+        return self.attr_counts[:, ATTR_INDEX[attr]]
+
+    def query(self, flags: Iterable[str] = (), without: Iterable[str] = (), rules: Iterable[str] = (),
+              tags: Iterable[str] = (), attrs: Iterable[str] = (), min_depth: Optional[int] = None) -> np.ndarray:
+        """Return a boolean mask of the products matching every condition.
+
+        ``flags``, ``tags`` and ``attrs`` must be present, ``without`` flags
+        absent, and ``rules`` must all apply to the description.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name in list(flags) + [RULE_FLAGS[rule] for rule in rules]:
+            mask &= self.flag(name)
+        for name in without:
+            mask &= ~self.flag(name)
+        for tag in tags:
+            mask &= self.tag_count(tag) > 0
+        for attr in attrs:
+            mask &= self.attr_count(attr) > 0
+        if min_depth is not None:
+            mask &= self.depth >= min_depth
+        return mask
+
+    def codes_where(self, mask: np.ndarray) -> List[str]:
+        return self.codes[mask].tolist()
+
+    def needs_cleaning(self) -> np.ndarray:
+        """Return a mask of the products the fast path cannot pass through unchanged."""
+        return ~self.flag('is_clean')
+
+    def summary(self) -> dict:
+        """Products per flag and per cleaning rule, and catalog-wide tag and attribute totals."""
+        return {
+            'products': len(self),
+            'flags': {name: int(self.flag(name).sum()) for name in FLAGS},
+            'rules': {rule: int(self.flag(name).sum()) for rule, name in RULE_FLAGS.items()},
+            'tags': {tag: int(total) for tag, total in zip(TAG_COLUMNS, self.tag_counts.sum(axis=0))},
+            'attrs': {attr: int(total) for attr, total in zip(ATTR_COLUMNS, self.attr_counts.sum(axis=0))},
+            'max_depth': int(self.depth.max()) if len(self) else 0,
+        }
+
+def load_index(path: Union[str, Path] = INDEX_CONFIG['path']) -> Optional[CatalogIndex]:
+    """Load the saved index, or return None if there is none or it is outdated."""
+    if not Path(path).is_file():
+        return None
+    try:
+        return CatalogIndex.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring index {path}: {str(e)}")
+        return None
+
+def build_catalog_index(input_file: Union[str, Path], path: Union[str, Path] = INDEX_CONFIG['path'],
+                        description_column: str = 'description', code_column: str = 'product_code',
+                        parser: Optional[str] = None, incremental: bool = True) -> CatalogIndex:
+    """Index the descriptions of a CSV export and save the index to ``path``."""
+    import pandas as pd
+    df = pd.read_csv(input_file, delimiter=CSV_DELIMITER, usecols=[code_column, description_column])
+    previous = load_index(path) if incremental else None
+    index = CatalogIndex.build(df[code_column].tolist(), df[description_column].tolist(), parser, previous)
+    index.save(path)
+    logger.info(f"Indexed {len(index)} products into {path}")
+    return index
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Build and query the structure index of the catalog.')
+    parser.add_argument('--index', default=str(INDEX_CONFIG['path']), help='index file (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='index a CSV export')
+    build.add_argument('input', nargs='?', default=str(FILE_PATHS['all_offers']))
+    build.add_argument('--description-column', default='description')
+    build.add_argument('--code-column', default='product_code')
+    build.add_argument('--incremental', action=argparse.BooleanOptionalAction, default=True,
+                       help='reuse the rows of unchanged products from the existing index')
+    commands.add_parser('summary', help='print products per flag and rule as JSON')
+    query = commands.add_parser('query', help='count or list the products matching all conditions')
+    query.add_argument('--flag', action='append', choices=FLAGS, default=[])
+    query.add_argument('--without', action='append', choices=FLAGS, default=[])
+    query.add_argument('--rule', action='append', choices=list(RULE_FLAGS), default=[])
+    query.add_argument('--tag', action='append', choices=TAG_COLUMNS, default=[])
+    query.add_argument('--attr', action='append', choices=ATTR_COLUMNS, default=[])
+    query.add_argument('--min-depth', type=int)
+    query.add_argument('--codes', action='store_true', help='print the matching product codes')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    if args.command == 'build':
+        try:
+            build_catalog_index(args.input, args.index, args.description_column, args.code_column,
+                                incremental=args.incremental)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error indexing {args.input}: {str(e)}")
+            return 1
+        return 0
+
+    index = load_index(args.index)
+    if index is None:
+        logger.error(f"No usable index at {args.index}, run the build command first")
+        return 1
+    if args.command == 'summary':
+        print(json.dumps(index.summary(), indent=2))
+        return 0
+    mask = index.query(args.flag, args.without, args.rule, args.tag, args.attr, args.min_depth)
+    print(f"{int(mask.sum())} of {len(index)} products")
+    if args.codes:
+        for code in index.codes_where(mask):
+            print(code)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
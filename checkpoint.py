@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from cache import config_fingerprint
+from config import CHECKPOINT_CONFIG
+from guards import PassedThrough
+
+logger = logging.getLogger(__name__)
+
+def file_fingerprint(file_path: Union[str, Path]) -> str:
+    """Identify a version of an input file by its path, size and modification time, without reading it."""
+    path = Path(file_path).resolve()
+    stat = path.stat()
+    return f'{path}\0{stat.st_size}\0{stat.st_mtime_ns}'
+
+class CheckpointStore:
+    """Append-only JSON lines file of results, one line per completed range of input rows.
+
+    Rows are identified by their DataFrame index, which is the row number
+    in the input file for frames read from CSV, also when it is read in
+    chunks. Results of ranges completed by an earlier, interrupted run are
+    reused; only rows missing from them are computed again. Without
+    ``resume`` the records of an earlier run are not used, but they are
+    kept in the file until a run finishes.
+    """
+
+    def __init__(self, path: Union[str, Path], range_rows: int = CHECKPOINT_CONFIG['range_rows'],
+                 resume: bool = False):
+        self.path = Path(path)
+        self.range_rows = range_rows
+        self.saved = 0
+        self.completed: Dict[Tuple[int, int], Dict[int, object]] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.is_file():
+            if resume:
+                self.load()
+                self.saved = len(self.completed)
+                logger.info(f"Resuming from {self.saved} completed ranges in {self.path}")
+            else:
+                # New records go after the old ones; newer records of a range replace older ones when loaded
+                os.truncate(self.path, self.whole_lines_size())
+                logger.warning(f"Not reusing the checkpoint of an interrupted run in {self.path}, "
+                               f"run with --resume to reuse it")
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def load(self) -> None:
+        good = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.completed[(record['start'], record['end'])] = {
+                    int(label): value for label, value in record['rows'].items()
+                }
+                good += len(line)
+        # Drop a line cut short when the run was killed, new records go after the last whole one
+        os.truncate(self.path, good)
+
+    def whole_lines_size(self, block_size: int = 1 << 16) -> int:
+        """Return the size of the file up to the end of its last whole line, reading it from the end."""
+        with open(self.path, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(0, end - block_size)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    return start + newline + 1
+                end = start
+        return 0
+
+    def map_ranges(self, labels: Sequence[int], items: Sequence, compute: Callable[[List], List]) -> List:
+        """Return ``compute`` applied to ``items``, one range of input rows at a time.
+
+        ``labels`` are the input row numbers of the items. Every range is
+        written to the store as soon as it is computed, without the rows
+        passed through over a resource limit, which a resumed run computes again.
+        """
+        ranges: Dict[int, List[int]] = {}
+        for position, label in enumerate(labels):
+            ranges.setdefault(int(label) // self.range_rows, []).append(position)
+
+        results: List = [None] * len(items)
+        for number in sorted(ranges):
+            key = (number * self.range_rows, (number + 1) * self.range_rows)
+            done = self.completed.get(key, {})
+            positions = ranges[number]
+            missing = [position for position in positions if int(labels[position]) not in done]
+            computed = compute([items[position] for position in missing]) if missing else []
+            for position, result in zip(missing, computed):
+                results[position] = result
+            for position in positions:
+                if int(labels[position]) in done:
+                    results[position] = done[int(labels[position])]
+            if missing:
+                done = {**done, **{int(labels[position]): results[position] for position in missing
+                                   if not isinstance(results[position], PassedThrough)}}
+                self.append(key, done)
+        if ranges:
+            # Rows come in input order, in chunks when streaming: only the last
+            # range can still get rows, the ones before it need not stay in memory
+            last = max(ranges) * self.range_rows
+            for key in [key for key in self.completed if key[1] <= last]:
+                del self.completed[key]
+        return results
+
+    def append(self, key: Tuple[int, int], rows: Dict[int, object]) -> None:
+        self.completed[key] = rows
+        self.saved += 1
+        self.file.write(json.dumps({'start': key[0], 'end': key[1], 'rows': rows}, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    @property
+    def closed(self) -> bool:
+        return self.file.closed
+
+    def close(self) -> None:
+        self.file.close()
+
+    def finish(self) -> None:
+        """Close the store and delete it once the run's output is safely written."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+def open_checkpoint(run: str, input_file: Union[str, Path], resume: bool = False,
+                    enabled: Optional[bool] = None) -> Optional[CheckpointStore]:
+    """Open the checkpoints of ``run`` on this input file, or return None if checkpoints are disabled.
+
+    Without ``resume`` checkpoints left by an earlier run are not reused,
+    but they are only deleted once this run finishes.
+    """
+    enabled = CHECKPOINT_CONFIG['enabled'] if enabled is None else enabled
+    if not enabled:
+        return None
+    key = hashlib.sha256(f'{run}\0{file_fingerprint(input_file)}\0{config_fingerprint()}'.encode('utf-8'))
+    return CheckpointStore(Path(CHECKPOINT_CONFIG['directory']) / f'{run}-{key.hexdigest()[:16]}.jsonl',
+                           resume=resume)
@@ -0,0 +1,61 @@
+"""Clean a single description from the command line.
+
+    python clean.py description.html
+    python clean.py --html '<span style="font-size: 12pt;">Etui</span>'
+    cat description.html | python clean.py --beta-classes
+
+Only the cleaning modules are imported, not pandas, openpyxl or numpy, and
+no directories or log files are created, so the command starts quickly
+enough to be called from shell hooks and scripts. Use main.py for CSV and
+Excel files.
+"""
+import argparse
+import logging
+import sys
+from typing import List, Optional
+from functions import add_beta_classes, clean_description
+
+logger = logging.getLogger(__name__)
+
+def read_source(file: Optional[str], html: Optional[str]) -> str:
+    if html is not None:
+        return html
+    if file is None or file == '-':
+        return sys.stdin.read()
+    with open(file, encoding='utf-8') as f:
+        return f.read()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Clean one HTML description and print the result.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('file', nargs='?', help='file with the description, - or nothing for stdin')
+    source.add_argument('--html', help='the description itself')
+    parser.add_argument('--beta-classes', action='store_true', help='add the beta classes to the cleaned description')
+    parser.add_argument('--parser', help='BeautifulSoup backend (default: HTML_PARSER from config)')
+    parser.add_argument('-o', '--output', help='write the result to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    try:
+        html = read_source(args.file, args.html)
+    except OSError as e:
+        logger.error(f"Error reading {args.file}: {str(e)}")
+        return 1
+
+    result = clean_description(html, parser=args.parser)
+    if args.beta_classes:
+        result = add_beta_classes(result, parser=args.parser)
+
+    if args.output:
+        try:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(result)
+        except OSError as e:
+            logger.error(f"Error writing {args.output}: {str(e)}")
+            return 1
+    else:
+        sys.stdout.write(result + '\n')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
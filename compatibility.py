@@ -1,82 +1,139 @@
-from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4 import NavigableString, Tag
 import pandas as pd
 import re
+from typing import Dict, Iterable, List
+from functions import make_soup
+from guards import ResourceLimitExceeded, check_markup
+from output import output_path, write_table
 
-def extract_h3_from_descriptions(input_file, output_file):
-    print("📥 Reading input file...")
-    df = pd.read_csv(input_file, delimiter=';')
-    df['description'] = df['description'].fillna('')
+H3_COLUMNS = [
+    'extracted_h3', 'raw_h3_tags', 'h3_count', 'h2_count', 'unified_h3',
+    'new_description_with_unified_h3', 'HTML Tags',
+]
+
+def extract_h3_fields(html, parser=None, soup=None) -> dict:
+    """Extract the h3 data of one description and unify its h3 tags, as a plain dict.
+
+    A ``soup`` already parsed from ``html`` is used instead of parsing it
+    again; its h3 tags are put back afterwards, so it can be reused.
+    """
+    restore = soup is not None
+    if soup is None:
+        soup = make_soup(html, parser)
+
+    h3_tags = soup.find_all('h3')
+    h2_tags = soup.find_all('h2')
+
+    h3_inner = [tag.decode_contents() for tag in h3_tags]
+    h3_full_html = [str(tag) for tag in h3_tags]
+
+    # Build unified <h3><em>...</em></h3>
+    merged_items = []
+    for tag in h3_tags:
+        em = tag.find('em')
+        contents = em.contents if em else tag.contents
+        for frag in contents:
+            if isinstance(frag, Tag) and frag.name == 'br':
+                merged_items.append(str(frag))
+            elif isinstance(frag, NavigableString) and frag.strip():
+                merged_items.append(str(frag))
+            elif isinstance(frag, Tag):
+                merged_items.append(frag.decode())
+
+    while merged_items and merged_items[-1].strip() == '<br>':
+        merged_items.pop()
+
+    if merged_items:
+        combined = ''.join(
+            frag if 'br' in frag else f"{frag}<br>"
+            for frag in merged_items
+        )
+        combined = re.sub(r'(<br\s*/?>\s*){2,}', '<br>', combined).rstrip('<br>')
+        unified_h3_html = f'<h3><em>{combined}</em></h3>'
+    else:
+        unified_h3_html = ''
 
-    def extract_h3_data_and_replace(html):
-        soup = BeautifulSoup(html, "html.parser")
-
-        h3_tags = soup.find_all('h3')
-        h2_tags = soup.find_all('h2')
-
-        h3_inner = [tag.decode_contents() for tag in h3_tags]
-        h3_full_html = [str(tag) for tag in h3_tags]
-
-        # Build unified <h3><em>...</em></h3>
-        merged_items = []
-        for tag in h3_tags:
-            em = tag.find('em')
-            contents = em.contents if em else tag.contents
-            for frag in contents:
-                if isinstance(frag, Tag) and frag.name == 'br':
-                    merged_items.append(str(frag))
-                elif isinstance(frag, NavigableString) and frag.strip():
-                    merged_items.append(str(frag))
-                elif isinstance(frag, Tag):
-                    merged_items.append(frag.decode())
-
-        while merged_items and merged_items[-1].strip() == '<br>':
-            merged_items.pop()
-
-        if merged_items:
-            combined = ''.join(
-                frag if 'br' in frag else f"{frag}<br>"
-                for frag in merged_items
-            )
-            combined = re.sub(r'(<br\s*/?>\s*){2,}', '<br>', combined).rstrip('<br>')
-            unified_h3_html = f'<h3><em>{combined}</em></h3>'
-        else:
-            unified_h3_html = ''
-
-        if h3_tags and unified_h3_html:
-            first_h3 = h3_tags[0]
-            unified_h3_tag = BeautifulSoup(unified_h3_html, 'html.parser').h3
-            first_h3.replace_with(unified_h3_tag)
-            for h3 in h3_tags[1:]:
+    removed = []
+    if h3_tags and unified_h3_html:
+        first_h3 = h3_tags[0]
+        unified_h3_tag = make_soup(unified_h3_html, parser).h3
+        first_h3.replace_with(unified_h3_tag)
+        for h3 in h3_tags[1:]:
+            if restore:
+                removed.append((h3, h3.parent, h3.parent.index(h3)))
+                h3.extract()
+            else:
                 h3.decompose()
 
-        # ✅ Add opening and closing tags in order
-        tag_sequence = []
-
-        def walk(tag):
-            if not isinstance(tag, Tag):
-                return
-            tag_sequence.append(f"<{tag.name}>")
-            for child in tag.children:
-                if isinstance(child, Tag):
-                    walk(child)
-            tag_sequence.append(f"</{tag.name}>")
-
-        walk(soup)
-
-        return pd.Series({
-            'extracted_h3': ' | '.join(h3_inner),
-            'raw_h3_tags': ' | '.join(h3_full_html),
-            'h3_count': len(h3_tags),
-            'h2_count': len(h2_tags),
-            'unified_h3': unified_h3_html,
-            'new_description_with_unified_h3': str(soup),
-            'HTML Tags': ' | '.join(tag_sequence)
-        })
+    # ✅ Add opening and closing tags in order, with a stack so deep nesting cannot hit the recursion limit
+    tag_sequence = []
+    stack = [soup]
+    while stack:
+        tag = stack.pop()
+        if isinstance(tag, str):
+            tag_sequence.append(tag)  # the closing tag pushed below
+            continue
+        tag_sequence.append(f"<{tag.name}>")
+        stack.append(f"</{tag.name}>")
+        stack.extend(child for child in reversed(tag.contents) if isinstance(child, Tag))
+    new_description = str(soup)
+
+    if restore and h3_tags and unified_h3_html:
+        for h3, parent, index in reversed(removed):
+            parent.insert(index, h3)
+        unified_h3_tag.replace_with(first_h3)
+
+    return {
+        'extracted_h3': ' | '.join(h3_inner),
+        'raw_h3_tags': ' | '.join(h3_full_html),
+        'h3_count': len(h3_tags),
+        'h2_count': len(h2_tags),
+        'unified_h3': unified_h3_html,
+        'new_description_with_unified_h3': new_description,
+        'HTML Tags': ' | '.join(tag_sequence)
+    }
+
+def unparsed_h3_fields(html) -> dict:
+    """Return the fields of a description left unparsed: no h3 data, the description unchanged."""
+    return {
+        'extracted_h3': '',
+        'raw_h3_tags': '',
+        'h3_count': 0,
+        'h2_count': 0,
+        'unified_h3': '',
+        'new_description_with_unified_h3': html,
+        'HTML Tags': ''
+    }
+
+def extract_h3_data_and_replace(html, parser=None):
+    return pd.Series(extract_h3_fields(html, parser))
+
+def extract_h3_columns(descriptions: Iterable[str], parser=None) -> Dict[str, List]:
+    """Run extract_h3_fields over many descriptions and return one list per output column.
+
+    Descriptions over the limits of GUARD_CONFIG are not parsed, see unparsed_h3_fields.
+    """
+    columns: Dict[str, List] = {column: [] for column in H3_COLUMNS}
+    appends = [(columns[column].append, column) for column in H3_COLUMNS]
+    for row, html in enumerate(descriptions):
+        try:
+            check_markup(html)
+            fields = extract_h3_fields(html, parser)
+        except ResourceLimitExceeded as e:
+            print(f"⚠️ Description in row {row} left unparsed: {e}")
+            fields = unparsed_h3_fields(html)
+        for append, column in appends:
+            append(fields[column])
+    return columns
+
+def extract_h3_from_descriptions(input_file, output_file, parser=None, output_format=None):
+    print("📥 Reading input file...")
+    df = pd.read_csv(input_file, delimiter=';')
+    df['description'] = df['description'].fillna('')
 
     print("🔍 Extracting and normalizing <h3> content...")
-    h3_data = df['description'].apply(extract_h3_data_and_replace)
-    df = pd.concat([df, h3_data], axis=1)
+    df = df.assign(**extract_h3_columns(df['description'].tolist(), parser))
 
-    print(f"💾 Saving to: {output_file}")
-    df.to_excel(output_file, index=False)
-    print("✅ Done!")
+    print(f"💾 Saving to: {output_path(output_file, output_format)}")
+    written = write_table(df, output_file, output_format)
+    print(f"✅ Done! {written['rows']} rows, {written['bytes'] / 1024:.1f} KiB in {written['seconds']:.2f}s")
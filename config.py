@@ -8,9 +8,10 @@ DATA_DIR = BASE_DIR / 'data'
 END_DATA_DIR = BASE_DIR / 'end_data'
 LOGS_DIR = BASE_DIR / 'logs'
 
-# Create necessary directories
-for directory in [DATA_DIR, END_DATA_DIR, LOGS_DIR]:
-    directory.mkdir(exist_ok=True)
+def ensure_directories() -> None:
+    """Create the data, output and log directories; called by the pipelines that use them."""
+    for directory in [DATA_DIR, END_DATA_DIR, LOGS_DIR]:
+        directory.mkdir(exist_ok=True)
 
 # File paths
 FILE_PATHS = {
@@ -20,30 +21,71 @@ FILE_PATHS = {
     'bewoodgrizz_empty': DATA_DIR / 'bewoodgrizz_empty_offers.csv',
     'all_offers_cleaned': END_DATA_DIR / 'all_offers_cleaned.xlsx',
     'all_offers_ready': END_DATA_DIR / 'all_offers_ready.xlsx',
+    'all_offers_analysis': END_DATA_DIR / 'all_offers_analysis.xlsx',
     'pancernik_result': END_DATA_DIR / 'pancernik_empty_offers-result.xlsx',
     'bizon_result': END_DATA_DIR / 'bizon_empty_offers-result.xlsx',
     'bewoodgrizz_result': END_DATA_DIR / 'bewoodgrizz_empty_offers-result.xlsx',
 }
 
+# Vendors with empty offers: input export, description and code columns, result file
+VENDORS = {
+    'pancernik': {
+        'input': FILE_PATHS['pancernik_empty'],
+        'description_column': 'Opis PL',
+        'code_column': 'Seria',
+        'output': FILE_PATHS['pancernik_result'],
+    },
+    'bizon': {
+        'input': FILE_PATHS['bizon_empty'],
+        'description_column': 'Opis Shoper',
+        'code_column': 'Seria - Kolor',
+        'output': FILE_PATHS['bizon_result'],
+    },
+    'bewoodgrizz': {
+        'input': FILE_PATHS['bewoodgrizz_empty'],
+        'description_column': 'Shoper PL',
+        'code_column': 'Seria',
+        'output': FILE_PATHS['bewoodgrizz_result'],
+    },
+}
+
 # Google Sheets configuration
 GOOGLE_SHEETS = {
     'url': 'https://docs.google.com/spreadsheets/d/1rz6QThoRfEreZWRczP0B8tuZoorVvSZlC7qWwryi-o0/export?format=csv&gid=0',
     'sheet_id': '1rz6QThoRfEreZWRczP0B8tuZoorVvSZlC7qWwryi-o0',
+    'snapshot_path': DATA_DIR / 'processed_products.csv',
+    'max_age_hours': 12,        # Refresh the local snapshot when it is older than this
+    'timeout': 30,
+    'offline': False,           # Only read the local snapshot, never download
+    'offers_ean_column': 'ean', # Column of the offers export matched against the sheet
 }
 
 # HTML cleaning configuration
+HTML_PARSER = 'html.parser'   # BeautifulSoup backend: 'html.parser' or 'lxml'
 ALLOWED_TAGS: Set[str] = {
     'h2', 'h3', 'p', 'strong', 'em', 'img', 'hr', 'ul', 'ol', 'li', 
     'br', 'a', 'iframe', 'summary', 'details', 'section'
 }
 
 ALLOWED_ATTRS: Dict[str, List[str]] = {
-    'img': ['src', 'alt'],
+    'img': ['src', 'alt', 'loading', 'decoding'],
     'a': ['href', 'target'],
     'p': ['class', 'id'],
     'h2': ['class', 'id'],
 }
 
+# Cleaning rules shared by the tree path (functions.py), the fast path
+# (fastpath.py), the token sanitizer (sanitizer.py) and pageweight.py
+CONVERTIBLE_TAGS = frozenset({'span', 'div', 'font'})   # become <p>
+INLINE_TAGS = frozenset({'strong', 'em', 'a', 'img', 'hr', 'br'})
+HEADING_TAGS = frozenset({'h2', 'h3'})
+FLATTENING_TAGS = frozenset({'p', 'h2', 'h3', 'li'})
+VOID_TAGS = frozenset({'br', 'hr', 'img'})
+PRESERVED_CLASSES = frozenset({'product-info', 'fx-iframeContainer'})   # divs kept as they are, like iframes
+ALLOWED_TAG_SET = frozenset(ALLOWED_TAGS)
+ALLOWED_ATTR_SETS: Dict[str, frozenset] = {tag: frozenset(attrs) for tag, attrs in ALLOWED_ATTRS.items()}
+NO_ATTRS: frozenset = frozenset()
+
 # Logging configuration
 LOGGING_CONFIG = {
     'version': 1,
@@ -79,6 +121,143 @@ CSV_DELIMITER = ';'
 EXCLUDED_PRODUCTS = ['wydmuszka']
 BETA_CLASS_SUFFIX = '-beta'
 
+# Parallel processing configuration
+PARALLEL_CONFIG = {
+    'workers': 1,         # 1 cleans in-process, 0 or None uses every CPU core
+    'chunk_size': 200,    # rows sent to a worker at a time
+    'vendor_jobs': 0,     # vendors processed at the same time, 0 runs all of them at once
+}
+
+# Streaming (chunked) processing configuration
+STREAMING_CONFIG = {
+    'enabled': False,
+    'chunk_rows': 5000,   # CSV rows read and written at a time
+}
+
+# CSV ingest (ingest.py): pandas CSV engine 'c', 'pyarrow' or 'auto' (pyarrow if
+# installed). The pyarrow engine cannot read descriptions spanning lines.
+# Pipelines read, and write out, every column of the input (None). A list of
+# columns reads only those, which is faster on wide exports, but the output
+# then has only those columns too, e.g. for all_offers:
+# ['product_code', 'title', 'description', GOOGLE_SHEETS['offers_ean_column']]
+INGEST_CONFIG = {
+    'engine': 'c',
+    'columns': {
+        'all_offers': None,
+        'beta_classes': None,
+        'analysis': None,
+    },
+    'text_columns': ['product_code', GOOGLE_SHEETS['offers_ean_column']],   # read as text when projecting
+}
+
+# Output file format: 'xlsx', 'xlsx-stream', 'csv', 'jsonl' or 'parquet' (needs pyarrow)
+OUTPUT_CONFIG = {
+    'format': 'xlsx',
+}
+
+# Descriptions already in cleaned form are passed through without parsing
+FAST_PATH_CONFIG = {
+    'enabled': True,
+}
+
+# Descriptions without preserved blocks or other markup needing a tree are
+# cleaned by a single pass over their tokens instead of BeautifulSoup
+SANITIZER_CONFIG = {
+    'enabled': True,
+}
+
+# Fragments repeated across descriptions (shared blocks, feature lists,
+# disclaimers) are cleaned once per process and reused, see fragments.py
+FRAGMENT_CACHE_CONFIG = {
+    'enabled': True,
+    'max_entries': 20_000,   # cleaned fragments kept, least recently used evicted first
+    'min_chars': 200,        # shorter top-level elements are grouped with their neighbours
+}
+
+# Per-document resource limits (guards.py). A description over a limit is
+# cleaned by the token sanitizer if it can be, otherwise passed through
+# unchanged and reported in the log
+GUARD_CONFIG = {
+    'enabled': True,
+    'max_chars': 500_000,   # input size
+    'max_nodes': 20_000,    # tags
+    'max_depth': 500,       # tags nested in each other
+    'max_seconds': 5.0,     # wall-clock time of the tree path
+}
+
+# Storefront page-weight optimisation of cleaned descriptions (pageweight.py)
+PAGE_WEIGHT_CONFIG = {
+    'enabled': False,
+    'minify': True,                  # whitespace and neighbouring <strong>/<em> tags
+    'lazy_loading': True,            # loading="lazy" on img and iframe, decoding="async" on img
+    'drop_redundant_targets': True,  # empty and _self link targets
+}
+
+# Cleaned description cache configuration
+CACHE_CONFIG = {
+    'enabled': False,
+    'path': DATA_DIR / 'description_cache.sqlite',
+    'max_entries': 500_000,
+}
+
+# Incremental runs: only changed products are processed and written
+DELTA_CONFIG = {
+    'enabled': False,
+    'directory': DATA_DIR / 'manifests',
+}
+
+# Cleaned rows of a run are saved every range_rows input rows, so an
+# interrupted run can be resumed with --resume (checkpoint.py)
+CHECKPOINT_CONFIG = {
+    'enabled': True,
+    'directory': DATA_DIR / 'checkpoints',
+    'range_rows': 5000,
+}
+
+# Structure index of the catalog descriptions (catalog_index.py)
+INDEX_CONFIG = {
+    'path': DATA_DIR / 'structure_index.npz',
+}
+
+# Per-stage metrics configuration
+METRICS_CONFIG = {
+    'enabled': False,
+    'directory': LOGS_DIR,   # JSON summaries are written next to app.log
+}
+
+# Warm cleaning service for the editors (service.py)
+SERVICE_CONFIG = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    'max_batch': 500,          # documents accepted in one request
+    'max_pending': 16,         # requests in progress before new ones get HTTP 503
+    'latency_window': 10_000,  # recent documents the latency percentiles are computed over
+}
+
+# Push of changed descriptions to the Shoper REST API (shoper.py). The shop
+# URL and API client credentials come from the environment
+SHOPER_CONFIG = {
+    'enabled': False,
+    'url': os.environ.get('SHOPER_URL', ''),
+    'client_id': os.environ.get('SHOPER_CLIENT_ID', ''),
+    'client_secret': os.environ.get('SHOPER_CLIENT_SECRET', ''),
+    'language': 'pl_PL',         # translation the descriptions are written to
+    'batch_size': 25,            # calls per bulk request, the API's maximum
+    'concurrency': 4,            # bulk requests in flight, and pooled connections
+    'max_retries': 5,            # retries of a call after HTTP 429, 5xx or a connection error
+    'backoff_seconds': 1.0,      # first retry delay when the API sends no Retry-After, doubled each retry
+    'timeout': 30,
+    'id_column': 'product_id',   # output column with shop product ids; codes are looked up otherwise
+    'status_log': DATA_DIR / 'shoper_push.sqlite',
+}
+
+# Benchmark configuration
+BENCHMARK_CONFIG = {
+    'docs': 300,
+    'baseline_path': BASE_DIR / 'benchmarks' / 'baselines.json',
+    'regression_threshold': 0.10,   # relative change reported as a regression
+}
+
 # Error messages
 ERROR_MESSAGES = {
     'file_not_found': 'File not found or not accessible: {}',
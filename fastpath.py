@@ -0,0 +1,197 @@
+import re
+from typing import List, Optional
+from config import (
+    ALLOWED_ATTR_SETS, ALLOWED_TAG_SET, FLATTENING_TAGS, HEADING_TAGS, NO_ATTRS, PRESERVED_CLASSES, VOID_TAGS
+)
+
+# Other elements BeautifulSoup treats as void, rewriting how they are closed
+OTHER_VOID_TAGS = frozenset({
+    'area', 'base', 'basefont', 'bgsound', 'col', 'command', 'embed', 'frame', 'image', 'input',
+    'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr',
+})
+# Tags whose content html.parser does not tokenize as markup or whitespace as usual
+RAW_TEXT_TAGS = frozenset({'script', 'style', 'pre', 'textarea'})
+# Attributes BeautifulSoup splits on whitespace and joins with single spaces
+MULTI_VALUED_ATTRS = frozenset({
+    'class', 'accesskey', 'dropzone', 'rel', 'rev', 'headers', 'accept-charset', 'archive', 'sizes',
+    'sandbox', 'for',
+})
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+# Splits a description into alternating text and tag tokens
+TOKEN_RE = re.compile(r'(<[^<>]*>)')
+# Tags exactly as BeautifulSoup serializes them: lowercase names, double-quoted
+# attributes, "/>" only on void elements
+TAG_RE = re.compile(
+    r'<(/?)([a-z][a-z0-9]*)((?: [a-z][a-z0-9_:-]*="(?:[^"<>&\t\n\r\x0c]|&(?:amp|lt|gt);)*")*)(/?)>'
+)
+ATTR_RE = re.compile(r' ([a-z][a-z0-9_:-]*)="([^"]*)"')
+# Any entity other than the three BeautifulSoup writes back unchanged
+ENTITY_RE = re.compile(r'&(?!(?:amp|lt|gt);)')
+
+class _Frame:
+    """An open element while classifying."""
+    __slots__ = ('name', 'children', 'first_child', 'has_content', 'has_text', 'has_img',
+                 'last_was_br', 'holds_lone_img', 'has_attrs')
+
+    def __init__(self, name: Optional[str], has_attrs: bool = False):
+        self.name = name
+        self.has_attrs = has_attrs
+        self.children = 0
+        self.first_child: Optional[str] = None
+        self.has_content = False  # a tag or non-blank text child, see is_empty_tag
+        self.has_text = False  # non-blank text anywhere below
+        self.has_img = False  # an <img> anywhere below
+        self.last_was_br = False
+        self.holds_lone_img = False  # contains a nested <p> that only wraps an <img>
+
+    def add_child(self, child: str) -> None:
+        if not self.children:
+            self.first_child = child
+        self.children += 1
+        self.last_was_br = child == 'br'
+
+def _canonical_attrs(attrs: str) -> Optional[dict]:
+    """Parse the attributes of a tag, or return None if BeautifulSoup would rewrite them."""
+    values = {}
+    previous = ''
+    for attr, value in ATTR_RE.findall(attrs):
+        if attr <= previous:
+            return None  # duplicated, or not in the sorted order BeautifulSoup writes
+        previous = attr
+        if attr in MULTI_VALUED_ATTRS and value != ' '.join(value.split()):
+            return None
+        values[attr] = value
+    return values
+
+def _is_preserved_block(name: str, attrs: dict) -> bool:
+    """Tell whether clean_html keeps this tag and its content as they are."""
+    if name == 'div':
+        return not PRESERVED_CLASSES.isdisjoint(attrs.get('class', '').split())
+    return name == 'iframe'
+
+def is_clean_description(html: str) -> bool:
+    """Tell, without building a tree, whether clean_html would return ``html`` unchanged.
+
+    The description is tokenized with regular expressions and accepted only
+    if it is already in the form clean_html produces with html.parser:
+    whitelisted tags and attributes serialized as BeautifulSoup writes them,
+    stripped non-empty lines, no empty tags, no <strong> inside headings, no
+    repeated <br> inside a tag, h3 content wrapped in a single <em> and every
+    <img> alone in its <p>. Preserved blocks (product-info, iframe containers
+    and iframes) only need to be serialized canonically. Anything else,
+    including merely unusual markup, is reported as not clean.
+    """
+    if not isinstance(html, str) or not html:
+        return False
+    if '<' not in html or '>' not in html:
+        return True  # clean_html leaves text without markup untouched
+    if '\ufdd0' in html:
+        return False  # reserved for marking preserved blocks
+    if '\n'.join(line.strip() for line in html.splitlines() if line.strip()) != html:
+        return False
+
+    stack: List[_Frame] = [_Frame(None)]
+    block_depth = heading_depth = 0
+    # Names of the open tags inside a preserved block
+    preserved: List[str] = []
+    for i, token in enumerate(TOKEN_RE.split(html)):
+        parent = stack[-1]
+        if not i % 2:
+            if not token:
+                continue
+            if '<' in token or '>' in token or ENTITY_RE.search(token):
+                return False
+            if not token.strip(ASCII_SPACES) and token not in (' ', '\n'):
+                return False  # BeautifulSoup collapses whitespace-only strings
+            if not preserved:
+                if token.strip():
+                    parent.has_content = parent.has_text = True
+                parent.add_child('#text')
+            continue
+
+        match = TAG_RE.fullmatch(token)
+        if match is None:
+            return False
+        closing, name, attr_text, self_closing = match.groups()
+        if closing and (attr_text or self_closing):
+            return False
+        attrs = _canonical_attrs(attr_text)
+        if attrs is None or name in RAW_TEXT_TAGS or name in OTHER_VOID_TAGS:
+            return False
+        if self_closing and name not in VOID_TAGS:
+            return False
+        if name in VOID_TAGS and (closing or self_closing != ('' if name == 'br' else '/')):
+            return False
+        if name in ('br', 'hr') and attrs:
+            return False  # clean_html only normalizes the attribute-less spellings
+
+        if preserved:
+            # Blocks are restored verbatim, they only need to survive a parse unchanged
+            if closing:
+                if preserved.pop() != name:
+                    return False
+                if not preserved:
+                    parent.has_content = parent.has_text = True  # a block counts as non-blank text
+                    parent.add_child('#text')
+            elif name not in VOID_TAGS:
+                preserved.append(name)
+            continue
+
+        if not closing and _is_preserved_block(name, attrs):
+            preserved.append(name)
+            continue
+        if name not in ALLOWED_TAG_SET:
+            return False
+        allowed_attrs = ALLOWED_ATTR_SETS.get(name, NO_ATTRS)
+        if any(attr not in allowed_attrs for attr in attrs):
+            return False
+
+        if closing:
+            if parent.name != name:
+                return False
+            stack.pop()
+            if not parent.has_content:
+                return False
+            if name == 'p':
+                if not (parent.has_text or parent.has_img):
+                    return False
+                if parent.has_img and parent.first_child == 'img' and parent.children != 1:
+                    return False
+                if parent.holds_lone_img and parent.children == 1:
+                    return False  # the unwrapped <img> would stay alone in this <p>
+            if name == 'h3' and (parent.children != 1 or parent.first_child != 'em'):
+                return False
+            if name in FLATTENING_TAGS:
+                block_depth -= 1
+            if name in HEADING_TAGS:
+                heading_depth -= 1
+            outer = stack[-1]
+            outer.has_text = outer.has_text or parent.has_text
+            outer.has_img = outer.has_img or parent.has_img
+            if name == 'p' and block_depth:
+                # A nested <p> is unwrapped; only one holding just an <img> is
+                # recreated as is, when the image gets wrapped again.
+                if parent.has_attrs or parent.children != 1 or parent.first_child != 'img':
+                    return False
+                outer.holds_lone_img = True
+            continue
+
+        if name == 'strong' and heading_depth:
+            return False
+        if name == 'br' and parent.last_was_br and parent.name is not None:
+            return False
+        if name == 'img':
+            if not attrs.get('src') or parent.name != 'p' or parent.children:
+                return False
+            parent.has_img = True
+        parent.add_child(name)
+        parent.has_content = True
+        if name not in VOID_TAGS:
+            stack.append(_Frame(name, bool(attrs)))
+            if name in FLATTENING_TAGS:
+                block_depth += 1
+            if name in HEADING_TAGS:
+                heading_depth += 1
+
+    return len(stack) == 1 and not preserved
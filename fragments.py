@@ -0,0 +1,154 @@
+"""Memoization of description fragments repeated across products.
+
+Descriptions share large blocks: product-info tables, feature lists, iframe
+containers, h3 disclaimers. A description is split between its top-level
+elements wherever they are separated by whitespace containing a line
+break. Cleaning keeps such whitespace as a line break and strips the lines
+around it, so every fragment can be cleaned on its own and the results
+joined with newlines. Cleaned fragments are kept in an in-memory LRU keyed
+by a hash of their markup.
+
+Only html.parser is modelled. Anything the splitter does not model, such as
+comments, raw text tags or void tags html.parser would leave open across a
+split, keeps the description in one piece.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from config import FRAGMENT_CACHE_CONFIG, VOID_TAGS
+from fastpath import ASCII_SPACES, OTHER_VOID_TAGS, RAW_TEXT_TAGS
+from sanitizer import TAG_RE
+
+ALL_VOID_TAGS = VOID_TAGS | OTHER_VOID_TAGS
+UNSPLITTABLE_TAGS = RAW_TEXT_TAGS | {'template', 'title', 'xmp', 'noembed', 'noframes', 'noscript', 'plaintext'}
+
+class FragmentCache:
+    """LRU of cleaned fragments, with hit counters; shared by the threads of a process."""
+
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_CONFIG['max_entries']):
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[bytes, str]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(fragment: str) -> bytes:
+        return hashlib.blake2b(fragment.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[str]:
+        with self.lock:
+            cleaned = self.entries.get(key)
+            if cleaned is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return cleaned
+
+    def put(self, key: bytes, cleaned: str) -> None:
+        with self.lock:
+            self.entries[key] = cleaned
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+_shared_cache: Optional[FragmentCache] = None
+_shared_cache_lock = threading.Lock()
+
+def shared_fragment_cache(enabled: Optional[bool] = None) -> Optional[FragmentCache]:
+    """Return the fragment cache of this process, or None when fragment memoization is disabled."""
+    global _shared_cache
+    enabled = FRAGMENT_CACHE_CONFIG['enabled'] if enabled is None else enabled
+    if not enabled:
+        return None
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = FragmentCache()
+    return _shared_cache
+
+def split_fragments(html: str, min_chars: int = FRAGMENT_CACHE_CONFIG['min_chars']) -> Optional[List[str]]:
+    """Split a description into fragments that clean the same on their own as in place.
+
+    Neighbouring top-level elements shorter than ``min_chars`` are kept
+    together; longer ones become fragments of their own, so a shared block
+    is found again whatever surrounds it. Returns None for markup the
+    splitter does not model.
+    """
+    open_tags: List[str] = []
+    boundaries: List[Tuple[int, int]] = []  # whitespace between top-level elements
+    # Void tags closed by BeautifulSoup itself; it swallows a later </br> or
+    # <br/> of the same name and leaves that one open, which is not modelled
+    closed_voids = set()
+    position = 0
+    for match in TAG_RE.finditer(html):
+        text = html[position:match.start()]
+        if '<' in text:
+            return None
+        if not open_tags and position and '\n' in text and not text.strip(ASCII_SPACES):
+            boundaries.append((position, match.start()))
+        end_name, start_name, _, self_closing = match.groups()
+        name = (start_name or end_name).lower()
+        if name in UNSPLITTABLE_TAGS:
+            return None
+        if name in ALL_VOID_TAGS:
+            if end_name is not None or self_closing:
+                if name in closed_voids:
+                    return None
+            else:
+                closed_voids.add(name)
+        elif start_name is None:
+            if name in open_tags:
+                del open_tags[len(open_tags) - 1 - open_tags[::-1].index(name):]
+        elif not self_closing:
+            open_tags.append(name)
+        position = match.end()
+    if '<' in html[position:]:
+        return None
+    pieces = group_fragments(html, boundaries, min_chars)
+    return [html[start:end] for start, end in pieces]
+
+def group_fragments(html: str, boundaries: List[Tuple[int, int]], min_chars: int) -> List[Tuple[int, int]]:
+    """Return the (start, end) offsets of the fragments between ``boundaries``.
+
+    Whitespace at the start is left out: it is top-level text, which the
+    cleaning strips anyway. Trailing text is kept as it is, since html.parser
+    decodes an entity without a semicolon differently at the end of the input,
+    e.g. ``&nbsp`` before a newline.
+    """
+    segments = []
+    start = 0
+    for ws_start, ws_end in boundaries:
+        segments.append((start, ws_start))
+        start = ws_end
+    segments.append((start, len(html)))
+
+    pieces: List[Tuple[int, int]] = []
+    for start, end in segments:
+        if pieces and end - start < min_chars and pieces[-1][1] - pieces[-1][0] < min_chars:
+            pieces[-1] = (pieces[-1][0], end)
+        else:
+            pieces.append((start, end))
+    start, end = pieces[0]
+    pieces[0] = (end - len(html[start:end].lstrip(ASCII_SPACES)), end)
+    return pieces
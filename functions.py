@@ -1,77 +1,161 @@
-from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4 import BeautifulSoup, FeatureNotFound, NavigableString, Tag
+from bs4.element import PageElement, PreformattedString
 import os
+import logging
 from datetime import datetime
-import pandas as pd
-from typing import Optional, Dict, List, Union
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Iterable, List, Sequence, Set, Tuple, Union
 import re
 from pathlib import Path
-from config import ALLOWED_TAGS, ALLOWED_ATTRS, BETA_CLASS_SUFFIX
+from config import (
+    ALLOWED_ATTR_SETS, ALLOWED_TAG_SET, BETA_CLASS_SUFFIX, CONVERTIBLE_TAGS, FAST_PATH_CONFIG, FLATTENING_TAGS,
+    HEADING_TAGS, HTML_PARSER, INLINE_TAGS, NO_ATTRS, PRESERVED_CLASSES, SANITIZER_CONFIG, VOID_TAGS
+)
+import metrics
+from fastpath import ASCII_SPACES, is_clean_description
+from sanitizer import sanitize_description
+from fragments import FragmentCache, shared_fragment_cache, split_fragments
+from guards import PassedThrough, ResourceLimitExceeded, check_deadline, check_markup, deadline
+from metrics import StageTimer
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_WRAPPER_ID = '__description_fragment__'
+# Stands in for a preserved block in the serialized document; a Unicode noncharacter
+BLOCK_MARKER_START = '\ufdd0'
+BLOCK_MARKER = BLOCK_MARKER_START + '{}\ufdd1'
+BLOCK_MARKER_RE = re.compile(BLOCK_MARKER_START + r'(\d+)\ufdd1')
 
 class HTMLValidationError(Exception):
     """Custom exception for HTML validation errors."""
     pass
 
-def validate_html(html: str) -> bool:
+@lru_cache(maxsize=None)
+def resolve_parser(parser: Optional[str] = None) -> str:
+    """Return the parser backend to use, falling back to html.parser if it is missing."""
+    parser = parser or HTML_PARSER
+    try:
+        BeautifulSoup('', parser)
+        return parser
+    except FeatureNotFound:
+        logger.warning(f"HTML parser {parser} is not installed, falling back to html.parser")
+        return 'html.parser'
+
+def make_soup(html: str, parser: Optional[str] = None) -> BeautifulSoup:
+    """Parse a description fragment with the configured backend.
+
+    Document-building parsers such as lxml wrap fragments in <html><body>
+    and put leading text into an implied <p>. The fragment is parsed inside
+    a wrapper <div> and all wrappers are unwrapped again, so every backend
+    returns a soup whose top level is the fragment itself.
+    """
+    parser = resolve_parser(parser)
+    if parser == 'html.parser':
+        return BeautifulSoup(html, parser)
+
+    soup = BeautifulSoup(f'<div id="{FRAGMENT_WRAPPER_ID}">{html}</div>', parser)
+    body = soup.body
+    if body is not None:
+        first = body.contents[0] if body.contents else None
+        if isinstance(first, Tag) and first.get('id') == FRAGMENT_WRAPPER_ID:
+            first.unwrap()
+        for wrapper in (soup.head, body, soup.html):
+            if wrapper is not None:
+                wrapper.unwrap()
+    return soup
+
+def is_already_clean(html: str, parser: Optional[str] = None) -> bool:
+    """Check whether clean_html can return a description as-is without parsing it.
+
+    Only used with html.parser, whose output the classifier models.
+    """
+    return (FAST_PATH_CONFIG['enabled'] and resolve_parser(parser) == 'html.parser'
+            and is_clean_description(html))
+
+def sanitize_without_tree(html: str, parser: Optional[str] = None) -> Optional[str]:
+    """Clean a description with the token sanitizer, or return None if it needs the tree path.
+
+    Only used with html.parser, whose output the sanitizer reproduces.
+    """
+    if not SANITIZER_CONFIG['enabled'] or resolve_parser(parser) != 'html.parser':
+        return None
+    return sanitize_description(html)
+
+def has_markup(html: str) -> bool:
+    """Check that the input is a string that contains HTML tags, without parsing it."""
+    if not html or not isinstance(html, str):
+        logger.debug(f"Invalid input type: {type(html)}")
+        return False
+
+    # Check for basic HTML structure
+    if not ('<' in html and '>' in html):
+        logger.debug("Input does not contain HTML tags")
+        return False
+    return True
+
+def validate_html(html: str, parser: Optional[str] = None) -> bool:
     """Validate if the input is valid HTML."""
     try:
-        if not html or not isinstance(html, str):
-            print(f"Invalid input type: {type(html)}")
-            return False
-            
-        # Check for basic HTML structure
-        if not ('<' in html and '>' in html):
-            print("Input does not contain HTML tags")
+        if not has_markup(html):
             return False
-            
-        BeautifulSoup(html, "html.parser")
+        make_soup(html, parser)
         return True
     except Exception as e:
-        print(f"HTML validation error: {str(e)}")
+        logger.warning(f"HTML validation error: {str(e)}")
         return False
 
-def convert_span_to_p(tag: Tag) -> None:
-    """Convert span tags to paragraph tags when appropriate."""
-    try:
-        if tag.name in ['span', 'div', 'font']:
-            inline_tags = {'strong', 'em', 'a', 'img', 'hr', 'br'}
-            if all(
-                isinstance(child, NavigableString)
-                or (isinstance(child, Tag) and child.name in inline_tags)
-                for child in tag.contents
-            ):
-                tag.name = 'p'
-            else:
-                tag.unwrap()
-    except Exception:
-        pass
+def add_beta_classes(html: str, parser: Optional[str] = None, soup: Optional[BeautifulSoup] = None) -> str:
+    """Add beta classes to HTML tags.
 
-def add_beta_classes(html: str) -> str:
-    """Add beta classes to HTML tags."""
+    A ``soup`` already parsed from ``html`` is used instead of parsing it
+    again; its classes are put back afterwards, so it can be reused.
+    """
     try:
+        metrics.count('add_beta_classes.documents')
         if not html or not isinstance(html, str):
-            print(f"Invalid input type for beta classes: {type(html)}")
+            logger.debug(f"Invalid input type for beta classes: {type(html)}")
+            metrics.count('add_beta_classes.invalid_input')
             return html
-            
-        if not validate_html(html):
-            print(f"Invalid HTML input for beta class addition. First 100 chars: {html[:100]}")
+
+        timer = StageTimer(metrics.active())
+        if not has_markup(html):
+            logger.debug(f"Invalid HTML input for beta class addition. First 100 chars: {html[:100]}")
+            metrics.count('add_beta_classes.invalid_html')
             return html
 
-        soup = BeautifulSoup(html, "html.parser")
-        modified_tags = 0
+        restore = soup is not None
+        if soup is None:
+            soup = make_soup(html, parser)
+            timer.lap('add_beta_classes.parse')
+        modified_tags = []
+        tags = soup.find_all(True)
         
-        for tag in soup.find_all(True):
+        for tag in tags:
             class_name = f"{tag.name}{BETA_CLASS_SUFFIX}"
             existing_classes = tag.get("class", [])
             if class_name not in existing_classes:
+                modified_tags.append((tag, tag.attrs.get('class')))
                 tag['class'] = existing_classes + [class_name]
-                modified_tags += 1
+        timer.lap('add_beta_classes.add_classes', len(tags))
                 
-        if modified_tags > 0:
-            print(f"Added beta classes to {modified_tags} tags")
+        if modified_tags:
+            logger.debug(f"Added beta classes to {len(modified_tags)} tags")
             
-        return str(soup)
+        html_out = str(soup)
+        timer.lap('add_beta_classes.serialize')
+        if restore:
+            for tag, classes in modified_tags:
+                if classes is None:
+                    del tag['class']
+                else:
+                    tag['class'] = classes
+        return html_out
     except Exception as e:
-        print(f"Error adding beta classes: {str(e)}")
+        logger.warning(f"Error adding beta classes: {str(e)}")
+        metrics.count('add_beta_classes.fallbacks')
         return html
 
 def is_empty_tag(tag: Tag) -> bool:
@@ -91,177 +175,451 @@ def is_empty_tag(tag: Tag) -> bool:
     except Exception:
         return False
 
-def flatten_nested_tags(soup: BeautifulSoup) -> None:
-    """Flatten nested tags in the HTML."""
-    try:
-        for outer_p in soup.find_all('p'):
-            for inner_p in outer_p.find_all('p'):
-                inner_p.unwrap()
-        for heading in soup.find_all(['h2', 'h3']):
-            for inner_p in heading.find_all('p'):
-                inner_p.unwrap()
-    except Exception:
-        pass
-
-def unwrap_p_in_li(soup: BeautifulSoup) -> None:
-    """Unwrap paragraph tags inside list items."""
-    try:
-        for li in soup.find_all('li'):
-            for p in li.find_all('p'):
-                p.unwrap()
-    except Exception:
-        pass
-
-def wrap_img_in_p(soup: BeautifulSoup) -> None:
-    """Wrap image tags in paragraph tags."""
-    try:
-        for img in soup.find_all('img'):
-            parent = img.parent
-            if parent.name != 'p' or len(parent.contents) > 1:
-                new_p = soup.new_tag("p")
-                img.insert_before(new_p)
-                new_p.append(img.extract())
-    except Exception:
-        pass
-
-def wrap_h3_content_in_em(soup: BeautifulSoup) -> None:
-    """Wrap h3 content in emphasis tags."""
-    try:
-        for h3 in soup.find_all('h3'):
-            contents = h3.contents
-            if len(contents) == 1 and isinstance(contents[0], Tag) and contents[0].name == 'em':
+def preserve_blocks(soup: BeautifulSoup) -> List[Tag]:
+    """Find the product-info blocks, iframe containers and iframes kept as-is.
+
+    The blocks stay in the tree; the cleaning passes skip them and treat each
+    one like a piece of non-blank text. Only the outermost blocks are
+    returned and nothing inside them is visited.
+    """
+    blocks: List[Tag] = []
+    stack = [child for child in reversed(soup.contents) if isinstance(child, Tag)]
+    while stack:
+        tag = stack.pop()
+        if tag.name == 'iframe' or (tag.name == 'div' and not PRESERVED_CLASSES.isdisjoint(tag.get('class') or ())):
+            blocks.append(tag)
+            continue
+        stack.extend(child for child in reversed(tag.contents) if isinstance(child, Tag))
+    return blocks
+
+def cleanable_tags(soup: BeautifulSoup, preserved: Set[int] = frozenset()) -> List[Tag]:
+    """Return all tags in document order, skipping preserved blocks and their content."""
+    tags: List[Tag] = []
+    stack = [child for child in reversed(soup.contents) if isinstance(child, Tag)]
+    while stack:
+        tag = stack.pop()
+        if id(tag) in preserved:
+            continue
+        tags.append(tag)
+        stack.extend(child for child in reversed(tag.contents) if isinstance(child, Tag))
+    return tags
+
+def sanitize_tags(soup: BeautifulSoup, blocks: Sequence[Tag] = ()) -> int:
+    """Convert span/div/font tags and apply the tag and attribute whitelist in one pass.
+
+    Preserved ``blocks`` are left untouched. Returns the number of tags visited.
+    """
+    preserved = {id(block) for block in blocks}
+    tags = cleanable_tags(soup, preserved)
+    for tag in tags:
+        name = tag.name
+        if name in CONVERTIBLE_TAGS:
+            if all(
+                isinstance(child, NavigableString)
+                or (isinstance(child, Tag) and (child.name in INLINE_TAGS or id(child) in preserved))
+                for child in tag.contents
+            ):
+                tag.name = name = 'p'
+            else:
+                tag.unwrap()
                 continue
 
-            inner_html = h3.decode_contents()
-            h3.clear()
-
+        if name in ALLOWED_TAG_SET:
+            allowed_attrs = ALLOWED_ATTR_SETS.get(name, NO_ATTRS)
+            for attr in list(tag.attrs):
+                if attr.lower() not in allowed_attrs:
+                    del tag.attrs[attr]
+        else:
+            tag.unwrap()
+    return len(tags)
+
+def remove_consecutive_brs(tag: Tag) -> None:
+    """Remove break tags that directly follow another break tag."""
+    prev = None
+    for child in list(tag.children):
+        if isinstance(child, Tag) and child.name == 'br':
+            if isinstance(prev, Tag) and prev.name == 'br':
+                child.decompose()
+                continue
+        prev = child
+
+def merge_adjacent_strings(tag: Tag, preserved: Set[int] = frozenset()) -> None:
+    """Merge neighbouring text nodes below a tag the way a fresh parse would.
+
+    Runs consisting only of ASCII whitespace collapse to a single newline or
+    space, matching BeautifulSoup's own handling of whitespace-only strings,
+    and script/style strings become plain text. Preserved blocks count as
+    non-blank text in a run and are not descended into.
+    """
+    stack = [tag]
+    while stack:
+        current = stack.pop()
+        run: List[PageElement] = []
+        for child in list(current.contents) + [None]:
+            if ((isinstance(child, NavigableString) and not isinstance(child, PreformattedString))
+                    or id(child) in preserved):
+                run.append(child)
+                continue
+            if any(isinstance(node, Tag) for node in run):
+                segment: List[NavigableString] = []
+                for node in run + [None]:
+                    if isinstance(node, NavigableString):
+                        segment.append(node)
+                    else:
+                        replace_strings(segment)
+                        segment = []
+            elif run:
+                replace_strings(run, collapse=True)
+            run = []
+            if isinstance(child, Tag):
+                stack.append(child)
+
+def replace_strings(strings: List[NavigableString], collapse: bool = False) -> None:
+    """Replace sibling strings with one plain string, collapsing blank ones if asked.
+
+    A single blank string is collapsed too: one left over from an unwrapped
+    <pre>, where BeautifulSoup keeps whitespace as it is, would be
+    collapsed by a fresh parse.
+    """
+    if not strings:
+        return
+    text = ''.join(strings)
+    if collapse and text and not text.strip(ASCII_SPACES):
+        text = '\n' if '\n' in text else ' '
+    if len(strings) > 1 or type(strings[0]) is not NavigableString or text != strings[0]:
+        strings[0].replace_with(NavigableString(text))
+        for extra in strings[1:]:
+            extra.extract()
+
+def reparse_h3_content(soup: BeautifulSoup, h3: Tag, preserved: Set[int] = frozenset()) -> Tag:
+    """Wrap the content of an h3 in an <em> by serializing and parsing it again.
+
+    Only used for content a fresh parse does not give back as it is: a void
+    tag with children, which html.parser only builds out of markup like
+    ``<img><img/>text``. Preserved blocks stand in the markup as text
+    markers, like they used to, and are put back after the parse. Returns
+    the new <em>.
+    """
+    blocks = [node for node in h3.descendants if id(node) in preserved]
+    for i, block in enumerate(blocks):
+        block.replace_with(BLOCK_MARKER.format(i))
+    inner_html = h3.decode_contents()
+    h3.clear()
+    em = soup.new_tag('em')
+    em.append(BeautifulSoup(inner_html, 'html.parser'))
+    h3.append(em)
+    if blocks:
+        for string in [node for node in em.descendants
+                       if isinstance(node, NavigableString) and BLOCK_MARKER_START in node]:
+            pieces = BLOCK_MARKER_RE.split(str(string))
+            # split() alternates text with the indexes of the markers
+            nodes = [blocks[int(piece)] if i % 2 else NavigableString(piece)
+                     for i, piece in enumerate(pieces) if i % 2 or piece]
+            string.replace_with(*nodes)
+    return em
+
+def restructure_tree(soup: BeautifulSoup, timer: Optional[StageTimer] = None, blocks: Sequence[Tag] = ()) -> bool:
+    """Apply the structural cleanup rules in a single traversal.
+
+    Removes empty tags, unwraps <p> nested in p, h2, h3 and li and <strong>
+    in headings, wraps h3 content in <em>, collapses <br> runs, wraps
+    images in <p> and removes empty paragraphs, in that order. Emptiness is checked before a tag's children are
+    visited and <br> runs are collapsed once a tag's subtree is done, or
+    inside h3 tags once they are wrapped; h3, img and p tags are collected
+    on the way and finished afterwards. Preserved ``blocks`` are not
+    visited. Returns False if an empty h3 stopped the h3 wrapping, which
+    then applies to the rest of the document.
+    """
+    timer = timer or StageTimer(None)
+    preserved = {id(block) for block in blocks}
+    # Tags holding a preserved block are never empty, like the text it used to be replaced with
+    holding_blocks = {id(parent) for block in blocks for parent in block.parents}
+    visited = 0
+    h3_tags: List[Tuple[Tag, Optional[Tag]]] = []
+    img_tags: List[Tag] = []
+    p_tags: List[Tag] = []
+    br_parents_in_h3: List[Tag] = []
+    reparsed_h3s: Set[int] = set()
+
+    # Stack entries: (tag, inside_p_h_or_li, inside_heading, enclosing_h3);
+    # a None tag marks the end of the subtree of the tag in the last slot,
+    # the second slot telling whether that tag is an h3 or inside one.
+    stack: List[tuple] = [
+        (child, False, False, None) for child in reversed(soup.contents)
+        if isinstance(child, Tag) and id(child) not in preserved
+    ]
+    while stack:
+        tag, in_block, in_heading, enclosing_h3 = stack.pop()
+        if tag is None:
+            if in_block:
+                br_parents_in_h3.append(enclosing_h3)
+            else:
+                remove_consecutive_brs(enclosing_h3)
+            continue
+        visited += 1
+        if not visited % 1024:
+            check_deadline()
+
+        name = tag.name
+        if (name in ALLOWED_TAG_SET and is_empty_tag(tag) and id(tag) not in holding_blocks
+                and tag.find('img') is None):
+            tag.decompose()
+            continue
+        if name in VOID_TAGS and enclosing_h3 is not None and tag.contents:
+            reparsed_h3s.add(id(enclosing_h3))
+
+        children = [child for child in tag.contents if isinstance(child, Tag) and id(child) not in preserved]
+        unwrap = (name == 'p' and in_block) or (name == 'strong' and in_heading)
+        if not unwrap:
+            stack.append((None, name == 'h3' or enclosing_h3 is not None, False, tag))
+            if name == 'h3':
+                h3_tags.append((tag, enclosing_h3))
+            elif name == 'img':
+                img_tags.append(tag)
+            elif name == 'p':
+                p_tags.append(tag)
+
+        child_entry_flags = (
+            in_block or name in FLATTENING_TAGS,
+            in_heading or name in HEADING_TAGS,
+            tag if name == 'h3' and not unwrap else enclosing_h3,
+        )
+        for child in reversed(children):
+            stack.append((child, *child_entry_flags))
+        if unwrap:
+            tag.unwrap()
+    timer.lap('clean_html.restructure_walk', visited)
+
+    # h3 tags nested in an h3 that gets wrapped end up inside the new <em> as-is.
+    # An h3 left without any content stops the wrapping altogether, as the
+    # original, re-parsing h3 wrap always did.
+    # An h3 with a void tag that has children is parsed again, and so is every h3 around it.
+    moved = set()
+    wrapped_all = True
+    for h3, enclosing_h3 in reversed(h3_tags):
+        if id(h3) in reparsed_h3s and enclosing_h3 is not None:
+            reparsed_h3s.add(id(enclosing_h3))
+    reparsed = False
+    for h3, enclosing_h3 in h3_tags:
+        nested_in_wrapped = enclosing_h3 is not None and id(enclosing_h3) in moved
+        contents = h3.contents
+        if len(contents) == 1 and isinstance(contents[0], Tag) and contents[0].name == 'em':
+            if nested_in_wrapped:
+                moved.add(id(h3))
+            continue
+        if not contents:
+            wrapped_all = False
+            break
+        moved.add(id(h3))
+        if nested_in_wrapped:
+            continue
+        if id(h3) in reparsed_h3s:
+            em = reparse_h3_content(soup, h3, preserved)
+            br_parents_in_h3.extend(cleanable_tags(em, preserved))
+            reparsed = True
+        else:
             em = soup.new_tag('em')
-            em.append(BeautifulSoup(inner_html, 'html.parser'))
+            em.extend(list(contents))
             h3.append(em)
-    except Exception:
-        pass
-
-def remove_empty_paragraphs(soup: BeautifulSoup) -> None:
-    """Remove empty paragraph tags."""
-    try:
-        for p in soup.find_all("p"):
-            if not p.get_text(strip=True) and not p.find("img"):
-                p.decompose()
-    except Exception:
-        pass
-
-def unwrap_strong_inside_headings(soup: BeautifulSoup) -> None:
-    """Unwrap strong tags inside headings."""
-    try:
-        for tag in soup.find_all(['h2', 'h3']):
-            for strong in tag.find_all('strong'):
-                strong.unwrap()
-    except Exception:
-        pass
-
-def clean_html(raw_html: str, product_code: Optional[str] = None) -> pd.Series:
-    """Clean and sanitize HTML content."""
+            merge_adjacent_strings(em, preserved)
+        br_parents_in_h3.append(em)
+    for tag in br_parents_in_h3:
+        remove_consecutive_brs(tag)
+    timer.lap('clean_html.wrap_h3_content_in_em', len(h3_tags))
+    check_deadline()
+
+    if reparsed:
+        # The parsed h3 content is made of new tags
+        tags = cleanable_tags(soup, preserved)
+        img_tags = [tag for tag in tags if tag.name == 'img']
+        p_tags = [tag for tag in tags if tag.name == 'p']
+        holding_blocks = {id(parent) for block in blocks for parent in block.parents}
+
+    for img in img_tags:
+        parent = img.parent
+        if parent.name != 'p' or len(parent.contents) > 1:
+            new_p = soup.new_tag("p")
+            img.insert_before(new_p)
+            new_p.append(img.extract())
+    timer.lap('clean_html.wrap_img_in_p', len(img_tags))
+
+    for p in p_tags:
+        if not p.get_text(strip=True) and not p.find("img") and id(p) not in holding_blocks:
+            p.decompose()
+    timer.lap('clean_html.remove_empty_paragraphs', len(p_tags))
+    return wrapped_all
+
+def clean_description(raw_html: str, product_code: Optional[str] = None, parser: Optional[str] = None,
+                      soup: Optional[BeautifulSoup] = None) -> str:
+    """Clean and sanitize HTML content, returning the cleaned description.
+
+    Input that is not a string with markup, or that fails to clean, is
+    returned as it is. Markup over the limits of GUARD_CONFIG is only
+    cleaned by the token sanitizer; if it needs the tree path, or the tree
+    path runs out of time, it is returned unchanged. A ``soup`` already parsed from ``raw_html`` is
+    cleaned in place instead of parsing the description again, if the
+    description needs the tree path at all; it cannot be used afterwards.
+    """
+    original_html = raw_html
     try:
+        metrics.count('clean_html.documents')
         if not raw_html or not isinstance(raw_html, str):
-            print(f"Invalid input type for product {product_code}: {type(raw_html)}")
-            return pd.Series({'new_description': raw_html})
-            
-        if not validate_html(raw_html):
-            print(f"Invalid HTML for product code: {product_code}. First 100 chars: {raw_html[:100]}")
-            return pd.Series({'new_description': raw_html})
+            logger.debug(f"Invalid input type for product {product_code}: {type(raw_html)}")
+            metrics.count('clean_html.invalid_input')
+            return raw_html
+
+        timer = StageTimer(metrics.active())
+        if is_already_clean(raw_html, parser):
+            timer.lap('clean_html.fast_path')
+            metrics.count('clean_html.fast_path')
+            return raw_html
+
+        if not has_markup(raw_html):
+            logger.debug(f"Invalid HTML for product code: {product_code}. First 100 chars: {raw_html[:100]}")
+            metrics.count('clean_html.invalid_html')
+            return raw_html
+        if BLOCK_MARKER_START in raw_html:
+            raise HTMLValidationError("description contains the reserved block marker character")
+        timer.lap('clean_html.validate')
 
         # Normalize line endings and self-closing tags
-        raw_html = raw_html.replace('<br/>', '<br>').replace('<br />', '<br>')
-        raw_html = raw_html.replace('<hr/>', '<hr>').replace('<hr />', '<hr>')
-        
-        soup = BeautifulSoup(raw_html, "html.parser")
-        preserved_blocks = []
-
-        def preserve_blocks(tag_class: str, label: str) -> None:
-            """Preserve specific blocks of HTML."""
-            try:
-                for i, div in enumerate(soup.find_all("div", class_=tag_class)):
-                    placeholder = f"___{label.upper()}_PLACEHOLDER_{i}___"
-                    preserved_blocks.append((placeholder, str(div)))
-                    div.replace_with(placeholder)
-            except Exception:
-                pass
-
-        # Preserve important blocks
-        preserve_blocks("product-info", "product_info")
-        preserve_blocks("fx-iframeContainer", "iframe_container")
-
-        # Preserve iframes
-        for i, iframe in enumerate(soup.find_all("iframe")):
-            placeholder = f"___IFRAME_TAG_PLACEHOLDER_{i}___"
-            preserved_blocks.append((placeholder, str(iframe)))
-            iframe.replace_with(placeholder)
-
-        # Process tags
-        for tag in soup.find_all():
-            convert_span_to_p(tag)
-
-        # Clean attributes
-        for tag in soup.find_all():
-            if tag.name in ALLOWED_TAGS:
-                allowed_attrs = ALLOWED_ATTRS.get(tag.name, [])
-                for attr in list(tag.attrs):
-                    if attr.lower() not in allowed_attrs:
-                        del tag.attrs[attr]
+        normalized_html = raw_html.replace('<br/>', '<br>').replace('<br />', '<br>')
+        normalized_html = normalized_html.replace('<hr/>', '<hr>').replace('<hr />', '<hr>')
+        if normalized_html != raw_html:
+            # BeautifulSoup closes <br/> and <br> differently, the given parse may not match
+            raw_html, soup = normalized_html, None
+
+        try:
+            check_markup(raw_html)
+        except ResourceLimitExceeded:
+            html_sanitized = sanitize_without_tree(raw_html, parser)
+            if html_sanitized is None:
+                raise
+            metrics.count('clean_html.guard_sanitized')
+            return html_sanitized
+        timer.lap('clean_html.guard')
+
+        with deadline():
+            cache = shared_fragment_cache() if resolve_parser(parser) == 'html.parser' else None
+            if cache is not None:
+                html_memoized = clean_fragments(raw_html, cache, parser, timer)
+                if html_memoized is not None:
+                    return html_memoized
+
+            return clean_markup(raw_html, parser, timer, soup)[0]
+
+    except ResourceLimitExceeded as e:
+        logger.warning(f"Description of product {product_code} passed through unchanged: {e}")
+        metrics.count(f'clean_html.guard_{e.limit}')
+        metrics.count('clean_html.guard_passthrough')
+        return PassedThrough(original_html)
+    except Exception as e:
+        logger.warning(f"Error cleaning HTML for product code {product_code}: {str(e)}")
+        metrics.count('clean_html.fallbacks')
+        return raw_html  # Return original HTML on error
+
+def clean_markup(html: str, parser: Optional[str] = None, timer: Optional[StageTimer] = None,
+                 soup: Optional[BeautifulSoup] = None) -> Tuple[str, bool]:
+    """Clean validated and normalized markup with the token sanitizer or the tree path.
+
+    The tree path cleans ``soup`` in place if it is given. Returns the
+    cleaned HTML and whether all h3 tags were wrapped, see restructure_tree.
+    """
+    timer = timer or StageTimer(None)
+    html_sanitized = sanitize_without_tree(html, parser)
+    timer.lap('clean_html.token_sanitizer')
+    if html_sanitized is not None:
+        metrics.count('clean_html.token_sanitizer')
+        return html_sanitized, True
+
+    if soup is None:
+        soup = make_soup(html, parser)
+        timer.lap('clean_html.parse')
+    check_deadline()
+    blocks = preserve_blocks(soup)
+    timer.lap('clean_html.preserve_blocks', len(blocks))
+    timer.lap('clean_html.sanitize_tags', sanitize_tags(soup, blocks))
+    check_deadline()
+    wrapped_all = restructure_tree(soup, timer, blocks)
+    check_deadline()
+
+    # Preserved blocks are emitted verbatim, outside the line stripping
+    rendered_blocks = []
+    for i, block in enumerate(blocks):
+        rendered_blocks.append(str(block))
+        block.replace_with(BLOCK_MARKER.format(i))
+
+    # Finalize HTML
+    html = str(soup)
+    lines = html.splitlines()
+    cleaned_lines = [line.strip() for line in lines if line.strip()]
+    html_minified = '\n'.join(cleaned_lines)
+    timer.lap('clean_html.serialize')
+
+    if rendered_blocks:
+        html_minified = BLOCK_MARKER_RE.sub(lambda match: rendered_blocks[int(match.group(1))], html_minified)
+    html_minified = html_minified.replace('<br/>', '<br>').replace('<br />', '<br>')
+    timer.lap('clean_html.restore_blocks', len(blocks))
+    return html_minified, wrapped_all
+
+def clean_fragments(html: str, cache: FragmentCache, parser: Optional[str] = None,
+                    timer: Optional[StageTimer] = None) -> Optional[str]:
+    """Clean a description fragment by fragment, reusing fragments cleaned before.
+
+    Returns None if the description cannot be split or one of its fragments
+    does not clean the same on its own, e.g. an empty h3 that would stop the
+    h3 wrapping in the following fragments too.
+    """
+    timer = timer or StageTimer(None)
+    fragments = split_fragments(html)
+    timer.lap('clean_html.split_fragments', len(fragments or ()))
+    if fragments is None:
+        return None
+    results = []
+    try:
+        for fragment in fragments:
+            key = cache.key(fragment)
+            cleaned = cache.get(key)
+            if cleaned is None:
+                metrics.count('clean_html.fragment_misses')
+                cleaned, wrapped_all = clean_markup(fragment, parser, timer)
+                if not wrapped_all:
+                    return None
+                cache.put(key, cleaned)
             else:
-                tag.unwrap()
-
-        # Remove empty tags
-        for tag in soup.find_all():
-            if tag.name in ALLOWED_TAGS and is_empty_tag(tag):
-                if tag.find('img'):
-                    continue
-                tag.decompose()
-
-        def remove_consecutive_brs(soup: BeautifulSoup) -> None:
-            """Remove consecutive break tags."""
-            try:
-                for tag in soup.find_all():
-                    prev = None
-                    for child in list(tag.children):
-                        if isinstance(child, Tag) and child.name == 'br':
-                            if isinstance(prev, Tag) and prev.name == 'br':
-                                child.decompose()
-                                continue
-                        prev = child
-            except Exception:
-                pass
-
-        # Apply all cleaning functions
-        flatten_nested_tags(soup)
-        unwrap_p_in_li(soup)
-        unwrap_strong_inside_headings(soup)
-        wrap_h3_content_in_em(soup)
-        remove_consecutive_brs(soup)
-        wrap_img_in_p(soup)
-        remove_empty_paragraphs(soup)
-
-        # Finalize HTML
-        html = str(soup)
-        lines = html.splitlines()
-        cleaned_lines = [line.strip() for line in lines if line.strip()]
-        html_minified = '\n'.join(cleaned_lines)
-
-        # Restore preserved blocks
-        for placeholder, content in preserved_blocks:
-            html_minified = html_minified.replace(placeholder, content)
-
-        html_minified = html_minified.replace('<br/>', '<br>').replace('<br />', '<br>')
-        
-        return pd.Series({
-            'new_description': html_minified
-        })
-
+                metrics.count('clean_html.fragment_hits')
+            if cleaned:
+                results.append(cleaned)
+    except ResourceLimitExceeded:
+        raise
     except Exception as e:
-        print(f"Error cleaning HTML for product code {product_code}: {str(e)}")
-        return pd.Series({
-            'new_description': raw_html  # Return original HTML on error
-        })
+        logger.debug(f"Cleaning fragments failed, cleaning the whole description: {str(e)}")
+        return None
+    return '\n'.join(results)
+
+def clean_html(raw_html: str, product_code: Optional[str] = None, parser: Optional[str] = None) -> 'pd.Series':
+    """Clean and sanitize HTML content.
+
+    Returns the cleaned description as ``new_description`` in a Series, for
+    DataFrame.apply; pandas is only imported here, clean_description does not need it.
+    """
+    import pandas as pd
+    return pd.Series({'new_description': clean_description(raw_html, product_code, parser)})
+
+def clean_html_chunk(rows: Iterable[Tuple[str, Optional[str]]], parser: Optional[str] = None) -> List[str]:
+    """Clean (description, product_code) rows, e.g. a chunk in a worker process.
+
+    The batch form of clean_html: returns the cleaned descriptions as a list
+    of strings, ready to be assigned as a column.
+    """
+    return [clean_description(html, code, parser) for html, code in rows]
+
+def clean_html_chunk_with_metrics(rows: List[Tuple[str, Optional[str]]]) -> Tuple[List[str], dict]:
+    """Clean a chunk like clean_html_chunk and return its stage metrics as well."""
+    stage_metrics = metrics.StageMetrics()
+    with metrics.collecting(stage_metrics):
+        results = clean_html_chunk(rows)
+    return results, stage_metrics.to_dict()
 
 # def remove_beta_classes(html: str) -> str:
 #     soup = BeautifulSoup(html, "html.parser")
@@ -0,0 +1,96 @@
+"""Per-document resource limits.
+
+A few legacy descriptions, such as pasted Word HTML with thousands of
+nested span and font tags, take seconds to parse and clean. Before a
+description goes to the tree path its size, number of tags and nesting
+depth are measured with a scan of its tags, without parsing it, and the
+tree path runs against a deadline that the cleaning stages check. Parsing
+itself cannot be interrupted, which is what the size limits are for.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional
+from config import GUARD_CONFIG, VOID_TAGS
+from fastpath import OTHER_VOID_TAGS
+from sanitizer import TAG_RE
+
+ALL_VOID_TAGS = VOID_TAGS | OTHER_VOID_TAGS
+
+# Deadline of the document being cleaned, if any, per thread
+_state = threading.local()
+
+class ResourceLimitExceeded(Exception):
+    """Raised when a description goes over one of the limits in GUARD_CONFIG."""
+
+    def __init__(self, limit: str, value: float, maximum: float):
+        super().__init__(f"{limit} {value:g} over the limit of {maximum:g}")
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+
+class PassedThrough(str):
+    """A description returned unchanged because it went over a resource limit.
+
+    Whether the time limit is hit depends on the load of the machine, so
+    these are not cached, checkpointed or recorded as processed, and are
+    cleaned again by the next run.
+    """
+
+class MarkupSize(NamedTuple):
+    chars: int
+    nodes: int
+    depth: int
+
+def measure_markup(html: str) -> MarkupSize:
+    """Count the tags of a description and how deep they nest, the way html.parser nests them."""
+    open_tags = []
+    nodes = depth = 0
+    for match in TAG_RE.finditer(html):
+        end_name, start_name, _, self_closing = match.groups()
+        if start_name is None:
+            name = end_name.lower()
+            if name in open_tags:
+                del open_tags[len(open_tags) - 1 - open_tags[::-1].index(name):]
+            continue
+        nodes += 1
+        if not self_closing and start_name.lower() not in ALL_VOID_TAGS:
+            open_tags.append(start_name.lower())
+            depth = max(depth, len(open_tags))
+    return MarkupSize(len(html), nodes, depth)
+
+def check_markup(html: str) -> None:
+    """Raise ResourceLimitExceeded if a description is too large or too deeply nested."""
+    if not GUARD_CONFIG['enabled']:
+        return
+    if len(html) > GUARD_CONFIG['max_chars']:
+        raise ResourceLimitExceeded('chars', len(html), GUARD_CONFIG['max_chars'])
+    # Nodes and depth are at most the number of start tags; counting '<' is far cheaper than the scan
+    if html.count('<') - html.count('</') <= min(GUARD_CONFIG['max_nodes'], GUARD_CONFIG['max_depth']):
+        return
+    size = measure_markup(html)
+    if size.nodes > GUARD_CONFIG['max_nodes']:
+        raise ResourceLimitExceeded('nodes', size.nodes, GUARD_CONFIG['max_nodes'])
+    if size.depth > GUARD_CONFIG['max_depth']:
+        raise ResourceLimitExceeded('depth', size.depth, GUARD_CONFIG['max_depth'])
+
+@contextmanager
+def deadline(seconds: Optional[float] = None) -> Iterator[None]:
+    """Give the document cleaned in this block ``seconds`` of wall-clock time, see check_deadline."""
+    seconds = GUARD_CONFIG['max_seconds'] if seconds is None else seconds
+    previous = getattr(_state, 'deadline', None)
+    _state.deadline = (time.perf_counter() + seconds, seconds) if GUARD_CONFIG['enabled'] and seconds else None
+    try:
+        yield
+    finally:
+        _state.deadline = previous
+
+def check_deadline() -> None:
+    """Raise ResourceLimitExceeded if the document being cleaned has run out of time."""
+    current = getattr(_state, 'deadline', None)
+    if current is None:
+        return
+    ends, seconds = current
+    now = time.perf_counter()
+    if now > ends:
+        raise ResourceLimitExceeded('seconds', round(seconds + now - ends, 3), seconds)
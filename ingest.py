@@ -0,0 +1,74 @@
+"""Column-projected CSV ingest.
+
+Shop exports carry dozens of columns the pipelines never look at, and
+parsing them takes most of the ingest time and memory. CSV files are read
+with the C engine by default. pandas' pyarrow engine ('pyarrow', or 'auto'
+when pyarrow is installed) cannot read quoted values spanning lines, which
+most descriptions are, and reads text columns as numbers before converting
+them, losing leading zeros; it only suits exports without either. Chunked
+reads always use the C engine, which is the one that reads in chunks. The output of a pipeline is its input rows, so every
+column is read by default; a pipeline given a list of columns in
+INGEST_CONFIG reads, and writes out, only those. Code and EAN columns are
+then read as text, so they keep leading zeros and need no conversion.
+
+The prefilter patterns are compiled once and run over whole columns before
+any row reaches the cleaning.
+"""
+import importlib.util
+import logging
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+import pandas as pd
+from config import BETA_CLASS_SUFFIX, CSV_DELIMITER, EXCLUDED_PRODUCTS, INGEST_CONFIG
+
+logger = logging.getLogger(__name__)
+
+EXCLUDED_RE = re.compile('|'.join(EXCLUDED_PRODUCTS), re.IGNORECASE)
+SPAN_RE = re.compile(re.escape('<span'), re.IGNORECASE)
+BETA_RE = re.compile(re.escape(BETA_CLASS_SUFFIX), re.IGNORECASE)
+
+@lru_cache(maxsize=None)
+def has_pyarrow() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+def csv_engine(engine: Optional[str] = None, chunked: bool = False) -> str:
+    """Return the pandas CSV engine to use: 'auto' picks pyarrow if it is installed."""
+    engine = engine or INGEST_CONFIG['engine']
+    if chunked:
+        return 'c'
+    if engine == 'auto':
+        return 'pyarrow' if has_pyarrow() else 'c'
+    if engine == 'pyarrow' and not has_pyarrow():
+        logger.warning("pyarrow is not installed, reading CSV files with the C engine")
+        return 'c'
+    return engine
+
+def project_columns(file_path: Union[str, Path], columns: Optional[Sequence[str]],
+                    delimiter: str = CSV_DELIMITER) -> Optional[List[str]]:
+    """Return the ``columns`` present in the header of a CSV file, in file order, or None for all of them."""
+    if columns is None:
+        return None
+    header = pd.read_csv(file_path, delimiter=delimiter, nrows=0).columns
+    wanted = set(columns)
+    return [column for column in header if column in wanted]
+
+def read_options(file_path: Union[str, Path], pipeline: Optional[str] = None,
+                 delimiter: str = CSV_DELIMITER, chunked: bool = False) -> dict:
+    """Return the read_csv options that read ``pipeline``'s columns of a CSV file.
+
+    Without a ``pipeline``, or for one mapped to None in INGEST_CONFIG (the
+    default), every column is read.
+    """
+    columns = INGEST_CONFIG['columns'].get(pipeline) if pipeline else None
+    usecols = project_columns(file_path, columns, delimiter)
+    options = {'engine': csv_engine(chunked=chunked)}
+    if usecols is not None:
+        options['usecols'] = usecols
+        options['dtype'] = {column: str for column in INGEST_CONFIG['text_columns'] if column in usecols}
+    return options
+
+def contains(series: pd.Series, pattern: re.Pattern) -> pd.Series:
+    """Vectorised match of a compiled pattern over a text column; missing values do not match."""
+    return series.str.contains(pattern, na=False)
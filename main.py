@@ -1,14 +1,36 @@
 import pandas as pd
 import os
+import argparse
 import logging
 import logging.config
-from pathlib import Path
-from typing import Optional
-from functions import clean_html, add_beta_classes
-from compatibility import extract_h3_from_descriptions
-from config import LOGGING_CONFIG, FILE_PATHS, CSV_DELIMITER, EXCLUDED_PRODUCTS
+import time
+from functools import partial
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set
+from functions import (
+    clean_html_chunk, clean_html_chunk_with_metrics, add_beta_classes, is_already_clean
+)
+from analysis import ANALYSES, analysis_columns, analyze_columns, analyze_columns_with_metrics
+from cache import DescriptionCache, open_cache
+from checkpoint import CheckpointStore, open_checkpoint
+from fragments import shared_fragment_cache
+from streaming import stream_pipeline
+from ingest import BETA_RE, EXCLUDED_RE, SPAN_RE, contains, read_options
+from output import OUTPUT_FORMATS, output_path, write_table
+from pageweight import PAGE_WEIGHT_COLUMNS, optimize_columns, optimize_columns_with_metrics
+from sheets import load_processed_eans, normalize_ean
+from shoper import ShoperPush, open_shoper_push
+from manifest import DeltaManifest, open_manifest
+import metrics
+from metrics import RunMetrics, StageMetrics, StageTimer, open_run_metrics
+from config import (
+    LOGGING_CONFIG, FILE_PATHS, CSV_DELIMITER,
+    PARALLEL_CONFIG, CACHE_CONFIG, STREAMING_CONFIG, METRICS_CONFIG, GOOGLE_SHEETS, DELTA_CONFIG, VENDORS,
+    OUTPUT_CONFIG, PAGE_WEIGHT_CONFIG, SHOPER_CONFIG, ensure_directories
+)
 
 # Configure logging
+ensure_directories()
 logging.config.dictConfig(LOGGING_CONFIG)
 logger = logging.getLogger(__name__)
 
@@ -20,159 +42,696 @@ def validate_file_path(file_path: str) -> bool:
         logger.error(f"Error validating file {file_path}: {str(e)}")
         return False
 
-def safe_read_csv(file_path: str, delimiter: str = CSV_DELIMITER) -> Optional[pd.DataFrame]:
-    """Safely read CSV file with error handling."""
+def safe_read_csv(file_path: str, delimiter: str = CSV_DELIMITER,
+                  pipeline: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Safely read CSV file with error handling.
+
+    With a ``pipeline`` only its columns from ``INGEST_CONFIG`` are read, if it lists any.
+    """
     try:
         if not validate_file_path(file_path):
             raise FileNotFoundError(f"File not found or not accessible: {file_path}")
-        return pd.read_csv(file_path, delimiter=delimiter)
+        return pd.read_csv(file_path, delimiter=delimiter, **read_options(file_path, pipeline, delimiter))
     except Exception as e:
         logger.error(f"Error reading CSV file {file_path}: {str(e)}")
         return None
 
-def safe_write_excel(df: pd.DataFrame, file_path: str) -> bool:
-    """Safely write DataFrame to Excel with error handling."""
+def safe_write_excel(df: pd.DataFrame, file_path: str, output_format: Optional[str] = None) -> bool:
+    """Safely write DataFrame to Excel, or to ``output_format``, with error handling.
+
+    For other formats the suffix of ``file_path`` is replaced by the format's one.
+    """
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        df.to_excel(file_path, index=False)
-        logger.info(f"Successfully wrote data to {file_path}")
+        written = write_table(df, file_path, output_format)
+        logger.info(
+            f"Successfully wrote {written['rows']} rows to {written['path']} "
+            f"({written['bytes'] / 1024:.1f} KiB in {written['seconds']:.2f}s)"
+        )
         return True
     except Exception as e:
-        logger.error(f"Error writing to Excel file {file_path}: {str(e)}")
+        logger.error(f"Error writing {file_path} as {output_format or OUTPUT_CONFIG['format']}: {str(e)}")
         return False
 
-def generate_clean_empty_descriptions():
-    """Generate clean descriptions for empty offers from different vendors."""
+def clean_descriptions(df: pd.DataFrame, description_column: str, code_column: str,
+                       workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                       cache: Optional[DescriptionCache] = None,
+                       stage_metrics: Optional[StageMetrics] = None,
+                       executor: Optional[Executor] = None,
+                       checkpoint: Optional[CheckpointStore] = None) -> List[str]:
+    """Clean a description column, sharding the rows over a process pool.
+
+    Descriptions that are already clean are kept as they are. The other rows
+    are cut into chunks of ``chunk_size`` and cleaned by ``workers``
+    processes; results come back in the original row order. With a single
+    worker everything runs in-process. Rows found in ``cache`` are not
+    cleaned again, and freshly cleaned rows are stored in it. Stage timings
+    and counters are added to ``stage_metrics`` when given. A shared
+    ``executor`` is used instead of a pool of its own when given. With a
+    ``checkpoint`` the rows are cleaned one range of input rows at a time,
+    each range saved as soon as it is done, and ranges saved by an earlier
+    run are not cleaned again.
+    """
+    rows = list(zip(df[description_column], df[code_column]))
+    timer = StageTimer(stage_metrics)
+    already_clean = [is_already_clean(html) for html, _ in rows]
+    dirty = [row for row, clean in zip(rows, already_clean) if not clean]
+    timer.lap('clean_html.fast_path', len(rows))
+    if stage_metrics is not None:
+        stage_metrics.count('clean_html.fast_path', len(rows) - len(dirty))
+    if len(dirty) < len(rows):
+        logger.info(f"{len(rows) - len(dirty)} of {len(rows)} descriptions are already clean")
+
+    clean_dirty = partial(clean_rows_cached, workers=workers, chunk_size=chunk_size, cache=cache,
+                          stage_metrics=stage_metrics, executor=executor)
+    if checkpoint is None:
+        cleaned = clean_dirty(dirty)
+    else:
+        labels = [label for label, clean in zip(df.index, already_clean) if not clean]
+        cleaned = checkpoint.map_ranges(labels, dirty, clean_dirty)
+    cleaned_iter = iter(cleaned)
+    return [html if clean else next(cleaned_iter) for (html, _), clean in zip(rows, already_clean)]
+
+def clean_rows_cached(rows: List[tuple], workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                      cache: Optional[DescriptionCache] = None,
+                      stage_metrics: Optional[StageMetrics] = None,
+                      executor: Optional[Executor] = None) -> List[str]:
+    """Clean (description, product_code) rows, reusing and filling the cache if given."""
+    if cache is None:
+        return clean_rows(rows, workers, chunk_size, stage_metrics, executor)
+
+    cached = cache.get_many('clean_html', [html for html, _ in rows if isinstance(html, str)])
+    pending = [row for row in rows if not (isinstance(row[0], str) and row[0] in cached)]
+    if stage_metrics is not None:
+        stage_metrics.count('clean_html.cache_hits', len(rows) - len(pending))
+    cleaned = clean_rows(pending, workers, chunk_size, stage_metrics, executor)
+    cache.put_many('clean_html', [(html, new) for (html, _), new in zip(pending, cleaned)])
+
+    cleaned_iter = iter(cleaned)
+    return [
+        cached[html] if isinstance(html, str) and html in cached else next(cleaned_iter)
+        for html, _ in rows
+    ]
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """Return the number of cleaning processes, 0 or None meaning one per CPU core."""
+    workers = PARALLEL_CONFIG['workers'] if workers is None else workers
+    return workers or os.cpu_count() or 1
+
+def clean_rows(rows: List[tuple], workers: Optional[int] = None, chunk_size: Optional[int] = None,
+               stage_metrics: Optional[StageMetrics] = None, executor: Optional[Executor] = None) -> List[str]:
+    """Clean (description, product_code) rows in chunks, in parallel when workers > 1."""
+    workers = resolve_workers(workers)
+    chunk_size = chunk_size or PARALLEL_CONFIG['chunk_size']
+
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    clean_chunk = clean_html_chunk if stage_metrics is None else clean_html_chunk_with_metrics
+    if executor is not None and chunks:
+        results = list(executor.map(clean_chunk, chunks))
+    elif workers <= 1 or len(chunks) <= 1:
+        results = [clean_chunk(chunk) for chunk in chunks]
+    else:
+        logger.info(f"Cleaning {len(rows)} rows in {len(chunks)} chunks with {workers} workers...")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            results = list(executor.map(clean_chunk, chunks))
+
+    if stage_metrics is not None:
+        for _, snapshot in results:
+            stage_metrics.merge(snapshot)
+        results = [descriptions for descriptions, _ in results]
+    return [description for chunk in results for description in chunk]
+
+def analyze_descriptions(df: pd.DataFrame, description_column: str, code_column: str,
+                         analyses: Optional[List[str]] = None, workers: Optional[int] = None,
+                         chunk_size: Optional[int] = None,
+                         stage_metrics: Optional[StageMetrics] = None) -> Dict[str, List]:
+    """Run the selected analyses over a description column, in parallel when workers > 1.
+
+    Returns one list per output column, in the original row order.
+    """
+    analyses = analyses or list(ANALYSES)
+    workers = resolve_workers(workers)
+    chunk_size = chunk_size or PARALLEL_CONFIG['chunk_size']
+    rows = list(zip(df[description_column], df[code_column]))
+
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    analyze_chunk = partial(analyze_columns if stage_metrics is None else analyze_columns_with_metrics,
+                            analyses=analyses)
+    if workers <= 1 or len(chunks) <= 1:
+        results = [analyze_chunk(chunk) for chunk in chunks]
+    else:
+        logger.info(f"Analyzing {len(rows)} rows in {len(chunks)} chunks with {workers} workers...")
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            results = list(executor.map(analyze_chunk, chunks))
+
+    if stage_metrics is not None:
+        for _, snapshot in results:
+            stage_metrics.merge(snapshot)
+        results = [columns for columns, _ in results]
+    return {
+        column: [value for columns in results for value in columns[column]]
+        for column in analysis_columns(analyses)
+    }
+
+def optimize_descriptions(df: pd.DataFrame, description_column: str, workers: Optional[int] = None,
+                          chunk_size: Optional[int] = None,
+                          stage_metrics: Optional[StageMetrics] = None,
+                          executor: Optional[Executor] = None) -> Dict[str, List]:
+    """Run the page-weight stage over ``new_description``, in parallel when workers > 1.
+
+    Returns the optimised descriptions as ``new_description`` and the page
+    weight columns comparing them with ``description_column``. A shared
+    ``executor`` is used instead of a pool of its own when given.
+    """
+    workers = resolve_workers(workers)
+    chunk_size = chunk_size or PARALLEL_CONFIG['chunk_size']
+    rows = list(zip(df[description_column], df['new_description']))
+
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    optimize_chunk = optimize_columns if stage_metrics is None else optimize_columns_with_metrics
+    if executor is not None and chunks:
+        results = list(executor.map(optimize_chunk, chunks))
+    elif workers <= 1 or len(chunks) <= 1:
+        results = [optimize_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            results = list(executor.map(optimize_chunk, chunks))
+
+    if stage_metrics is not None:
+        for _, snapshot in results:
+            stage_metrics.merge(snapshot)
+        results = [columns for columns, _ in results]
+    columns = {
+        column: [value for chunk in results for value in chunk[column]]
+        for column in ['new_description'] + PAGE_WEIGHT_COLUMNS
+    }
+    if rows:
+        before, after = sum(columns['bytes_before']), sum(columns['bytes_after'])
+        logger.info(f"Page weight: {before / 1024:.1f} KiB -> {after / 1024:.1f} KiB, "
+                    f"{sum(columns['nodes_before'])} -> {sum(columns['nodes_after'])} tags")
+    return columns
+
+def add_beta_classes_cached(descriptions: pd.Series, cache: Optional[DescriptionCache] = None,
+                            stage_metrics: Optional[StageMetrics] = None) -> List[str]:
+    """Add beta classes to a description column, reusing cached results."""
+    with metrics.collecting(stage_metrics):
+        if cache is None:
+            return [add_beta_classes(html) for html in descriptions.tolist()]
+
+        htmls = descriptions.tolist()
+        cached = cache.get_many('add_beta_classes', [html for html in htmls if isinstance(html, str)])
+        fresh = {}
+        results = []
+        for html in htmls:
+            if isinstance(html, str) and html in cached:
+                results.append(cached[html])
+                metrics.count('add_beta_classes.cache_hits')
+            else:
+                results.append(add_beta_classes(html))
+                if isinstance(html, str):
+                    fresh[html] = results[-1]
+        cache.put_many('add_beta_classes', fresh.items())
+        return results
+
+def keep_changed(df: pd.DataFrame, code_column: str, description_column: str,
+                 manifest: Optional[DeltaManifest]) -> pd.DataFrame:
+    """Keep the rows whose description changed since the last delta run."""
+    if manifest is None:
+        return df
+    mask = manifest.changed(df[code_column], df[description_column])
+    return df[pd.Series(mask, index=df.index, dtype=bool)].copy()
+
+def keep_new_output(df: pd.DataFrame, code_column: str, description_column: str,
+                    manifest: Optional[DeltaManifest]) -> pd.DataFrame:
+    """Record processed rows in the manifest and keep those whose new description changed."""
+    if manifest is None:
+        return df
+    mask = manifest.record(df[code_column], df[description_column], df['new_description'])
+    return df[pd.Series(mask, index=df.index, dtype=bool)]
+
+def rows_to_push(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep the rows of an output chunk whose description changed, with the columns the shop push needs."""
+    columns = [column for column in ['product_code', SHOPER_CONFIG['id_column'], 'description', 'new_description']
+               if column in df.columns]
+    return df.loc[df['new_description'] != df['description'], columns]
+
+def push_changed(chunks: List[pd.DataFrame], shoper_push: Optional[ShoperPush]) -> None:
+    """Push the changed rows of a run's output to the shop once the output is saved, if pushing is enabled."""
+    if shoper_push is None or not chunks:
+        return
+    df = pd.concat(chunks, ignore_index=True)
+    if df.empty:
+        return
     try:
-        # Input files
-        input_files = {
-            'pancernik': FILE_PATHS['pancernik_empty'],
-            'bizon': FILE_PATHS['bizon_empty'],
-            'bewoodgrizz': FILE_PATHS['bewoodgrizz_empty']
-        }
-        
-        # Output files
-        output_files = {
-            'pancernik': FILE_PATHS['pancernik_result'],
-            'bizon': FILE_PATHS['bizon_result'],
-            'bewoodgrizz': FILE_PATHS['bewoodgrizz_result']
-        }
-
-        for vendor, input_file in input_files.items():
-            logger.info(f"Processing {vendor} data...")
-            df = safe_read_csv(input_file)
-            if df is None:
-                continue
-
-            # Process descriptions based on vendor
-            if vendor == 'pancernik':
-                df['new_description'] = df.apply(
-                    lambda row: clean_html(row['Opis PL'], product_code=row['Seria']),
-                    axis=1
-                )
-            elif vendor == 'bizon':
-                df['new_description'] = df.apply(
-                    lambda row: clean_html(row['Opis Shoper'], product_code=row['Seria - Kolor']),
-                    axis=1
-                )
-            else:  # bewoodgrizz
-                df['new_description'] = df.apply(
-                    lambda row: clean_html(row['Shoper PL'], product_code=row['Seria']),
-                    axis=1
-                )
-
-            if not safe_write_excel(df, output_files[vendor]):
-                logger.error(f"Failed to write {vendor} data to Excel")
+        shoper_push.push(df, 'product_code', 'description', 'new_description')
+    except Exception as e:
+        logger.error(f"Error pushing descriptions to Shoper: {str(e)}")
+
+def report_fragment_cache(run_metrics: Optional[RunMetrics]) -> None:
+    """Log how often cleaned fragments were reused during a run.
+
+    Worker processes keep fragment caches of their own, so their hits are
+    only known when metrics are collected; otherwise the cache of this
+    process is reported.
+    """
+    if run_metrics is not None:
+        counters = run_metrics.total().counters
+        hits, misses = counters.get('clean_html.fragment_hits', 0), counters.get('clean_html.fragment_misses', 0)
+    else:
+        cache = shared_fragment_cache()
+        if cache is None:
+            return
+        stats = cache.stats()
+        hits, misses = stats['hits'], stats['misses']
+    if hits + misses:
+        logger.info(f"Fragment cache: {hits} hits, {misses} misses ({hits / (hits + misses):.1%} hit rate)")
+
+def export_run_metrics(run_metrics: Optional[RunMetrics]) -> None:
+    """Write the metrics summary of a run, if metrics were collected."""
+    report_fragment_cache(run_metrics)
+    if run_metrics is None:
+        return
+    try:
+        total = run_metrics.total()
+        path = run_metrics.export()
+        fallbacks = sum(amount for name, amount in total.counters.items() if name.endswith('.fallbacks'))
+        guarded = total.counters.get('clean_html.guard_passthrough', 0)
+        logger.info(f"Metrics summary written to {path} ({fallbacks} fallbacks to original HTML, "
+                    f"{guarded} passed through over resource limits)")
+    except Exception as e:
+        logger.error(f"Error writing metrics summary: {str(e)}")
+
+def run_vendor_job(vendor: str, settings: dict, workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                   use_cache: Optional[bool] = None, delta: Optional[bool] = None,
+                   stage_metrics: Optional[StageMetrics] = None,
+                   executor: Optional[Executor] = None,
+                   output_format: Optional[str] = None,
+                   page_weight: Optional[bool] = None) -> Optional[Dict[str, float]]:
+    """Read, clean and write the empty offers of one vendor.
+
+    With ``page_weight`` the cleaned descriptions go through the page-weight
+    stage as well. Returns the seconds spent per step, or None if the vendor was skipped.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    cache = open_cache(use_cache)
+    try:
+        logger.info(f"Processing {vendor} data...")
+        df = safe_read_csv(settings['input'])
+        if df is None:
+            return None
+        timings['read'] = time.perf_counter() - started
+
+        description_column, code_column = settings['description_column'], settings['code_column']
+        page_weight = PAGE_WEIGHT_CONFIG['enabled'] if page_weight is None else page_weight
+        manifest = open_manifest(f'empty_offers-{vendor}', delta, page_weight)
+        df = keep_changed(df, code_column, description_column, manifest)
+        df['new_description'] = clean_descriptions(df, description_column, code_column, workers, chunk_size,
+                                                   cache, stage_metrics, executor)
+        if page_weight:
+            df = df.assign(**optimize_descriptions(
+                df, description_column, workers, chunk_size, stage_metrics, executor
+            ))
+        df = keep_new_output(df, code_column, description_column, manifest)
+        timings['clean'] = time.perf_counter() - started - timings['read']
+
+        if not safe_write_excel(df, settings['output'], output_format):
+            logger.error(f"Failed to write {vendor} data")
+            return None
+        if manifest is not None:
+            manifest.save()
+        timings['write'] = time.perf_counter() - started - timings['read'] - timings['clean']
+        timings['total'] = time.perf_counter() - started
+        if stage_metrics is not None:
+            for step in ('read', 'clean', 'write'):
+                stage_metrics.record(f'vendor.{step}', timings[step], len(df) if step == 'write' else 0)
+        return timings
+    finally:
+        if cache is not None:
+            cache.close()
+
+def generate_clean_empty_descriptions(workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                                      use_cache: Optional[bool] = None, collect_metrics: Optional[bool] = None,
+                                      delta: Optional[bool] = None, vendors: Optional[List[str]] = None,
+                                      vendor_jobs: Optional[int] = None, output_format: Optional[str] = None,
+                                      page_weight: Optional[bool] = None):
+    """Generate clean descriptions for empty offers from different vendors.
+
+    Vendors come from ``VENDORS`` in config (or the ``vendors`` subset) and
+    are processed concurrently, up to ``vendor_jobs`` at a time, so one
+    vendor's file reading and writing overlaps with another's cleaning. With
+    more than one worker, all vendors share one process pool for cleaning.
+    With ``delta`` only products whose description changed since the last run
+    are cleaned, and only rows whose cleaned description changed are written.
+    With ``page_weight`` the output goes through the page-weight stage.
+    """
+    run_metrics = open_run_metrics('empty_offers', collect_metrics)
+    vendor_jobs = PARALLEL_CONFIG['vendor_jobs'] if vendor_jobs is None else vendor_jobs
+    workers = resolve_workers(workers)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        selected = {vendor: VENDORS[vendor] for vendor in (vendors or VENDORS)}
+        with ThreadPoolExecutor(max_workers=vendor_jobs or len(selected) or 1) as scheduler:
+            jobs = {
+                scheduler.submit(
+                    run_vendor_job, vendor, settings, workers, chunk_size, use_cache, delta,
+                    run_metrics.scope(vendor) if run_metrics is not None else None, executor, output_format,
+                    page_weight
+                ): vendor
+                for vendor, settings in selected.items()
+            }
+            for job in as_completed(jobs):
+                vendor = jobs[job]
+                try:
+                    timings = job.result()
+                except Exception as e:
+                    logger.error(f"Error processing {vendor} data: {str(e)}")
+                    continue
+                if timings is not None:
+                    logger.info(
+                        f"{vendor} finished in {timings['total']:.1f}s (read {timings['read']:.1f}s, "
+                        f"clean {timings['clean']:.1f}s, write {timings['write']:.1f}s)"
+                    )
 
     except Exception as e:
         logger.error(f"Error in generate_clean_empty_descriptions: {str(e)}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        export_run_metrics(run_metrics)
+
+def select_offers_to_clean(df: pd.DataFrame, processed_eans: Optional[Set[str]] = None) -> pd.DataFrame:
+    """Preprocess offers and keep the ones whose description needs cleaning.
+
+    Offers whose EAN is in ``processed_eans`` have been handled already and are dropped.
+    The masks run over whole columns first; only the offers left are preprocessed.
+    """
+    df = df[contains(df['description'], SPAN_RE) & ~contains(df['title'], EXCLUDED_RE)]
+    ean_column = GOOGLE_SHEETS['offers_ean_column']
+    if processed_eans and ean_column in df.columns:
+        processed = df[ean_column].map(normalize_ean).isin(processed_eans)
+        if processed.any():
+            logger.info(f"Skipping {int(processed.sum())} offers already processed")
+            df = df[~processed]
+    df = df.copy()
+    df['description'] = df['description'].fillna('')
+    df['product_code'] = df['product_code'].astype(str)
+    return df
 
-def generate_clean_descriptions(input_file: str, output_file: str):
-    """Generate clean descriptions for all offers."""
+def select_offers_with_beta_classes(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep offers whose description already uses beta classes."""
+    return df[contains(df['description'], BETA_RE)].copy()
+
+def generate_clean_descriptions(input_file: str, output_file: str,
+                                workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                                use_cache: Optional[bool] = None, stream: Optional[bool] = None,
+                                stream_rows: Optional[int] = None, collect_metrics: Optional[bool] = None,
+                                offline: Optional[bool] = None, delta: Optional[bool] = None,
+                                output_format: Optional[str] = None, resume: bool = False,
+                                page_weight: Optional[bool] = None, push: Optional[bool] = None):
+    """Generate clean descriptions for all offers.
+
+    Offers already listed in the Google Sheets snapshot are skipped; with
+    ``offline`` the local snapshot is used without downloading the sheet.
+    With ``stream`` the input is read, cleaned and written in chunks of
+    ``stream_rows`` rows, so memory use does not grow with the catalog size.
+    With ``delta`` only offers whose description changed since the last run
+    are cleaned, and only rows whose cleaned description changed are written.
+    The output is written in ``output_format`` (default from ``OUTPUT_CONFIG``).
+    Cleaned rows are checkpointed while the run goes; with ``resume`` the
+    rows checkpointed by an interrupted run on the same input are reused.
+    With more than one worker, one process pool cleans every checkpoint
+    range and streamed chunk of the run.
+    With ``page_weight`` the cleaned descriptions go through the page-weight
+    stage, and the output gets their size and tag count before and after.
+    With ``push`` the changed descriptions are sent to the shop once the
+    output and the manifest are saved.
+    """
+    stream = STREAMING_CONFIG['enabled'] if stream is None else stream
+    page_weight = PAGE_WEIGHT_CONFIG['enabled'] if page_weight is None else page_weight
+    manifest = open_manifest('all_offers', delta, page_weight)
+    cache = open_cache(use_cache)
+    checkpoint = None
+    shoper_push = open_shoper_push(push)
+    to_push: List[pd.DataFrame] = []
+    run_metrics = open_run_metrics('all_offers', collect_metrics)
+    workers = resolve_workers(workers)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    stage_metrics = run_metrics.scope('all_offers') if run_metrics is not None else None
     try:
         # Google Sheets with processed codes
-        gsheets_url = 'https://docs.google.com/spreadsheets/d/1rz6QThoRfEreZWRczP0B8tuZoorVvSZlC7qWwryi-o0/export?format=csv&gid=0'
-        
         logger.info('Reading Google Sheets data...')
-        try:
-            gsheets_data = pd.read_csv(gsheets_url)
-        except Exception as e:
-            logger.error(f"Error reading Google Sheets data: {str(e)}")
+        processed_eans = load_processed_eans(offline)
+        if processed_eans is None:
+            logger.error("Error reading Google Sheets data")
+            return
+        checkpoint = open_checkpoint('all_offers', input_file, resume)
+
+        def process(df: pd.DataFrame) -> pd.DataFrame:
+            products_to_change = select_offers_to_clean(df, processed_eans)
+            products_to_change = keep_changed(products_to_change, 'product_code', 'description', manifest)
+            products_to_change['new_description'] = clean_descriptions(
+                products_to_change, 'description', 'product_code', workers, chunk_size, cache, stage_metrics,
+                executor, checkpoint
+            )
+            if page_weight:
+                products_to_change = products_to_change.assign(**optimize_descriptions(
+                    products_to_change, 'description', workers, chunk_size, stage_metrics, executor
+                ))
+            products_to_change = keep_new_output(products_to_change, 'product_code', 'description', manifest)
+            if shoper_push is not None:
+                to_push.append(rows_to_push(products_to_change))
+            return products_to_change
+
+        if stream:
+            logger.info('Streaming the input file through the cleaner...')
+            written = stream_pipeline(input_file, output_path(output_file, output_format), process, stream_rows,
+                                      read_options(input_file, 'all_offers', chunked=True))
+            if manifest is not None:
+                manifest.save()
+            if checkpoint is not None:
+                checkpoint.finish()
+            logger.info(f'Finished! Saved {written} rows.')
+            push_changed(to_push, shoper_push)
             return
 
         logger.info('Reading the input file...')
-        df = safe_read_csv(input_file)
+        df = safe_read_csv(input_file, pipeline='all_offers')
         if df is None:
             return
 
-        # Data preprocessing
-        df['description'] = df['description'].fillna('')
-        gsheets_data['ean'] = gsheets_data['ean'].astype(str)
-        df['product_code'] = df['product_code'].astype(str)
-
-        # Filtering
-        df = df[~df['title'].str.contains('|'.join(EXCLUDED_PRODUCTS), case=False, na=False)]
-        mask = df['description'].str.contains('<span', case=False, na=False)
-        products_to_change = df[mask].copy()
-
         logger.info('Creating copy with cleaned descriptions...')
-        new_cols = products_to_change.apply(
-            lambda row: clean_html(row['description'], product_code=row['product_code']),
-            axis=1
-        )
-        products_to_change = pd.concat([products_to_change, new_cols], axis=1)
+        products_to_change = process(df)
 
-        logger.info(f'Saving {len(products_to_change)} to Excel...')
-        if not safe_write_excel(products_to_change, output_file):
-            logger.error("Failed to write data to Excel")
+        logger.info(f'Saving {len(products_to_change)} rows...')
+        if not safe_write_excel(products_to_change, output_file, output_format):
+            logger.error("Failed to write output data")
             return
+        if manifest is not None:
+            manifest.save()
+        if checkpoint is not None:
+            checkpoint.finish()
 
         logger.info('Finished!')
+        push_changed(to_push, shoper_push)
 
     except Exception as e:
         logger.error(f"Error in generate_clean_descriptions: {str(e)}")
+    finally:
+        if cache is not None:
+            cache.close()
+        if checkpoint is not None and not checkpoint.closed:
+            checkpoint.close()
+            if checkpoint.saved:
+                logger.info(f"Cleaned rows checkpointed in {checkpoint.path}, rerun with --resume to reuse them")
+        if executor is not None:
+            executor.shutdown()
+        if shoper_push is not None:
+            shoper_push.close()
+        export_run_metrics(run_metrics)
 
-def generate_cleaned_descriptions_csv_to_xlsx():
-    """Generate cleaned descriptions from CSV to XLSX."""
+def generate_cleaned_descriptions_csv_to_xlsx(use_cache: Optional[bool] = None, stream: Optional[bool] = None,
+                                              stream_rows: Optional[int] = None,
+                                              collect_metrics: Optional[bool] = None, delta: Optional[bool] = None,
+                                              output_format: Optional[str] = None):
+    """Generate cleaned descriptions from CSV to XLSX, or to ``output_format``.
+
+    With ``delta`` only offers whose description changed since the last run
+    are processed, and only rows whose new description changed are written.
+    The beta-classed descriptions are for review and are not pushed to the shop.
+    """
+    stream = STREAMING_CONFIG['enabled'] if stream is None else stream
+    manifest = open_manifest('beta_classes', delta)
+    cache = open_cache(use_cache)
+    run_metrics = open_run_metrics('beta_classes', collect_metrics)
+    stage_metrics = run_metrics.scope('all_offers') if run_metrics is not None else None
     try:
         input_file = FILE_PATHS['all_offers']
         output_file = FILE_PATHS['all_offers_cleaned']
 
+        def process(df: pd.DataFrame) -> pd.DataFrame:
+            products_to_change = select_offers_with_beta_classes(df)
+            products_to_change = keep_changed(products_to_change, 'product_code', 'description', manifest)
+            products_to_change['new_description'] = add_beta_classes_cached(
+                products_to_change['description'], cache, stage_metrics
+            )
+            products_to_change = keep_new_output(products_to_change, 'product_code', 'description', manifest)
+            return products_to_change
+
+        if stream:
+            logger.info("Streaming input CSV...")
+            written = stream_pipeline(input_file, output_path(output_file, output_format), process, stream_rows,
+                                      read_options(input_file, 'beta_classes', chunked=True))
+            if manifest is not None:
+                manifest.save()
+            logger.info(f"Done! Saved {written} rows to {output_path(output_file, output_format)}")
+            return
+
         logger.info("Reading input CSV...")
-        df = safe_read_csv(input_file)
+        df = safe_read_csv(input_file, pipeline='beta_classes')
         if df is None:
             return
 
-        df['description'] = df['description'].fillna('')
-        mask = df['description'].str.contains('-beta', case=False, na=False)
-        products_to_change = df[mask].copy()
-
         logger.info('Creating copy with cleaned descriptions...')
-        products_to_change['new_description'] = products_to_change['description'].apply(add_beta_classes)
+        products_to_change = process(df)
 
-        logger.info("Saving to Excel...")
-        if not safe_write_excel(products_to_change, output_file):
-            logger.error("Failed to write data to Excel")
+        logger.info("Saving output...")
+        if not safe_write_excel(products_to_change, output_file, output_format):
+            logger.error("Failed to write output data")
             return
+        if manifest is not None:
+            manifest.save()
 
-        logger.info(f"Done! Saved to {output_file}")
+        logger.info(f"Done! Saved to {output_path(output_file, output_format)}")
 
     except Exception as e:
         logger.error(f"Error in generate_cleaned_descriptions_csv_to_xlsx: {str(e)}")
+    finally:
+        if cache is not None:
+            cache.close()
+        export_run_metrics(run_metrics)
+
+def generate_description_analysis(input_file: str, output_file: str, analyses: Optional[List[str]] = None,
+                                  workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                                  stream: Optional[bool] = None, stream_rows: Optional[int] = None,
+                                  collect_metrics: Optional[bool] = None, output_format: Optional[str] = None):
+    """Write the cleaned description, beta classes and h3 fields of every offer from one parse each.
+
+    ``analyses`` selects the outputs (default: all of ``ANALYSES``). Unlike
+    the separate jobs, every offer is analyzed, as in the h3 extraction.
+    """
+    stream = STREAMING_CONFIG['enabled'] if stream is None else stream
+    run_metrics = open_run_metrics('analysis', collect_metrics)
+    stage_metrics = run_metrics.scope('all_offers') if run_metrics is not None else None
+    try:
+        def process(df: pd.DataFrame) -> pd.DataFrame:
+            df['product_code'] = df['product_code'].astype(str)
+            return df.assign(**analyze_descriptions(df, 'description', 'product_code', analyses, workers,
+                                                    chunk_size, stage_metrics))
+
+        if stream:
+            logger.info('Streaming the input file through the analysis...')
+            written = stream_pipeline(input_file, output_path(output_file, output_format), process, stream_rows,
+                                      read_options(input_file, 'analysis', chunked=True))
+            logger.info(f'Finished! Saved {written} rows.')
+            return
+
+        logger.info('Reading the input file...')
+        df = safe_read_csv(input_file, pipeline='analysis')
+        if df is None:
+            return
+
+        logger.info(f"Analyzing descriptions ({', '.join(analyses or ANALYSES)})...")
+        df = process(df)
+
+        logger.info(f'Saving {len(df)} rows...')
+        if not safe_write_excel(df, output_file, output_format):
+            logger.error("Failed to write output data")
+            return
+
+        logger.info('Finished!')
+
+    except Exception as e:
+        logger.error(f"Error in generate_description_analysis: {str(e)}")
+    finally:
+        export_run_metrics(run_metrics)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description='Clean Shoper product descriptions.')
+    parser.add_argument('job', nargs='?', default='all_offers',
+                        choices=['all_offers', 'empty_offers', 'beta_classes', 'analysis'],
+                        help='pipeline to run (default: all_offers)')
+    parser.add_argument('--workers', type=int, default=PARALLEL_CONFIG['workers'],
+                        help='worker processes for cleaning, 0 for one per CPU core')
+    parser.add_argument('--vendor', action='append', choices=list(VENDORS), dest='vendors',
+                        help='vendor to process in empty_offers, may be repeated (default: all)')
+    parser.add_argument('--vendor-jobs', type=int, default=PARALLEL_CONFIG['vendor_jobs'],
+                        help='vendors processed at the same time in empty_offers, 0 for all at once')
+    parser.add_argument('--analysis', action='append', choices=list(ANALYSES), dest='analyses',
+                        help='output of the analysis job, may be repeated (default: all)')
+    parser.add_argument('--chunk-size', type=int, default=PARALLEL_CONFIG['chunk_size'],
+                        help='rows sent to a worker at a time')
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=CACHE_CONFIG['enabled'],
+                        help='reuse cleaned descriptions from the on-disk cache')
+    parser.add_argument('--stream', action=argparse.BooleanOptionalAction, default=STREAMING_CONFIG['enabled'],
+                        help='read, clean and write the input in chunks to keep memory flat')
+    parser.add_argument('--stream-rows', type=int, default=STREAMING_CONFIG['chunk_rows'],
+                        help='CSV rows per chunk in streaming mode')
+    parser.add_argument('--offline', action=argparse.BooleanOptionalAction, default=GOOGLE_SHEETS['offline'],
+                        help='use the local Google Sheets snapshot without downloading it (all_offers)')
+    parser.add_argument('--delta', action=argparse.BooleanOptionalAction, default=DELTA_CONFIG['enabled'],
+                        help='only process and write products that changed since the last run')
+    parser.add_argument('--metrics', action=argparse.BooleanOptionalAction, default=METRICS_CONFIG['enabled'],
+                        help='record per-stage timings and write a JSON summary to the logs directory')
+    parser.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default=OUTPUT_CONFIG['format'],
+                        help='output file format; parquet needs pyarrow (default: %(default)s)')
+    parser.add_argument('--page-weight', action=argparse.BooleanOptionalAction, default=PAGE_WEIGHT_CONFIG['enabled'],
+                        help='minify the cleaned descriptions, lazy-load images and iframes, report page weight')
+    parser.add_argument('--resume', action=argparse.BooleanOptionalAction, default=False,
+                        help='reuse the rows checkpointed by an interrupted run on the same input (all_offers)')
+    parser.add_argument('--push', action=argparse.BooleanOptionalAction, default=SHOPER_CONFIG['enabled'],
+                        help='send the changed descriptions to the Shoper REST API once the output is saved (all_offers)')
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
     # Create necessary directories
     os.makedirs('logs', exist_ok=True)
     os.makedirs('end_data', exist_ok=True)
-    
+
+    args = parse_args()
+
     # Run main processing
-    # generate_cleaned_descriptions_csv_to_xlsx()
-    
-    generate_clean_descriptions(
-        input_file=FILE_PATHS['all_offers'],
-        output_file=FILE_PATHS['all_offers_ready']
-    )
+    if args.job == 'beta_classes':
+        generate_cleaned_descriptions_csv_to_xlsx(use_cache=args.cache, stream=args.stream,
+                                                  stream_rows=args.stream_rows, collect_metrics=args.metrics,
+                                                  delta=args.delta, output_format=args.output_format)
+    elif args.job == 'analysis':
+        generate_description_analysis(input_file=FILE_PATHS['all_offers'], output_file=FILE_PATHS['all_offers_analysis'],
+                                      analyses=args.analyses, workers=args.workers, chunk_size=args.chunk_size,
+                                      stream=args.stream, stream_rows=args.stream_rows,
+                                      collect_metrics=args.metrics, output_format=args.output_format)
+    elif args.job == 'empty_offers':
+        generate_clean_empty_descriptions(workers=args.workers, chunk_size=args.chunk_size, use_cache=args.cache,
+                                          collect_metrics=args.metrics, delta=args.delta, vendors=args.vendors,
+                                          vendor_jobs=args.vendor_jobs, output_format=args.output_format,
+                                          page_weight=args.page_weight)
+    else:
+        generate_clean_descriptions(
+            input_file=FILE_PATHS['all_offers'],
+            output_file=FILE_PATHS['all_offers_ready'],
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            use_cache=args.cache,
+            stream=args.stream,
+            stream_rows=args.stream_rows,
+            collect_metrics=args.metrics,
+            offline=args.offline,
+            delta=args.delta,
+            output_format=args.output_format,
+            resume=args.resume,
+            page_weight=args.page_weight,
+            push=args.push
+        )
 
 # extract_h3_from_descriptions(
 #     input_file='data/all_offers.csv',
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+from cache import code_fingerprint, config_fingerprint
+from config import DELTA_CONFIG, PAGE_WEIGHT_CONFIG
+from guards import PassedThrough
+
+logger = logging.getLogger(__name__)
+
+def content_hash(text) -> str:
+    """Hash a description; missing values hash like the empty string."""
+    value = text if isinstance(text, str) else ''
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=16).hexdigest()
+
+def manifest_fingerprint(page_weight: bool = False) -> str:
+    """Hash what decides a job's output: the cleaning config and code, and the page-weight stage if it runs."""
+    settings = {'cleaning': config_fingerprint(), 'page_weight': None}
+    if page_weight:
+        settings['page_weight'] = {'config': PAGE_WEIGHT_CONFIG, 'code': code_fingerprint(('pageweight.py',))}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+class DeltaManifest:
+    """Raw and cleaned description hashes per product code from the previous run of a job.
+
+    ``changed`` tells which products have a new source description and need
+    processing; ``record`` stores the new hashes and tells which cleaned
+    descriptions differ from the previous run and need writing. If the
+    cleaning configuration changed, every product counts as changed, but only
+    rows whose output actually differs are written. The same goes for changes
+    to the cleaning code, and to whether the page-weight stage runs
+    (``page_weight``), its configuration and its code.
+    """
+
+    def __init__(self, job: str, directory: Union[str, Path] = DELTA_CONFIG['directory'],
+                 page_weight: bool = False):
+        self.job = job
+        self.path = Path(directory) / f'{job}.json'
+        self.fingerprint = manifest_fingerprint(page_weight)
+        self.entries: Dict[str, List[str]] = {}
+        self.rules_changed = False
+        self.processed = 0
+        self.skipped = 0
+        self.written = 0
+
+        if self.path.is_file():
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+                self.entries = data['products']
+                self.rules_changed = data.get('fingerprint') != self.fingerprint
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable manifest {self.path}: {str(e)}")
+        if self.rules_changed:
+            logger.info(f"Cleaning or page-weight configuration or code changed since the last {job} run, "
+                        f"reprocessing all products")
+
+    def changed(self, codes: Iterable, raw_descriptions: Iterable) -> List[bool]:
+        """Return, per row, whether the source description changed since the last run."""
+        mask = []
+        for code, raw in zip(codes, raw_descriptions):
+            entry = self.entries.get(str(code))
+            mask.append(self.rules_changed or entry is None or entry[0] != content_hash(raw))
+        changed = sum(mask)
+        self.processed += changed
+        self.skipped += len(mask) - changed
+        return mask
+
+    def record(self, codes: Iterable, raw_descriptions: Iterable, cleaned_descriptions: Iterable) -> List[bool]:
+        """Store the hashes of processed rows; return, per row, whether the output changed.
+
+        Rows passed through over a resource limit are not written and are
+        processed again by the next run.
+        """
+        mask = []
+        for code, raw, cleaned in zip(codes, raw_descriptions, cleaned_descriptions):
+            code = str(code)
+            if isinstance(cleaned, PassedThrough):
+                self.entries.pop(code, None)
+                mask.append(False)
+                continue
+            cleaned_hash = content_hash(cleaned)
+            previous = self.entries.get(code)
+            mask.append(previous is None or previous[1] != cleaned_hash)
+            self.entries[code] = [content_hash(raw), cleaned_hash]
+        self.written += sum(mask)
+        return mask
+
+    def save(self) -> None:
+        """Write the manifest; call only once the output of the run has been saved."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'job': self.job, 'fingerprint': self.fingerprint, 'products': self.entries}, f)
+        os.replace(temp_path, self.path)
+        logger.info(
+            f"Delta run {self.job}: {self.processed} products processed, {self.skipped} unchanged, "
+            f"{self.written} written"
+        )
+
+def open_manifest(job: str, enabled: Optional[bool] = None, page_weight: bool = False) -> Optional[DeltaManifest]:
+    """Load the manifest of a job, or return None when delta mode is disabled.
+
+    ``page_weight`` tells whether the job's output goes through the page-weight stage.
+    """
+    enabled = DELTA_CONFIG['enabled'] if enabled is None else enabled
+    return DeltaManifest(job, page_weight=page_weight) if enabled else None
@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+from config import METRICS_CONFIG
+
+# Collector that clean_html and add_beta_classes report to, if any, per thread
+_state = threading.local()
+
+class StageMetrics:
+    """Time spent and nodes touched per cleaning stage, plus event counters."""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def record(self, stage: str, seconds: float, nodes: int = 0) -> None:
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = {'calls': 0, 'seconds': 0.0, 'nodes': 0}
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['nodes'] += nodes
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def merge(self, other: Union['StageMetrics', dict]) -> None:
+        """Add the figures of another collector, or of its ``to_dict`` snapshot."""
+        data = other.to_dict() if isinstance(other, StageMetrics) else other
+        for stage, entry in data['stages'].items():
+            mine = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'nodes': 0})
+            for key in mine:
+                mine[key] += entry[key]
+        for counter, amount in data['counters'].items():
+            self.count(counter, amount)
+
+    def to_dict(self) -> dict:
+        return {
+            'stages': {stage: dict(entry) for stage, entry in self.stages.items()},
+            'counters': dict(self.counters),
+        }
+
+class StageTimer:
+    """Records consecutive stages of one document; does nothing without a collector."""
+
+    def __init__(self, metrics: Optional[StageMetrics]):
+        self.metrics = metrics
+        self.last = time.perf_counter() if metrics is not None else 0.0
+
+    def lap(self, stage: str, nodes: int = 0) -> None:
+        if self.metrics is None:
+            return
+        now = time.perf_counter()
+        self.metrics.record(stage, now - self.last, nodes)
+        self.last = now
+
+def active() -> Optional[StageMetrics]:
+    """Return the collector active in the current thread, if any."""
+    return getattr(_state, 'metrics', None)
+
+@contextmanager
+def collecting(metrics: Optional[StageMetrics]) -> Iterator[Optional[StageMetrics]]:
+    """Make ``metrics`` the active collector of this thread for the duration of the block."""
+    previous = active()
+    _state.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _state.metrics = previous
+
+def count(counter: str, amount: int = 1) -> None:
+    """Increment a counter on the active collector, if there is one."""
+    metrics = active()
+    if metrics is not None:
+        metrics.count(counter, amount)
+
+class RunMetrics:
+    """Stage metrics of one pipeline run, kept per scope (e.g. per vendor)."""
+
+    def __init__(self, run: str):
+        self.run = run
+        self.started = datetime.now()
+        self.scopes: Dict[str, StageMetrics] = {}
+
+    def scope(self, name: str) -> StageMetrics:
+        if name not in self.scopes:
+            self.scopes[name] = StageMetrics()
+        return self.scopes[name]
+
+    def total(self) -> StageMetrics:
+        total = StageMetrics()
+        for metrics in self.scopes.values():
+            total.merge(metrics)
+        return total
+
+    def export(self, directory: Union[str, Path] = METRICS_CONFIG['directory']) -> Path:
+        """Write the run summary as JSON and return its path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"metrics-{self.run}-{self.started:%Y%m%d-%H%M%S}.json"
+        summary = {
+            'run': self.run,
+            'started': self.started.isoformat(timespec='seconds'),
+            'duration_seconds': (datetime.now() - self.started).total_seconds(),
+            'total': self.total().to_dict(),
+            'scopes': {name: metrics.to_dict() for name, metrics in self.scopes.items()},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        return path
+
+def open_run_metrics(run: str, enabled: Optional[bool] = None) -> Optional[RunMetrics]:
+    """Start collecting metrics for a run, or return None when metrics are disabled."""
+    enabled = METRICS_CONFIG['enabled'] if enabled is None else enabled
+    return RunMetrics(run) if enabled else None
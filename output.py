@@ -0,0 +1,60 @@
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional, Union
+import pandas as pd
+from config import CSV_DELIMITER, OUTPUT_CONFIG
+from streaming import StreamingTableWriter
+
+logger = logging.getLogger(__name__)
+
+# Output format -> file suffix. 'xlsx-stream' writes the same spreadsheet as
+# 'xlsx' through an openpyxl write-only workbook, which is faster and keeps
+# less in memory; 'parquet' needs pyarrow (or fastparquet) installed.
+OUTPUT_FORMATS = {
+    'xlsx': '.xlsx',
+    'xlsx-stream': '.xlsx',
+    'csv': '.csv',
+    'jsonl': '.jsonl',
+    'parquet': '.parquet',
+}
+
+def resolve_format(output_format: Optional[str] = None) -> str:
+    output_format = output_format or OUTPUT_CONFIG['format']
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {', '.join(OUTPUT_FORMATS)}")
+    return output_format
+
+def output_path(file_path: Union[str, Path], output_format: Optional[str] = None) -> Path:
+    """Return ``file_path`` with the suffix of ``output_format``."""
+    return Path(file_path).with_suffix(OUTPUT_FORMATS[resolve_format(output_format)])
+
+def write_table(df: pd.DataFrame, file_path: Union[str, Path], output_format: Optional[str] = None) -> dict:
+    """Write ``df`` in ``output_format`` next to ``file_path`` and report what was written.
+
+    The suffix of ``file_path`` is replaced by the one of the format. Returns
+    the path written, the number of rows, the file size in bytes and the
+    seconds spent writing.
+    """
+    output_format = resolve_format(output_format)
+    path = output_path(file_path, output_format)
+    os.makedirs(path.parent, exist_ok=True)
+    started = time.perf_counter()
+    if output_format == 'xlsx':
+        df.to_excel(path, index=False)
+    elif output_format == 'xlsx-stream':
+        with StreamingTableWriter(path) as writer:
+            writer.write(df)
+    elif output_format == 'csv':
+        df.to_csv(path, sep=CSV_DELIMITER, index=False)
+    elif output_format == 'jsonl':
+        df.to_json(path, orient='records', lines=True, force_ascii=False)
+    else:
+        df.to_parquet(path, index=False)
+    return {
+        'path': str(path),
+        'rows': len(df),
+        'bytes': path.stat().st_size,
+        'seconds': time.perf_counter() - started,
+    }
@@ -0,0 +1,177 @@
+"""Storefront page-weight optimisation of cleaned descriptions.
+
+An optional stage after clean_html, for the HTML that ends up on product
+pages. Each step can be switched off in PAGE_WEIGHT_CONFIG:
+
+    minify                  collapse whitespace, drop whitespace next to
+                            block tags and comments, merge neighbouring
+                            <strong>/<em> tags
+    lazy_loading            loading="lazy" on img and iframe tags, preserved
+                            iframe blocks included, decoding="async" on img
+    drop_redundant_targets  drop link targets that only repeat the default
+
+Values already set on a tag are kept. The new attributes are in
+ALLOWED_ATTRS and go in the sorted order clean_html writes attributes in,
+so cleaning the output again leaves it as it is. The product-info
+blocks, iframe containers and iframes that clean_html keeps as they are
+are copied as they are too, apart from the lazy-loading attributes.
+"""
+import re
+from typing import Dict, Iterable, List, Tuple
+import metrics
+from config import PAGE_WEIGHT_CONFIG, PRESERVED_CLASSES
+from guards import PassedThrough, measure_markup
+from metrics import StageTimer
+
+# Tags whose boxes start and end a line, so whitespace next to them does not render
+BLOCK_TAGS = frozenset({
+    'p', 'h2', 'h3', 'ul', 'ol', 'li', 'hr', 'section', 'details', 'summary',
+    'div', 'table', 'thead', 'tbody', 'tfoot', 'tr', 'td', 'th', 'caption',
+})
+LAZY_TAGS = frozenset({'img', 'iframe'})
+MERGEABLE_TAGS = frozenset({'strong', 'em'})
+TAG_NAME_RE = re.compile(r'<[a-zA-Z][a-zA-Z0-9]*')
+ATTR_NAME_RE = re.compile(r"""[ \t\n\r\f]+([^ \t\n\r\f"'>/=]+)(?:[ \t\n\r\f]*=[ \t\n\r\f]*(?:"[^"]*"|'[^']*'|[^ \t\n\r\f>]+))?""")
+CLASS_RE = re.compile(r'[ \t\n\r\f]class[ \t\n\r\f]*=[ \t\n\r\f]*"([^"]*)"', re.IGNORECASE)
+REDUNDANT_TARGET_RE = re.compile(r"""[ \t\n\r\f]+target[ \t\n\r\f]*=[ \t\n\r\f]*(?:"[ \t]*(?:_self)?[ \t]*"|'[ \t]*(?:_self)?[ \t]*')""",
+                                 re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'[ \t\n\r\f]+')
+# Cleaned output is serialized by BeautifulSoup, which escapes '<' and '>'
+# everywhere except in raw text; elements whose content renders as it is
+# written are kept whole
+TOKEN_RE = re.compile(
+    r'(<(pre|textarea|script|style)\b[^>]*>.*?</\2[ \t\n\r\f]*>)'
+    r'|(<!--.*?-->)'
+    r'|(<(/?)([a-zA-Z][a-zA-Z0-9]*)[^>]*>)'
+    r'|([^<]+|<)',
+    re.IGNORECASE | re.DOTALL,
+)
+PAGE_WEIGHT_COLUMNS = ['bytes_before', 'bytes_after', 'nodes_before', 'nodes_after']
+
+def is_preserved_block(name: str, tag: str) -> bool:
+    """Tell whether a start tag opens a block clean_html keeps as it is."""
+    if name == 'div':
+        match = CLASS_RE.search(tag)
+        return match is not None and not PRESERVED_CLASSES.isdisjoint(match.group(1).split())
+    return name == 'iframe'
+
+def insert_attribute(tag: str, name: str, value: str) -> str:
+    """Insert an attribute before the first one whose name sorts after it, the order clean_html writes them in."""
+    start = TAG_NAME_RE.match(tag).end()
+    for match in ATTR_NAME_RE.finditer(tag, start):
+        if match.group(1).lower() > name:
+            start = match.start()
+            break
+    else:
+        start = len(tag) - 2 if tag.endswith('/>') else len(tag) - 1
+    return f'{tag[:start]} {name}="{value}"{tag[start:]}'
+
+def add_lazy_loading(tag: str, name: str) -> str:
+    """Defer an offscreen image or iframe, and decode images off the main thread."""
+    if name == 'img' and not re.search(r'[ \t\n\r\f]decoding[ \t\n\r\f]*=', tag, re.IGNORECASE):
+        tag = insert_attribute(tag, 'decoding', 'async')
+    if not re.search(r'[ \t\n\r\f]loading[ \t\n\r\f]*=', tag, re.IGNORECASE):
+        tag = insert_attribute(tag, 'loading', 'lazy')
+    return tag
+
+def optimize_description(html: str) -> str:
+    """Apply the page-weight optimisations enabled in PAGE_WEIGHT_CONFIG to a cleaned description.
+
+    Works on the tokens of the cleaned HTML, without parsing it again. Text
+    is only trimmed next to block tags, where whitespace does not render.
+    Descriptions passed through over a resource limit are left as they are.
+    """
+    if not isinstance(html, str) or '<' not in html or isinstance(html, PassedThrough):
+        return html
+    timer = StageTimer(metrics.active())
+    minify = PAGE_WEIGHT_CONFIG['minify']
+    lazy_loading = PAGE_WEIGHT_CONFIG['lazy_loading']
+    # (kind, text) with kind 'text', 'block' for block-level tags, 'tag', or
+    # 'kept' for the content of preserved blocks
+    tokens: List[Tuple[str, str]] = []
+    # Name of the preserved block being copied and how deep in it tags of that name nest
+    kept_name, kept_depth = None, 0
+    for match in TOKEN_RE.finditer(html):
+        raw, _, comment, tag, closing, name, text = match.groups()
+        if kept_depth:
+            kind = 'kept'
+            if tag is not None:
+                name = name.lower()
+                if name == kept_name and not tag.endswith('/>'):
+                    kept_depth += -1 if closing else 1
+                    if not kept_depth:
+                        kind = 'block' if name in BLOCK_TAGS else 'tag'
+                if not closing and name in LAZY_TAGS and lazy_loading:
+                    tag = add_lazy_loading(tag, name)
+            tokens.append((kind, tag if tag is not None else match.group(0)))
+            continue
+        if raw is not None:
+            tokens.append(('tag', raw))
+        elif comment is not None:
+            if not minify:
+                tokens.append(('tag', comment))
+        elif tag is not None:
+            name = name.lower()
+            if not closing:
+                if is_preserved_block(name, tag) and not tag.endswith('/>'):
+                    kept_name, kept_depth = name, 1
+                if name in LAZY_TAGS and lazy_loading:
+                    tag = add_lazy_loading(tag, name)
+                elif name == 'a' and PAGE_WEIGHT_CONFIG['drop_redundant_targets']:
+                    tag = REDUNDANT_TARGET_RE.sub('', tag)
+                # <strong>a</strong><strong>b</strong> -> <strong>ab</strong>
+                if (minify and name in MERGEABLE_TAGS and tag == f'<{name}>'
+                        and tokens and tokens[-1][1].lower() == f'</{name}>'):
+                    tokens.pop()
+                    continue
+            tokens.append(('block' if name in BLOCK_TAGS else 'tag', tag))
+        elif tokens and tokens[-1][0] == 'text':
+            tokens[-1] = ('text', tokens[-1][1] + text)
+        else:
+            tokens.append(('text', text))
+    timer.lap('page_weight.tokens', len(tokens))
+
+    if minify:
+        for i, (kind, text) in enumerate(tokens):
+            if kind != 'text':
+                continue
+            text = WHITESPACE_RE.sub(' ', text)
+            if i == 0 or tokens[i - 1][0] == 'block':
+                text = text.lstrip(' ')
+            if i == len(tokens) - 1 or tokens[i + 1][0] == 'block':
+                text = text.rstrip(' ')
+            tokens[i] = (kind, text)
+    optimized = ''.join(text for _, text in tokens)
+    timer.lap('page_weight.minify')
+    return optimized
+
+def page_weight(html: str) -> Tuple[int, int]:
+    """Return the size in bytes and the number of tags of a description."""
+    if not isinstance(html, str):
+        return 0, 0
+    return len(html.encode('utf-8')), measure_markup(html).nodes
+
+def optimize_columns(rows: Iterable[Tuple[str, str]]) -> Dict[str, List]:
+    """Optimise (original, cleaned) description rows.
+
+    Returns the optimised descriptions as ``new_description`` and the page
+    weight of the original and the optimised description of every row.
+    """
+    columns: Dict[str, List] = {column: [] for column in ['new_description'] + PAGE_WEIGHT_COLUMNS}
+    for original, cleaned in rows:
+        optimized = optimize_description(cleaned)
+        bytes_before, nodes_before = page_weight(original)
+        bytes_after, nodes_after = page_weight(optimized)
+        columns['new_description'].append(optimized)
+        columns['bytes_before'].append(bytes_before)
+        columns['bytes_after'].append(bytes_after)
+        columns['nodes_before'].append(nodes_before)
+        columns['nodes_after'].append(nodes_after)
+    return columns
+
+def optimize_columns_with_metrics(rows: List[Tuple[str, str]]) -> Tuple[Dict[str, List], dict]:
+    """Optimise a chunk like optimize_columns and return its stage metrics as well."""
+    stage_metrics = metrics.StageMetrics()
+    with metrics.collecting(stage_metrics):
+        columns = optimize_columns(rows)
+    return columns, stage_metrics.to_dict()
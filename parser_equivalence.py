@@ -0,0 +1,150 @@
+"""Differential check of the BeautifulSoup parser backends.
+
+Runs the cleaning functions over a corpus of descriptions with two parser
+backends and reports, per document, whether their output is identical,
+equivalent once known backend differences are normalized, or different.
+
+    python parser_equivalence.py
+    python parser_equivalence.py --input data/all_offers.csv --limit 5000
+"""
+import argparse
+import contextlib
+import io
+import re
+import sys
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import pandas as pd
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.element import PreformattedString
+from config import CSV_DELIMITER
+from compatibility import extract_h3_fields
+from functions import add_beta_classes, clean_description, resolve_parser
+
+# Representative Shoper descriptions, including the malformed markup the
+# backends are known to repair differently.
+CORPUS: List[str] = [
+    '<p><span style="font-size: 12pt;">Etui <strong>Pancernik</strong> do iPhone</span></p>',
+    '<div><span style="color: #000;"><font face="Arial">Stylowe etui</font></span></div>',
+    'Tekst bez znacznika <b>pogrubiony</b> i <i>kursywa</i>',
+    '<h3>Cechy produktu:</h3><h3><strong>Wytrzymałość</strong><br>Odporność na upadki</h3>',
+    '<h3><em>Już w formie em</em></h3>',
+    '<ul><li><p>Punkt pierwszy</p></li><li><span>Punkt drugi</span></li></ul>',
+    '<p>Linia 1<br><br><br>Linia 2<br/><br />Linia 3</p>',
+    '<div class="product-info"><div class="row"><span>Nie ruszać</span></div></div><p>Dalej</p>',
+    '<div class="fx-iframeContainer"><iframe src="https://www.youtube.com/embed/x"></iframe></div>',
+    '<p>Film:</p><iframe width="560" height="315" src="https://www.youtube.com/embed/y"></iframe>',
+    '<p><img src="a.jpg" alt="A" style="width:100%"> Podpis</p><img src="b.jpg">',
+    '<p>Akapit <p>zagnieżdżony</p> koniec</p>',
+    '<p>Akapit z blokiem <div>w środku</div></p>',
+    '<span>Niezamknięty <strong>tag</span> i dalej',
+    '<table><tr><td>Komórka</td></tr></table><p>&nbsp;</p>',
+    '<p>Encje &amp; &lt;znaki&gt; &quot;cudzysłów&quot; &nbsp;spacja</p>',
+    '<!-- komentarz --><p>Po komentarzu</p>',
+    '<p>\n  Wiele\n\n  linii  \n</p>\n\n<p> </p>',
+    '<a href="https://pancernik.eu" target="_blank" rel="nofollow">Link</a>',
+    '<details><summary>Więcej</summary><section><p>Szczegóły</p></section></details>',
+    '<h2 class="title" id="x" style="margin:0">Nagłówek</h2><hr/>',
+    '</div><span>Zbłąkany zamykający tag</span>',
+]
+
+def canonical_tokens(html: str) -> List[str]:
+    """Reduce markup to a token list that ignores formatting-only differences.
+
+    Whitespace inside text is collapsed and whitespace-only text dropped,
+    attributes are sorted, and comments are kept verbatim.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    tokens: List[str] = []
+    stack: List[object] = list(reversed(soup.contents))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str) and node.startswith('</'):
+            tokens.append(node)
+        elif isinstance(node, Tag):
+            attrs = ' '.join(
+                f'{name}="{" ".join(value) if isinstance(value, list) else value}"'
+                for name, value in sorted(node.attrs.items())
+            )
+            tokens.append(f'<{node.name}{" " + attrs if attrs else ""}>')
+            stack.append(f'</{node.name}>')
+            stack.extend(reversed(node.contents))
+        elif isinstance(node, PreformattedString):
+            tokens.append(node.output_ready())
+        elif isinstance(node, NavigableString):
+            text = re.sub(r'\s+', ' ', str(node)).strip()
+            if text:
+                if tokens and tokens[-1].startswith('#'):
+                    tokens[-1] += ' ' + text
+                else:
+                    tokens.append('#' + text)
+    return tokens
+
+OPERATIONS: Dict[str, Callable[[str, str], str]] = {
+    'clean_html': lambda html, parser: clean_description(html, parser=parser),
+    'add_beta_classes': lambda html, parser: add_beta_classes(html, parser=parser),
+    'extract_h3': lambda html, parser: extract_h3_fields(html, parser=parser)['new_description_with_unified_h3'],
+}
+
+def compare_backends(documents: Iterable[str], baseline: str = 'html.parser',
+                     candidate: str = 'lxml') -> List[Tuple[int, str, str, str, str]]:
+    """Run every operation with both backends.
+
+    Returns (document index, operation, status, baseline output, candidate
+    output) tuples, where status is 'identical', 'equivalent' or 'different'.
+    """
+    results = []
+    for i, html in enumerate(documents):
+        for name, operation in OPERATIONS.items():
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = operation(html, baseline)
+                actual = operation(html, candidate)
+            if expected == actual:
+                status = 'identical'
+            elif (isinstance(expected, str) and isinstance(actual, str)
+                  and canonical_tokens(expected) == canonical_tokens(actual)):
+                status = 'equivalent'
+            else:
+                status = 'different'
+            results.append((i, name, status, expected, actual))
+    return results
+
+def load_documents(input_file: Optional[str], column: str, limit: Optional[int]) -> List[str]:
+    """Return the built-in corpus, or descriptions read from a CSV export."""
+    if not input_file:
+        return CORPUS
+    df = pd.read_csv(input_file, delimiter=CSV_DELIMITER, usecols=[column], nrows=limit)
+    return [html for html in df[column].tolist() if isinstance(html, str) and html]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compare BeautifulSoup parser backends.')
+    parser.add_argument('--baseline', default='html.parser')
+    parser.add_argument('--candidate', default='lxml')
+    parser.add_argument('--input', help='CSV export to read descriptions from instead of the built-in corpus')
+    parser.add_argument('--column', default='description')
+    parser.add_argument('--limit', type=int, help='maximum number of CSV rows to read')
+    parser.add_argument('--show', type=int, default=5, help='number of differences to print')
+    args = parser.parse_args(argv)
+
+    if resolve_parser(args.candidate) != args.candidate:
+        print(f"Parser {args.candidate} is not available")
+        return 2
+
+    documents = load_documents(args.input, args.column, args.limit)
+    results = compare_backends(documents, args.baseline, args.candidate)
+
+    counts: Dict[str, int] = {}
+    for _, name, status, _, _ in results:
+        counts[f'{name}: {status}'] = counts.get(f'{name}: {status}', 0) + 1
+    print(f"Compared {len(documents)} documents ({args.baseline} vs {args.candidate})")
+    for key in sorted(counts):
+        print(f"  {key}: {counts[key]}")
+
+    differences = [result for result in results if result[2] == 'different']
+    for i, name, _, expected, actual in differences[:args.show]:
+        print(f"\n[{name}] document {i}: {documents[i][:200]!r}")
+        print(f"  {args.baseline}: {expected!r}")
+        print(f"  {args.candidate}: {actual!r}")
+    return 1 if differences else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
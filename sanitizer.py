@@ -0,0 +1,322 @@
+import re
+from collections import Counter
+from html import unescape
+from typing import List, Optional
+from bs4.dammit import EntitySubstitution
+from bs4.formatter import HTMLFormatter
+from config import (
+    ALLOWED_ATTR_SETS, ALLOWED_TAG_SET, CONVERTIBLE_TAGS, FLATTENING_TAGS, HEADING_TAGS, INLINE_TAGS, NO_ATTRS,
+    PRESERVED_CLASSES, VOID_TAGS
+)
+from fastpath import ASCII_SPACES, OTHER_VOID_TAGS, RAW_TEXT_TAGS
+# Tags that get special strings or handling from BeautifulSoup, and the
+# preserved iframes; documents with them are left to the tree path
+TREE_ONLY_TAGS = RAW_TEXT_TAGS | OTHER_VOID_TAGS | {'iframe', 'template', 'rt', 'rp'}
+MINIMAL_FORMATTER = HTMLFormatter.REGISTRY['minimal']
+
+# Start and end tags in the subset of html.parser's syntax modelled here; any
+# other "<" is left in the text between them
+TAG_RE = re.compile(
+    r'<(?:/([a-zA-Z][a-zA-Z0-9]*)[ \t\n\r\f]*'
+    r'|([a-zA-Z][a-zA-Z0-9]*)'
+    r'((?:[ \t\n\r\f]+[a-zA-Z_:][-a-zA-Z0-9_:.]*'
+    r'(?:[ \t\n\r\f]*=[ \t\n\r\f]*(?:"[^"<>]*"|\'[^\'<>]*\'|[^\s"\'=<>`/]+(?=[ \t\n\r\f>])))?)*)'
+    r'[ \t\n\r\f]*(/?))>'
+)
+ATTR_RE = re.compile(
+    r'[ \t\n\r\f]+([a-zA-Z_:][-a-zA-Z0-9_:.]*)'
+    r'(?:[ \t\n\r\f]*=[ \t\n\r\f]*("[^"]*"|\'[^\']*\'|[^\s"\'=<>`/]+))?'
+)
+# Character references as html.parser reports them; a bare "&" must not look like one
+ENTITY_RE = re.compile(r'&(?:#([0-9]{1,7});|#[xX]([0-9a-fA-F]{1,6});|([a-zA-Z][a-zA-Z0-9]*);|(?=[^a-zA-Z#]))')
+
+# Event kinds
+START, END, VOID, TEXT = range(4)
+
+class NeedsTree(Exception):
+    """Raised when a description needs the BeautifulSoup cleaning path."""
+
+class _Element:
+    """A non-void element of the token stream and what sanitizing makes of it."""
+    __slots__ = ('name', 'attrs', 'children_inline', 'has_element', 'has_text', 'output_name')
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.children_inline = True  # every direct child is text or an inline tag
+        self.has_element = False  # a tag child once unwrapped tags are gone, see is_empty_tag
+        self.has_text = False  # a non-blank text child once unwrapped tags are gone
+        self.output_name: Optional[str] = None  # None when the tag is unwrapped
+
+class _Level:
+    """An element written to the output, whose children the stream is currently adding."""
+    __slots__ = ('name', 'start', 'in_block', 'in_heading', 'in_h3', 'children', 'first_child',
+                 'last_child', 'last_text_blank', 'has_text', 'has_img', 'images')
+
+    def __init__(self, name: Optional[str], start: int = 0, in_block: bool = False,
+                 in_heading: bool = False, in_h3: bool = False):
+        self.name = name
+        self.start = start
+        self.in_block = in_block
+        self.in_heading = in_heading
+        self.in_h3 = in_h3
+        self.children = 0
+        self.first_child: Optional[str] = None
+        self.last_child: Optional[str] = None
+        self.last_text_blank = False
+        self.has_text = False
+        self.has_img = False
+        self.images: List[int] = []  # output slots of <img> tags that may still need a <p>
+
+    def add_child(self, child: str) -> None:
+        if not self.children:
+            self.first_child = child
+        self.children += 1
+        self.last_child = child
+
+def _decode_entity(match: re.Match) -> str:
+    """Turn a character reference into text the way BeautifulSoup's html.parser builder does."""
+    decimal, hexadecimal, name = match.groups()
+    if name is not None:
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        return character if character is not None else '&' + name
+    if decimal is None and hexadecimal is None:
+        return '&'
+    code = int(decimal) if decimal is not None else int(hexadecimal, 16)
+    if code < 256:
+        try:
+            return bytearray([code]).decode('windows-1252')
+        except UnicodeDecodeError:
+            pass
+    try:
+        return chr(code)
+    except (ValueError, OverflowError):
+        return '\N{REPLACEMENT CHARACTER}'
+
+def _decode_text(token: str) -> str:
+    if '<' in token or token.endswith('&'):
+        raise NeedsTree('text html.parser may read as markup')
+    if '&' in token:
+        if token.count('&') != len(ENTITY_RE.findall(token)):
+            raise NeedsTree('character reference html.parser reads differently')
+        token = ENTITY_RE.sub(_decode_entity, token)
+    if not token.strip(ASCII_SPACES):
+        # BeautifulSoup keeps whitespace-only strings as a single newline or space
+        return '\n' if '\n' in token else ' '
+    return token
+
+def _parse_attrs(attr_text: str) -> dict:
+    attrs = {}
+    for name, value in ATTR_RE.findall(attr_text):
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        attrs[name.lower()] = unescape(value) if value else value
+    return attrs
+
+def _tokenize(html: str) -> list:
+    """Turn a description into a properly nested list of events.
+
+    End tags close elements the way BeautifulSoup does: every element up to
+    the most recent one of that name, ignoring end tags that match no open
+    element. Each element learns what sanitize_tags would do with it.
+    """
+    events: list = []
+    stack: List[_Element] = []
+    headings = 0
+    # html.parser leaves a "<br/>" open after an earlier "<br>", see BeautifulSoupHTMLParser
+    closed_voids: Counter = Counter()
+
+    def close(element: _Element) -> None:
+        nonlocal headings
+        name = element.name
+        if name in CONVERTIBLE_TAGS:
+            element.output_name = 'p' if element.children_inline else None
+        elif name in ALLOWED_TAG_SET:
+            element.output_name = name
+        if name in HEADING_TAGS:
+            headings -= 1
+        if stack:
+            parent = stack[-1]
+            if element.output_name is not None:
+                parent.has_element = True
+            else:
+                parent.has_element = parent.has_element or element.has_element
+                parent.has_text = parent.has_text or element.has_text
+        events.append((END, element))
+
+    position = 0
+    for match in TAG_RE.finditer(html):
+        if match.start() > position:
+            text = _decode_text(html[position:match.start()])
+            if stack and text.strip():
+                stack[-1].has_text = True
+            events.append((TEXT, text))
+        position = match.end()
+
+        end_name, name, attr_text, self_closing = match.groups()
+        if end_name is not None:
+            name = end_name.lower()
+            if name in VOID_TAGS or name in TREE_ONLY_TAGS:
+                raise NeedsTree(f'</{name}>')
+            for depth in range(len(stack) - 1, -1, -1):
+                if stack[depth].name == name:
+                    while len(stack) > depth:
+                        close(stack.pop())
+                    break
+            continue
+
+        name = name.lower()
+        if name in TREE_ONLY_TAGS:
+            raise NeedsTree(f'<{name}>')
+        attrs = _parse_attrs(attr_text) if attr_text else {}
+        if name == 'div' and not PRESERVED_CLASSES.isdisjoint(attrs.get('class', '').split()):
+            raise NeedsTree('preserved block')
+        if stack and name not in INLINE_TAGS:
+            stack[-1].children_inline = False
+
+        if name in VOID_TAGS:
+            if stack:
+                stack[-1].has_element = True
+            if self_closing:
+                if closed_voids[name]:
+                    raise NeedsTree(f'<{name}/> after <{name}>')
+            else:
+                closed_voids[name] += 1
+            events.append((VOID, name, attrs))
+            continue
+        if self_closing:
+            raise NeedsTree(f'<{name}/>')
+        if name in HEADING_TAGS:
+            if headings:
+                raise NeedsTree('heading inside a heading')
+            headings += 1
+        element = _Element(name, attrs)
+        stack.append(element)
+        events.append((START, element))
+
+    if position < len(html):
+        text = _decode_text(html[position:])
+        if stack and text.strip():
+            stack[-1].has_text = True
+        events.append((TEXT, text))
+    while stack:
+        close(stack.pop())
+    return events
+
+def _start_tag(name: str, attrs: dict) -> str:
+    allowed = ALLOWED_ATTR_SETS.get(name, NO_ATTRS)
+    parts = [name]
+    for attr in sorted(attrs):
+        if attr in allowed:
+            value = attrs[attr]
+            if attr == 'class':
+                value = ' '.join(value.split())
+            parts.append(f'{attr}={MINIMAL_FORMATTER.quoted_attribute_value(MINIMAL_FORMATTER.attribute_value(value))}')
+    return '<' + ' '.join(parts) + '>'
+
+def _sanitize(html: str) -> str:
+    out: List[str] = []
+    root = _Level(None)
+    levels: List[_Level] = [root]
+    # Stack entries: the _Level of an element that was written, or None for an unwrapped one
+    open_elements: List[Optional[_Level]] = []
+    skipping: Optional[_Element] = None
+
+    for event in _tokenize(html):
+        kind = event[0]
+        if skipping is not None:
+            if kind == END and event[1] is skipping:
+                skipping = None
+            continue
+        level = levels[-1]
+
+        if kind == TEXT:
+            text = event[1]
+            blank = not text.strip(ASCII_SPACES)
+            if level.in_h3 and blank and level.last_child == '#text' and level.last_text_blank:
+                raise NeedsTree('blank strings merged inside a wrapped h3')
+            level.add_child('#text')
+            level.last_text_blank = blank
+            if text.strip():
+                level.has_text = True
+            out.append(text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;'))
+
+        elif kind == VOID:
+            name, attrs = event[1], event[2]
+            if name == 'br':
+                if level.last_child == 'br' and level.name is not None:
+                    continue  # remove_consecutive_brs
+                out.append('<br>')
+            elif name == 'hr':
+                out.append('<hr/>')
+            else:
+                if not attrs.get('src'):
+                    continue  # an image without a source is an empty tag
+                level.has_img = True
+                img = _start_tag('img', attrs)[:-1] + '/>'
+                if level.name == 'p':
+                    level.images.append(len(out))  # wrapped unless it ends up alone in the <p>
+                    out.append(img)
+                else:
+                    out.append('<p>' + img + '</p>')
+            level.add_child(name)
+
+        elif kind == START:
+            element = event[1]
+            name = element.output_name
+            if name is None:
+                open_elements.append(None)
+                continue
+            if not element.has_element and not element.has_text:
+                skipping = element  # is_empty_tag
+                continue
+            if (name == 'p' and level.in_block) or (name == 'strong' and level.in_heading):
+                open_elements.append(None)
+                continue
+            level.add_child(name)
+            child = _Level(name, len(out), level.in_block or name in FLATTENING_TAGS,
+                           level.in_heading or name in HEADING_TAGS, level.in_h3 or name == 'h3')
+            out.append(_start_tag(name, element.attrs))
+            levels.append(child)
+            open_elements.append(child)
+
+        else:
+            if open_elements.pop() is None:
+                continue
+            levels.pop()
+            parent = levels[-1]
+            name = level.name
+            if name == 'h3':
+                if not level.children:
+                    raise NeedsTree('h3 left without content')
+                if level.children > 1 or level.first_child != 'em':
+                    out[level.start] += '<em>'
+                    out.append('</em>')
+            elif name == 'p':
+                if level.children > 1:
+                    for slot in level.images:
+                        out[slot] = '<p>' + out[slot] + '</p>'
+                if not level.has_text and not level.has_img:
+                    del out[level.start:]  # remove_empty_paragraphs
+                    continue
+            out.append(f'</{name}>')
+            parent.has_text = parent.has_text or level.has_text
+            parent.has_img = parent.has_img or level.has_img
+
+    html_out = ''.join(out)
+    return '\n'.join(line.strip() for line in html_out.splitlines() if line.strip())
+
+def sanitize_description(html: str) -> Optional[str]:
+    """Clean a description from its stream of tokens, without building a tree.
+
+    Applies the same whitelist, span/div/font conversion, unwrapping, <br>
+    collapsing and structural rules as clean_html does with html.parser, and
+    returns the same result. Returns None for descriptions using anything the
+    token stream does not model (preserved blocks and iframes, comments,
+    raw-text elements, unusual attribute syntax and a few tree quirks), which
+    have to be cleaned on the BeautifulSoup path.
+    """
+    try:
+        return _sanitize(html)
+    except NeedsTree:
+        return None
@@ -0,0 +1,257 @@
+"""Long-running cleaning service for descriptions saved by the editors.
+
+Keeps the cleaner warm in one process and serves clean_html,
+add_beta_classes and the h3 extraction, either over local HTTP or as JSON
+lines on stdin/stdout:
+
+    python service.py --http --port 8765
+    python service.py --stdio
+
+A request carries one document or a batch of them:
+
+    {"id": 7, "op": "clean_html", "documents": ["<p>...</p>", ...]}
+
+Over HTTP the operation is the path (POST /clean_html, /add_beta_classes or
+/extract_h3) and GET /metrics returns request counts and latency
+percentiles. When more than ``max_pending`` requests are in progress new
+ones are refused (HTTP 503 with Retry-After) instead of queueing without
+bound; on stdin the next request is only read once the previous one is
+answered.
+"""
+import argparse
+import json
+import logging
+import logging.config
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, List, Optional, TextIO
+from benchmark import percentile
+from compatibility import extract_h3_fields
+from config import LOGGING_CONFIG, SERVICE_CONFIG, ensure_directories
+from fragments import shared_fragment_cache
+from functions import add_beta_classes, clean_description
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_DOCUMENT = '<div style="color: red"><span>Etui <b>pancernik</b></span><br><br></div><h3><strong>Seria</strong></h3>'
+
+OPERATIONS: Dict[str, Callable[[str], object]] = {
+    'clean_html': clean_description,
+    'add_beta_classes': add_beta_classes,
+    'extract_h3': extract_h3_fields,
+}
+
+class ServiceError(Exception):
+    """A request the service cannot serve, with the HTTP status to report."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class LatencyStats:
+    """Request counters and recent per-document latencies of one operation."""
+
+    def __init__(self, window: int = SERVICE_CONFIG['latency_window']):
+        self.requests = 0
+        self.documents = 0
+        self.errors = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, latencies: List[float]) -> None:
+        self.requests += 1
+        self.documents += len(latencies)
+        self.latencies.extend(latencies)
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'documents': self.documents,
+            'errors': self.errors,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p90_ms': percentile(latencies, 0.90) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+class CleaningService:
+    """Runs requests against the warm cleaning functions, with a bound on requests in progress."""
+
+    def __init__(self, max_batch: int = SERVICE_CONFIG['max_batch'],
+                 max_pending: int = SERVICE_CONFIG['max_pending']):
+        self.max_batch = max_batch
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.stats = {name: LatencyStats() for name in OPERATIONS}
+        self.rejected = 0
+        self.started = time.time()
+
+    def warm_up(self) -> None:
+        """Run every operation once so imports, regexes and parser lookups are ready."""
+        for operation in OPERATIONS.values():
+            operation(WARM_UP_DOCUMENT)
+
+    def handle(self, request: dict, op: Optional[str] = None) -> dict:
+        """Run one request and return its response, raising ServiceError if it cannot be served."""
+        if not isinstance(request, dict):
+            raise ServiceError(400, 'request must be a JSON object')
+        op = op or request.get('op')
+        if op not in OPERATIONS:
+            raise ServiceError(404, f"unknown operation {op!r}, expected one of {', '.join(OPERATIONS)}")
+        if 'documents' in request:
+            documents = request['documents']
+            if not isinstance(documents, list):
+                raise ServiceError(400, "'documents' must be a list")
+        elif 'document' in request:
+            documents = [request['document']]
+        else:
+            raise ServiceError(400, "request needs 'document' or 'documents'")
+        if len(documents) > self.max_batch:
+            raise ServiceError(413, f'batch of {len(documents)} documents exceeds the limit of {self.max_batch}')
+
+        if not self.pending.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise ServiceError(503, 'too many requests in progress, retry later')
+        try:
+            operation = OPERATIONS[op]
+            results = []
+            latencies = []
+            started = time.perf_counter()
+            for document in documents:
+                doc_started = time.perf_counter()
+                results.append(operation(document))
+                latencies.append(time.perf_counter() - doc_started)
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            with self.lock:
+                self.stats[op].errors += 1
+            logger.error(f"Error running {op}: {str(e)}")
+            raise ServiceError(500, f'{op} failed: {str(e)}')
+        finally:
+            self.pending.release()
+
+        with self.lock:
+            self.stats[op].record(latencies)
+        response = {'op': op, 'results': results, 'ms': round(elapsed * 1000, 3)}
+        if 'id' in request:
+            response['id'] = request['id']
+        if 'document' in request and 'documents' not in request:
+            response['result'] = response.pop('results')[0]
+        return response
+
+    def metrics(self) -> dict:
+        fragment_cache = shared_fragment_cache()
+        with self.lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started, 1),
+                'rejected': self.rejected,
+                'operations': {name: stats.to_dict() for name, stats in self.stats.items()},
+                'fragment_cache': fragment_cache.stats() if fragment_cache is not None else None,
+            }
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end; the CleaningService is attached to the server."""
+
+    protocol_version = 'HTTP/1.1'  # keep connections open between saves
+
+    def do_GET(self) -> None:
+        if self.path == '/metrics':
+            self.send_json(200, self.server.service.metrics())
+        elif self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        else:
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self) -> None:
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError as e:
+                raise ServiceError(400, f'invalid JSON: {str(e)}')
+            self.send_json(200, self.server.service.handle(request, self.path.strip('/')))
+        except ServiceError as e:
+            self.send_json(e.status, {'error': str(e)})
+
+    def send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)
+
+def serve_http(service: CleaningService, host: str = SERVICE_CONFIG['host'],
+               port: int = SERVICE_CONFIG['port']) -> None:
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    logger.info(f"Cleaning service listening on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Cleaning service stopped: {json.dumps(service.metrics())}")
+
+def serve_stdio(service: CleaningService, stdin: TextIO = sys.stdin, stdout: TextIO = sys.stdout) -> None:
+    """Answer one JSON line on stdout for every JSON line read from stdin.
+
+    ``{"op": "metrics"}`` returns the latency metrics instead of running an operation.
+    """
+    for line in stdin:
+        if not line.strip():
+            continue
+        request = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise ServiceError(400, f'invalid JSON: {str(e)}')
+            if isinstance(request, dict) and request.get('op') == 'metrics':
+                response = service.metrics()
+            else:
+                response = service.handle(request)
+        except ServiceError as e:
+            response = {'error': str(e), 'status': e.status}
+            if isinstance(request, dict) and 'id' in request:
+                response['id'] = request['id']
+        stdout.write(json.dumps(response, ensure_ascii=False) + '\n')
+        stdout.flush()
+    logger.info(f"Cleaning service stopped: {json.dumps(service.metrics())}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Serve description cleaning to the editors.')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--http', action='store_true', help='serve HTTP on --host/--port')
+    mode.add_argument('--stdio', action='store_true', help='read JSON requests from stdin, one per line')
+    parser.add_argument('--host', default=SERVICE_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=SERVICE_CONFIG['port'])
+    parser.add_argument('--max-batch', type=int, default=SERVICE_CONFIG['max_batch'],
+                        help='documents accepted in one request')
+    parser.add_argument('--max-pending', type=int, default=SERVICE_CONFIG['max_pending'],
+                        help='requests in progress before new ones are refused')
+    args = parser.parse_args(argv)
+
+    ensure_directories()
+    logging.config.dictConfig(LOGGING_CONFIG)
+    service = CleaningService(args.max_batch, args.max_pending)
+    service.warm_up()
+    if args.http:
+        serve_http(service, args.host, args.port)
+    else:
+        serve_stdio(service)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Iterable, Optional, Set, Union
+import pandas as pd
+from config import GOOGLE_SHEETS
+
+logger = logging.getLogger(__name__)
+
+def normalize_ean(value) -> str:
+    """Turn an EAN read from a CSV (possibly as a float) into a comparable string."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    ean = str(value).strip()
+    if ean.endswith('.0') and ean[:-2].isdigit():
+        ean = ean[:-2]
+    return '' if ean.lower() == 'nan' else ean
+
+def build_ean_index(values: Iterable) -> Set[str]:
+    """Build a hash set of normalized EANs, ignoring blanks."""
+    return {ean for ean in map(normalize_ean, values) if ean}
+
+class SheetSnapshot:
+    """Local copy of the Google Sheets export of processed products.
+
+    The sheet is downloaded only when the snapshot is older than ``max_age_hours``,
+    with a conditional request (ETag / Last-Modified) so an unchanged sheet is not
+    transferred again. If the download fails the previous snapshot is used.
+    """
+
+    def __init__(self, url: str = GOOGLE_SHEETS['url'],
+                 path: Union[str, Path] = GOOGLE_SHEETS['snapshot_path'],
+                 max_age_hours: float = GOOGLE_SHEETS['max_age_hours'],
+                 timeout: float = GOOGLE_SHEETS['timeout']):
+        self.url = url
+        self.path = Path(path)
+        self.meta_path = self.path.with_name(self.path.name + '.meta.json')
+        self.max_age_hours = max_age_hours
+        self.timeout = timeout
+
+    def age_hours(self) -> Optional[float]:
+        """Return how old the snapshot is, or None if there is none."""
+        if not self.path.is_file():
+            return None
+        return (time.time() - self.path.stat().st_mtime) / 3600
+
+    def is_fresh(self) -> bool:
+        age = self.age_hours()
+        return age is not None and age < self.max_age_hours
+
+    def _load_meta(self) -> dict:
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            return meta if meta.get('url') == self.url else {}
+        except (OSError, ValueError):
+            return {}
+
+    def refresh(self) -> bool:
+        """Download the sheet if it changed since the last snapshot.
+
+        Returns True if the snapshot is now up to date, False if the download failed.
+        """
+        meta = self._load_meta() if self.path.is_file() else {}
+        request = urllib.request.Request(self.url)
+        if meta.get('etag'):
+            request.add_header('If-None-Match', meta['etag'])
+        if meta.get('last_modified'):
+            request.add_header('If-Modified-Since', meta['last_modified'])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                os.utime(self.path)
+                logger.info('Google Sheets data unchanged, keeping local snapshot')
+                return True
+            logger.error(f"Error downloading Google Sheets data: {str(e)}")
+            return False
+        except Exception as e:
+            logger.error(f"Error downloading Google Sheets data: {str(e)}")
+            return False
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        temp_path.write_bytes(content)
+        os.replace(temp_path, self.path)
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': self.url,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+            }, f)
+        logger.info(f"Saved Google Sheets snapshot ({len(content)} bytes) to {self.path}")
+        return True
+
+    def read(self, offline: bool = False) -> Optional[pd.DataFrame]:
+        """Return the sheet, refreshing the snapshot first unless offline or still fresh."""
+        if not offline and not self.is_fresh():
+            logger.info('Refreshing Google Sheets snapshot...')
+            if not self.refresh() and self.path.is_file():
+                logger.warning(f"Using previous snapshot from {self.age_hours():.1f} hours ago")
+
+        if not self.path.is_file():
+            logger.error(f"No Google Sheets snapshot available at {self.path}")
+            return None
+        try:
+            return pd.read_csv(self.path, dtype=str)
+        except Exception as e:
+            logger.error(f"Error reading Google Sheets snapshot: {str(e)}")
+            return None
+
+def load_processed_eans(offline: Optional[bool] = None,
+                        snapshot: Optional[SheetSnapshot] = None) -> Optional[Set[str]]:
+    """Load the EANs of already processed products from the sheet snapshot.
+
+    Returns None if no snapshot could be read.
+    """
+    offline = GOOGLE_SHEETS['offline'] if offline is None else offline
+    snapshot = snapshot or SheetSnapshot()
+    sheet = snapshot.read(offline)
+    if sheet is None:
+        return None
+    if 'ean' not in sheet.columns:
+        logger.error("Google Sheets data has no 'ean' column")
+        return None
+    processed = build_ean_index(sheet['ean'])
+    logger.info(f"Loaded {len(processed)} processed EANs")
+    return processed
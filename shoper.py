@@ -0,0 +1,555 @@
+"""Push of cleaned descriptions to the Shoper REST API.
+
+An optional sink after the pipelines: instead of importing the whole
+output sheet by hand, the descriptions that changed are sent to the shop's
+product-update API.
+
+    python shoper.py push end_data/all_offers_ready.xlsx
+    python shoper.py mock --port 8766 --products data/all_offers.csv
+
+Product updates go out as bulk requests of up to ``batch_size`` calls,
+``concurrency`` at a time, over a pool of keep-alive connections. Responses
+over the shop's rate limit (HTTP 429) and server errors are retried after
+Retry-After or an exponential backoff, and the client slows down when the
+API reports its call bucket nearly full. Every product's outcome is kept in
+a SQLite status log together with a digest of the description sent, so a
+product whose description was pushed already is not sent again.
+
+``mock`` serves a small in-memory stand-in for the API, rate limit
+included, to try a push against locally.
+"""
+import argparse
+import base64
+import hashlib
+import http.client
+import json
+import logging
+import logging.config
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import pandas as pd
+from config import CSV_DELIMITER, LOGGING_CONFIG, SHOPER_CONFIG, ensure_directories
+
+logger = logging.getLogger(__name__)
+
+API_PATH = '/webapi/rest'
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+LOOKUP_PAGE_SIZE = 50   # product codes looked up per request, the API's page limit
+
+class ShoperError(Exception):
+    """An API call that failed for good, with the HTTP status if there was a response."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host, shared by the threads of a push."""
+
+    def __init__(self, url: str, size: int = SHOPER_CONFIG['concurrency'],
+                 timeout: float = SHOPER_CONFIG['timeout']):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ShoperError(f"Invalid shop URL {url!r}")
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.size = size
+        self.timeout = timeout
+        self.idle: 'queue.LifoQueue[http.client.HTTPConnection]' = queue.LifoQueue()
+        self.opened = 0
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """Send a request and return the status, the lower-cased headers and the body.
+
+        A kept-alive connection the server has closed in the meantime is
+        replaced by a new one once, without counting as a failed attempt.
+        """
+        for reused in (True, False):
+            connection = self.idle.get_nowait() if reused and not self.idle.empty() else None
+            if connection is None:
+                reused = False
+                connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+                self.opened += 1
+            try:
+                connection.request(method, path, body, headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            if response.will_close or self.idle.qsize() >= self.size:
+                connection.close()
+            else:
+                self.idle.put(connection)
+            return response.status, {name.lower(): value for name, value in response.getheaders()}, data
+        raise ShoperError('unreachable')
+
+    def close(self) -> None:
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+class ShoperClient:
+    """Authenticated calls to the Shoper REST API with rate-limit-aware retries."""
+
+    def __init__(self, url: str = SHOPER_CONFIG['url'], client_id: str = SHOPER_CONFIG['client_id'],
+                 client_secret: str = SHOPER_CONFIG['client_secret'],
+                 concurrency: int = SHOPER_CONFIG['concurrency'], timeout: float = SHOPER_CONFIG['timeout'],
+                 max_retries: int = SHOPER_CONFIG['max_retries'],
+                 backoff_seconds: float = SHOPER_CONFIG['backoff_seconds']):
+        self.pool = ConnectionPool(url, concurrency, timeout)
+        self.credentials = base64.b64encode(f'{client_id}:{client_secret}'.encode('utf-8')).decode('ascii')
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.token: Optional[str] = None
+        self.token_lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+
+    def authenticate(self, stale: Optional[str] = None) -> str:
+        """Get an access token, unless another thread has replaced the ``stale`` one already."""
+        with self.token_lock:
+            if self.token is None or self.token == stale:
+                status, _, data = self.pool.request(
+                    'POST', f'{API_PATH}/auth', b'', {'Authorization': f'Basic {self.credentials}'}
+                )
+                if status != 200:
+                    raise ShoperError(f"Authentication failed: HTTP {status}", status)
+                self.token = json.loads(data)['access_token']
+            return self.token
+
+    def call(self, method: str, path: str, payload=None, params: Optional[dict] = None):
+        """Call an API resource and return its decoded JSON response."""
+        if params:
+            path = f'{path}?{urllib.parse.urlencode(params)}'
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else None
+        token = self.token or self.authenticate()
+        reauthenticated = False
+        for attempt in range(self.max_retries + 1):
+            headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+            self.calls += 1
+            try:
+                status, response_headers, data = self.pool.request(method, f'{API_PATH}{path}', body, headers)
+            except (http.client.HTTPException, OSError) as e:
+                status, response_headers, data = None, {}, str(e).encode('utf-8')
+            if status == 401 and not reauthenticated:
+                token, reauthenticated = self.authenticate(stale=token), True
+                continue
+            if status is not None and status < 400:
+                self.slow_down(response_headers)
+                return json.loads(data) if data else None
+            if status is not None and status not in RETRY_STATUSES:
+                raise ShoperError(f"{method} {path}: HTTP {status} {data[:200].decode('utf-8', 'replace')}", status)
+            if attempt < self.max_retries:
+                self.retries += 1
+                time.sleep(self.retry_delay(attempt, response_headers))
+        raise ShoperError(f"{method} {path}: gave up after {self.max_retries + 1} attempts "
+                          f"({'HTTP ' + str(status) if status else data.decode('utf-8', 'replace')})", status)
+
+    def retry_delay(self, attempt: int, headers: Dict[str, str]) -> float:
+        """Seconds to wait before a retry: Retry-After if the API sent it, else an exponential backoff."""
+        try:
+            return max(float(headers['retry-after']), 0.0)
+        except (KeyError, ValueError):
+            return self.backoff_seconds * 2 ** attempt
+
+    def slow_down(self, headers: Dict[str, str]) -> None:
+        """Wait a moment when the API's call bucket is nearly full, before it starts answering 429."""
+        try:
+            calls, limit = int(headers['x-shop-api-calls']), int(headers['x-shop-api-limit'])
+        except (KeyError, ValueError):
+            return
+        if calls >= limit - 1:
+            time.sleep(self.backoff_seconds)
+
+    def bulk(self, calls: List[dict]) -> List[dict]:
+        """Send up to 25 calls in one bulk request and return their results, in order."""
+        return self.call('POST', '/bulk', calls)['items']
+
+    def find_product_ids(self, codes: Sequence[str]) -> Dict[str, int]:
+        """Look up the product ids of product codes; codes the shop does not know are left out."""
+        found: Dict[str, int] = {}
+        page = 1
+        while True:
+            result = self.call('GET', '/products', params={
+                'filters': json.dumps({'code': {'in': list(codes)}}),
+                'limit': LOOKUP_PAGE_SIZE,
+                'page': page,
+            })
+            for product in result.get('list', []):
+                found[str(product['code'])] = int(product['product_id'])
+            if page >= int(result.get('pages') or 1):
+                return found
+            page += 1
+
+    def close(self) -> None:
+        self.pool.close()
+
+def description_digest(html: str) -> str:
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+class PushLog:
+    """SQLite log of the last push of every product: its id, the digest sent and the outcome.
+
+    Statuses: 'ok', 'missing' (no product with that code in the shop) and
+    'failed'. Written from the push threads, one at a time.
+    """
+
+    def __init__(self, path: Union[str, Path] = SHOPER_CONFIG['status_log']):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS pushes ('
+            'product_code TEXT PRIMARY KEY, product_id INTEGER, digest TEXT, status TEXT NOT NULL, '
+            'http_status INTEGER, message TEXT, updated_at REAL NOT NULL)'
+        )
+        self.connection.commit()
+
+    def get_many(self, codes: Iterable[str]) -> Dict[str, dict]:
+        """Return the logged state of the given product codes."""
+        codes = list(codes)
+        found: Dict[str, dict] = {}
+        with self.lock:
+            for i in range(0, len(codes), 500):
+                batch = codes[i:i + 500]
+                rows = self.connection.execute(
+                    'SELECT product_code, product_id, digest, status FROM pushes '
+                    f"WHERE product_code IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for code, product_id, digest, status in rows:
+                    found[code] = {'product_id': product_id, 'digest': digest, 'status': status}
+        return found
+
+    def record_many(self, entries: Iterable[Tuple[str, Optional[int], Optional[str], str, Optional[int], str]]) -> None:
+        """Store (product_code, product_id, digest, status, http_status, message) entries."""
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO pushes '
+                '(product_code, product_id, digest, status, http_status, message, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(*entry, now) for entry in entries]
+            )
+            self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+def push_descriptions(rows: Iterable[Tuple[str, str]], client: ShoperClient, log: PushLog,
+                      batch_size: int = SHOPER_CONFIG['batch_size'],
+                      concurrency: int = SHOPER_CONFIG['concurrency'],
+                      language: str = SHOPER_CONFIG['language'],
+                      product_ids: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Send (product_code, description) rows to the shop and return how many were pushed, skipped or not.
+
+    Products whose description was pushed before, per the log, are skipped.
+    Product ids come from ``product_ids``, the log or a lookup by code.
+    Calls inside a bulk request that hit the rate limit or a server error
+    are sent again in a later bulk request.
+    """
+    descriptions = {str(code): html for code, html in rows if isinstance(html, str)}
+    logged = log.get_many(descriptions)
+    digests = {code: description_digest(html) for code, html in descriptions.items()}
+    todo = [
+        code for code in descriptions
+        if not (code in logged and logged[code]['status'] == 'ok' and logged[code]['digest'] == digests[code])
+    ]
+    summary = {'pushed': 0, 'skipped': len(descriptions) - len(todo), 'missing': 0, 'failed': 0}
+    if not todo:
+        return summary
+
+    ids = {code: product_ids[code] for code in todo if product_ids and code in product_ids}
+    ids.update({code: logged[code]['product_id'] for code in todo
+                if code not in ids and code in logged and logged[code]['product_id']})
+    unknown = [code for code in todo if code not in ids]
+    summary_lock = threading.Lock()
+
+    def push_batch(batch: List[str]) -> None:
+        pending = list(batch)
+        outcome: Dict[str, Tuple[str, Optional[int], str]] = {}
+        for attempt in range(client.max_retries + 1):
+            try:
+                results = client.bulk([
+                    {'id': code, 'path': f'{API_PATH}/products/{ids[code]}', 'method': 'PUT',
+                     'body': {'translations': {language: {'description': descriptions[code]}}}}
+                    for code in pending
+                ])
+            except ShoperError as e:
+                for code in pending:
+                    outcome[code] = ('failed', e.status, str(e))
+                break
+            retry = []
+            for code, result in zip(pending, results):
+                status = int(result.get('code', 0))
+                if status < 400:
+                    outcome[code] = ('ok', status, '')
+                else:
+                    outcome[code] = ('failed', status, json.dumps(result.get('body'), ensure_ascii=False)[:500])
+                    if status in RETRY_STATUSES:
+                        retry.append(code)
+            if not retry or attempt == client.max_retries:
+                break
+            pending = retry
+            client.retries += 1
+            time.sleep(client.backoff_seconds * 2 ** attempt)
+        log.record_many(
+            (code, ids[code], digests[code] if status == 'ok' else None, status, http_status, message)
+            for code, (status, http_status, message) in outcome.items()
+        )
+        with summary_lock:
+            for status, _, _ in outcome.values():
+                summary['pushed' if status == 'ok' else 'failed'] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        lookups = [unknown[i:i + LOOKUP_PAGE_SIZE] for i in range(0, len(unknown), LOOKUP_PAGE_SIZE)]
+        for found in executor.map(client.find_product_ids, lookups):
+            ids.update(found)
+        missing = [code for code in unknown if code not in ids]
+        if missing:
+            log.record_many((code, None, None, 'missing', None, 'no product with this code') for code in missing)
+            summary['missing'] = len(missing)
+            logger.warning(f"{len(missing)} product codes not found in the shop, e.g. {', '.join(missing[:5])}")
+
+        known = [code for code in todo if code in ids]
+        batches = [known[i:i + batch_size] for i in range(0, len(known), batch_size)]
+        list(executor.map(push_batch, batches))
+    return summary
+
+class ShoperPush:
+    """Pushes the changed rows of pipeline outputs, keeping one client and status log for the run."""
+
+    def __init__(self, client: Optional[ShoperClient] = None, log: Optional[PushLog] = None):
+        self.client = client or ShoperClient()
+        self.log = log or PushLog()
+        self.totals = {'pushed': 0, 'skipped': 0, 'missing': 0, 'failed': 0}
+
+    def push(self, df: pd.DataFrame, code_column: str = 'product_code', description_column: str = 'description',
+             new_column: str = 'new_description') -> Dict[str, int]:
+        """Push the rows of ``df`` whose new description differs from the old one."""
+        changed = df[df[new_column] != df[description_column]] if description_column in df.columns else df
+        id_column = SHOPER_CONFIG['id_column']
+        product_ids = None
+        if id_column in changed.columns:
+            product_ids = {str(code): int(product_id) for code, product_id in zip(changed[code_column], changed[id_column])
+                           if pd.notna(product_id)}
+        started = time.perf_counter()
+        summary = push_descriptions(zip(changed[code_column].astype(str), changed[new_column]),
+                                    self.client, self.log, product_ids=product_ids)
+        for key, value in summary.items():
+            self.totals[key] += value
+        logger.info(f"Shoper push: {summary['pushed']} pushed, {summary['skipped']} already up to date, "
+                    f"{summary['missing']} not in the shop, {summary['failed']} failed "
+                    f"in {time.perf_counter() - started:.1f}s")
+        return summary
+
+    def close(self) -> None:
+        logger.info(f"Shoper push totals: {json.dumps(self.totals)} in {self.client.calls} API calls, "
+                    f"{self.client.retries} retries, {self.client.pool.opened} connections opened")
+        self.client.close()
+        self.log.close()
+
+def open_shoper_push(enabled: Optional[bool] = None) -> Optional[ShoperPush]:
+    """Open the push to the configured shop, or return None when pushing is disabled."""
+    enabled = SHOPER_CONFIG['enabled'] if enabled is None else enabled
+    if not enabled:
+        return None
+    try:
+        return ShoperPush()
+    except Exception as e:
+        logger.error(f"Error opening Shoper push: {str(e)}")
+        return None
+
+class MockShoperHandler(BaseHTTPRequestHandler):
+    """The parts of the Shoper REST API the push uses: auth, product lookup and update, bulk."""
+
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the real API
+
+    def do_POST(self) -> None:
+        self.dispatch('POST')
+
+    def do_GET(self) -> None:
+        self.dispatch('GET')
+
+    def do_PUT(self) -> None:
+        self.dispatch('PUT')
+
+    def dispatch(self, method: str) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        mock: MockShoper = self.server.mock
+        if not mock.take_call():
+            self.send_json(429, {'error': 'rate_limit', 'error_description': 'Too many requests'},
+                           {'Retry-After': f'{mock.retry_after:g}'})
+            return
+        parts = urllib.parse.urlsplit(self.path)
+        if method == 'POST' and parts.path == f'{API_PATH}/auth':
+            self.send_json(200, {'access_token': mock.token, 'expires_in': 2592000, 'token_type': 'bearer'})
+            return
+        if self.headers.get('Authorization') != f'Bearer {mock.token}':
+            self.send_json(401, {'error': 'unauthorized_client'})
+            return
+        if method == 'POST' and parts.path == f'{API_PATH}/bulk':
+            items = [mock.handle(call['method'], urllib.parse.urlsplit(call['path']).path,
+                                 call.get('body'), call.get('params') or {}) for call in json.loads(body)]
+            results = [{'code': status, 'body': result, 'id': call['id']}
+                       for call, (status, result) in zip(json.loads(body), items)]
+            self.send_json(207 if any(status >= 400 for status, _ in items) else 200,
+                           {'errors': any(status >= 400 for status, _ in items), 'items': results})
+            return
+        params = {name: values[-1] for name, values in urllib.parse.parse_qs(parts.query).items()}
+        status, result = mock.handle(method, parts.path, json.loads(body) if body else None, params)
+        self.send_json(status, result)
+
+    def send_json(self, status: int, body, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('X-Shop-Api-Calls', str(int(self.server.mock.bucket)))
+        self.send_header('X-Shop-Api-Limit', str(self.server.mock.bucket_size))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)
+
+class MockShoper:
+    """In-memory products behind a leaky-bucket rate limit of ``bucket_size`` calls draining at ``leak_rate``/s.
+
+    Calls over the limit get HTTP 429 with a Retry-After of ``retry_after`` seconds.
+    """
+
+    PRODUCT_PATH_RE = re.compile(rf'^{API_PATH}/products/(\d+)$')
+
+    def __init__(self, codes: Iterable[str] = (), bucket_size: int = 10, leak_rate: float = 2.0,
+                 language: str = SHOPER_CONFIG['language'], retry_after: float = 1.0):
+        self.products = {i: {'product_id': i, 'code': str(code), 'translations': {language: {'description': ''}}}
+                         for i, code in enumerate(codes, start=1)}
+        self.by_code = {product['code']: product for product in self.products.values()}
+        self.token = hashlib.sha256(str(time.time()).encode('ascii')).hexdigest()[:40]
+        self.bucket_size = bucket_size
+        self.leak_rate = leak_rate
+        self.retry_after = retry_after
+        self.bucket = 0.0
+        self.last_leak = time.monotonic()
+        self.lock = threading.Lock()
+        self.updates = 0
+
+    def take_call(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.bucket = max(0.0, self.bucket - (now - self.last_leak) * self.leak_rate)
+            self.last_leak = now
+            if self.bucket + 1 > self.bucket_size:
+                return False
+            self.bucket += 1
+            return True
+
+    def handle(self, method: str, path: str, body, params: dict) -> Tuple[int, object]:
+        if method == 'GET' and path == f'{API_PATH}/products':
+            filters = json.loads(params.get('filters') or '{}')
+            codes = (filters.get('code') or {}).get('in')
+            products = [self.by_code[code] for code in codes if code in self.by_code] if codes is not None \
+                else list(self.products.values())
+            limit, page = int(params.get('limit') or 10), int(params.get('page') or 1)
+            return 200, {
+                'count': str(len(products)),
+                'pages': max(1, -(-len(products) // limit)),
+                'page': page,
+                'list': products[(page - 1) * limit:page * limit],
+            }
+        match = self.PRODUCT_PATH_RE.match(path)
+        if match and int(match.group(1)) in self.products:
+            product = self.products[int(match.group(1))]
+            if method == 'GET':
+                return 200, product
+            if method == 'PUT':
+                with self.lock:
+                    for language, fields in (body or {}).get('translations', {}).items():
+                        product['translations'].setdefault(language, {}).update(fields)
+                    self.updates += 1
+                return 200, 1
+        if match:
+            return 404, {'error': 'object_not_found', 'error_description': 'Object does not exist'}
+        return 400, {'error': 'bad_request', 'error_description': f'Unsupported call {method} {path}'}
+
+def serve_mock(mock: MockShoper, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Start a mock shop in a background thread and return its server; its URL uses ``server.server_port``."""
+    server = ThreadingHTTPServer((host, port), MockShoperHandler)
+    server.daemon_threads = True
+    server.mock = mock
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def read_output(file_path: Union[str, Path]) -> pd.DataFrame:
+    """Read a pipeline output sheet, keeping product codes as text."""
+    file_path = Path(file_path)
+    if file_path.suffix == '.csv':
+        return pd.read_csv(file_path, delimiter=CSV_DELIMITER, dtype={'product_code': str})
+    if file_path.suffix == '.jsonl':
+        return pd.read_json(file_path, lines=True, dtype={'product_code': str})
+    if file_path.suffix == '.parquet':
+        return pd.read_parquet(file_path)
+    return pd.read_excel(file_path, dtype={'product_code': str})
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Push cleaned descriptions to the Shoper REST API.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    push = commands.add_parser('push', help='push the changed descriptions of a pipeline output')
+    push.add_argument('output', help='xlsx, csv, jsonl or parquet output of a pipeline')
+    push.add_argument('--url', default=SHOPER_CONFIG['url'], help='shop URL (default: SHOPER_URL)')
+    push.add_argument('--code-column', default='product_code')
+    push.add_argument('--description-column', default='new_description')
+    mock = commands.add_parser('mock', help='serve a local mock of the API to push to')
+    mock.add_argument('--host', default='127.0.0.1')
+    mock.add_argument('--port', type=int, default=8766)
+    mock.add_argument('--products', help='CSV whose product_code column lists the products of the mock shop')
+    mock.add_argument('--bucket-size', type=int, default=10, help='calls before the rate limit applies')
+    mock.add_argument('--leak-rate', type=float, default=2.0, help='calls per second the rate limit lets through')
+    args = parser.parse_args(argv)
+
+    ensure_directories()
+    logging.config.dictConfig(LOGGING_CONFIG)
+    if args.command == 'mock':
+        codes = pd.read_csv(args.products, delimiter=CSV_DELIMITER, usecols=['product_code'],
+                            dtype=str)['product_code'].dropna() if args.products else []
+        shop = MockShoper(codes, args.bucket_size, args.leak_rate)
+        server = serve_mock(shop, args.host, args.port)
+        logger.info(f"Mock Shoper API with {len(shop.products)} products on http://{args.host}:{server.server_port}, "
+                    f"any client id and secret authenticate")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    if not args.url:
+        logger.error("No shop URL, set SHOPER_URL or pass --url")
+        return 1
+    pusher = ShoperPush(ShoperClient(args.url))
+    try:
+        summary = pusher.push(read_output(args.output), args.code_column, 'description', args.description_column)
+    finally:
+        pusher.close()
+    return 1 if summary['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import csv
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+import pandas as pd
+from openpyxl import Workbook
+from config import CSV_DELIMITER, STREAMING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def read_csv_chunks(file_path: Union[str, Path], chunk_rows: int = STREAMING_CONFIG['chunk_rows'],
+                    delimiter: str = CSV_DELIMITER, **read_options) -> Iterator[pd.DataFrame]:
+    """Read a CSV file as a sequence of DataFrames of at most ``chunk_rows`` rows.
+
+    ``read_options`` are passed on to read_csv, e.g. the columns to read.
+    """
+    if not (os.path.isfile(file_path) and os.access(file_path, os.R_OK)):
+        raise FileNotFoundError(f"File not found or not accessible: {file_path}")
+    with pd.read_csv(file_path, delimiter=delimiter, chunksize=chunk_rows, **read_options) as reader:
+        for chunk in reader:
+            yield chunk
+
+class StreamingTableWriter:
+    """Append DataFrame chunks to an .xlsx, .csv, .jsonl or .parquet file without holding them in memory.
+
+    Excel output goes through an openpyxl write-only workbook, which spools
+    rows to a temporary file until ``close``; CSV output is appended chunk by
+    chunk using ``CSV_DELIMITER``, JSONL output one JSON object per row.
+    Parquet output needs pyarrow and writes one row group per chunk, with
+    every column as text: the type read_csv infers for a column can differ
+    from chunk to chunk, e.g. when a column is empty in the first one.
+    """
+
+    def __init__(self, file_path: Union[str, Path], delimiter: str = CSV_DELIMITER):
+        self.file_path = Path(file_path)
+        self.delimiter = delimiter
+        suffix = self.file_path.suffix.lower()
+        self.kind = 'xlsx' if suffix in ('.xlsx', '.xlsm') else suffix[1:] if suffix in ('.jsonl', '.parquet') else 'csv'
+        self.is_excel = self.kind == 'xlsx'
+        self.rows_written = 0
+        self.header_written = False
+        self.workbook: Optional[Workbook] = None
+        self.parquet_writer = None
+        self.file = None
+        os.makedirs(self.file_path.parent, exist_ok=True)
+
+        if self.is_excel:
+            self.workbook = Workbook(write_only=True)
+            self.sheet = self.workbook.create_sheet('Sheet1')
+        elif self.kind == 'csv':
+            self.file = open(self.file_path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file, delimiter=self.delimiter)
+        elif self.kind == 'jsonl':
+            self.file = open(self.file_path, 'w', encoding='utf-8')
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Append the rows of ``df``; the header is taken from the first chunk."""
+        if self.kind == 'jsonl':
+            if len(df):
+                df.to_json(self.file, orient='records', lines=True, force_ascii=False)
+        elif self.kind == 'parquet':
+            self._write_parquet(df)
+        else:
+            if not self.header_written:
+                self._append([str(column) for column in df.columns])
+                self.header_written = True
+            for row in df.itertuples(index=False, name=None):
+                self._append([self._cell_value(value) for value in row])
+        self.rows_written += len(df)
+
+    def _write_parquet(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self.parquet_writer is None:
+            schema = pa.schema([(str(column), pa.string()) for column in df.columns])
+            self.parquet_writer = pq.ParquetWriter(self.file_path, schema)
+        columns = [pa.array([self._text_value(value) for value in df[column]], type=pa.string()) for column in df.columns]
+        self.parquet_writer.write_table(pa.Table.from_arrays(columns, schema=self.parquet_writer.schema))
+
+    def _append(self, values: list) -> None:
+        if self.is_excel:
+            self.sheet.append(values)
+        else:
+            self.writer.writerow(values)
+
+    @staticmethod
+    def _cell_value(value):
+        """Write missing values as empty cells, like DataFrame.to_excel does."""
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return None
+        return value
+
+    @staticmethod
+    def _text_value(value) -> Optional[str]:
+        """Write values as text and missing values as nulls, for Parquet output."""
+        if value is None or isinstance(value, str):
+            return value
+        return None if pd.isna(value) else str(value)
+
+    def close(self) -> None:
+        """Finish the output file."""
+        if self.is_excel:
+            self.workbook.save(self.file_path)
+        elif self.parquet_writer is not None:
+            self.parquet_writer.close()
+        elif self.file is not None:
+            self.file.close()
+        logger.info(f"Successfully wrote {self.rows_written} rows to {self.file_path}")
+
+    def __enter__(self) -> 'StreamingTableWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        elif self.file is not None:
+            self.file.close()
+
+def stream_pipeline(input_file: Union[str, Path], output_file: Union[str, Path],
+                    process: Callable[[pd.DataFrame], pd.DataFrame],
+                    chunk_rows: Optional[int] = None, read_options: Optional[dict] = None) -> int:
+    """Read ``input_file`` in chunks, run ``process`` on each and append the result.
+
+    Only one chunk is held in memory at a time. ``read_options`` are passed
+    on to read_csv_chunks. Returns the number of rows written.
+    """
+    chunk_rows = chunk_rows or STREAMING_CONFIG['chunk_rows']
+    with StreamingTableWriter(output_file) as writer:
+        for i, chunk in enumerate(read_csv_chunks(input_file, chunk_rows, **(read_options or {}))):
+            result = process(chunk)
+            writer.write(result)
+            logger.info(f"Chunk {i + 1}: {len(chunk)} rows read, {len(result)} rows written")
+    return writer.rows_written
@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+import pytest
+
+# The modules live at the top level of the repository
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import FAST_PATH_CONFIG, FRAGMENT_CACHE_CONFIG, SANITIZER_CONFIG
+from fragments import shared_fragment_cache
+
+@pytest.fixture
+def tree_path(monkeypatch):
+    """Clean every description with the tree path only: no fast path, token sanitizer or fragment cache."""
+    monkeypatch.setitem(FAST_PATH_CONFIG, 'enabled', False)
+    monkeypatch.setitem(SANITIZER_CONFIG, 'enabled', False)
+    monkeypatch.setitem(FRAGMENT_CACHE_CONFIG, 'enabled', False)
+
+@pytest.fixture(autouse=True)
+def empty_fragment_cache():
+    cache = shared_fragment_cache(enabled=True)
+    if cache is not None:
+        cache.clear()
+    yield
@@ -0,0 +1,45 @@
+import pytest
+from analysis import H3_FIELD_COLUMNS, TAGS_COLUMN, analyze_columns
+from benchmark import generate_corpus
+from compatibility import extract_h3_columns
+from config import GUARD_CONFIG
+from functions import add_beta_classes, clean_description
+
+EXTRA = [
+    None,
+    '',
+    'just text',
+    '<h3><strong>Dane</strong> techniczne</h3><p class="product-info">x</p>',
+    '<h3>Wymiary: <em>10 cm</em></h3><ul><li><span>a</span></li></ul>',
+    '<div class="product-info"><h3>Opis</h3><p style="x">b</p></div><h2 class="c">Tytuł</h2>',
+    '<p>' * 20 + 'deep' + '</p>' * 20,
+]
+
+def separate_columns(descriptions):
+    """The analyses as the separate functions compute them, one parse each."""
+    h3 = extract_h3_columns([html if isinstance(html, str) else '' for html in descriptions])
+    return {
+        'new_description': [clean_description(html, 'P1') for html in descriptions],
+        'beta_description': [add_beta_classes(html) for html in descriptions],
+        **{column: h3[column] for column in H3_FIELD_COLUMNS},
+        TAGS_COLUMN: h3[TAGS_COLUMN],
+    }
+
+@pytest.mark.parametrize('guarded', [False, True])
+def test_single_parse_matches_the_separate_functions(monkeypatch, guarded):
+    descriptions = generate_corpus(80) + EXTRA
+    if guarded:
+        # The deep description is not parsed; add_beta_classes has no guard
+        # of its own, the analysis keeps the description as it is
+        monkeypatch.setitem(GUARD_CONFIG, 'max_depth', 10)
+    expected = separate_columns(descriptions)
+    if guarded:
+        expected['beta_description'][-1] = descriptions[-1]
+    assert analyze_columns([(html, 'P1') for html in descriptions]) == expected
+
+@pytest.mark.parametrize('analyses', [('clean',), ('beta', 'tags'), ('h3',)])
+def test_selected_analyses(analyses):
+    descriptions = generate_corpus(20) + EXTRA
+    expected = separate_columns(descriptions)
+    columns = analyze_columns([(html, 'P1') for html in descriptions], analyses)
+    assert columns == {column: expected[column] for column in columns}
@@ -0,0 +1,50 @@
+import catalog_index
+from catalog_index import CatalogIndex, load_index
+from config import ALLOWED_ATTRS
+
+CODES = ['P1', 'P2', 'P3', 'P4']
+DESCRIPTIONS = [
+    '<p>Etui</p>',
+    '<span style="color:red">Szkło</span>',
+    '<p><p>Kabel</p></p><br><br>',
+    '<div class="fx-iframeContainer"><iframe src="x"></iframe></div>',
+]
+
+def counting_describe(monkeypatch):
+    """Record the descriptions the index walks instead of reusing their rows."""
+    calls = []
+    describe = catalog_index.describe_structure
+
+    def recording(html, parser=None):
+        calls.append(html)
+        return describe(html, parser)
+
+    monkeypatch.setattr(catalog_index, 'describe_structure', recording)
+    return calls
+
+def test_query_flags_and_rules():
+    index = CatalogIndex.build(CODES, DESCRIPTIONS)
+    assert index.codes_where(index.flag('is_clean')) == ['P1', 'P4']
+    assert index.codes_where(index.query(rules=['convert_span_div_font'], attrs=['style'])) == ['P2']
+    assert index.codes_where(index.query(flags=['has_nested_p', 'has_consecutive_br'])) == ['P3']
+    assert index.codes_where(index.query(flags=['has_preserved_block'], without=['has_iframe'])) == ['P4']
+    assert index.codes_where(index.needs_cleaning()) == ['P2', 'P3']
+    assert index.summary()['rules']['preserve_blocks'] == 1
+
+def test_rebuild_reuses_unchanged_rows(monkeypatch, tmp_path):
+    CatalogIndex.build(CODES, DESCRIPTIONS).save(tmp_path / 'index.npz')
+    calls = counting_describe(monkeypatch)
+    descriptions = DESCRIPTIONS[:3] + ['<p>Nowy opis</p>']
+    index = CatalogIndex.build(CODES, descriptions, previous=load_index(tmp_path / 'index.npz'))
+    assert calls == ['<p>Nowy opis</p>']
+    assert index.codes_where(index.flag('is_clean')) == ['P1', 'P4']
+    assert index.codes_where(index.query(rules=['convert_span_div_font'])) == ['P2']
+
+def test_rebuild_after_config_change_indexes_everything(monkeypatch, tmp_path):
+    CatalogIndex.build(CODES, DESCRIPTIONS).save(tmp_path / 'index.npz')
+    monkeypatch.setitem(ALLOWED_ATTRS, 'p', ['class', 'id', 'style'])
+    calls = counting_describe(monkeypatch)
+    previous = load_index(tmp_path / 'index.npz')
+    index = CatalogIndex.build(CODES, DESCRIPTIONS, previous=previous)
+    assert calls == DESCRIPTIONS
+    assert index.fingerprint != previous.fingerprint
@@ -0,0 +1,56 @@
+from checkpoint import CheckpointStore
+
+def compute_counting(calls):
+    def compute(items):
+        calls.extend(items)
+        return [item.upper() for item in items]
+    return compute
+
+def test_resume_computes_only_missing_rows(tmp_path):
+    path = tmp_path / 'run.jsonl'
+    store = CheckpointStore(path, range_rows=2)
+    assert store.map_ranges([0, 1, 2], ['a', 'b', 'c'], compute_counting([])) == ['A', 'B', 'C']
+    store.close()
+
+    calls = []
+    store = CheckpointStore(path, range_rows=2, resume=True)
+    assert store.map_ranges([0, 1, 2, 3], ['a', 'b', 'c', 'd'], compute_counting(calls)) == ['A', 'B', 'C', 'D']
+    assert calls == ['d']
+    store.finish()
+    assert not path.exists()
+
+def test_run_without_resume_keeps_earlier_checkpoint(tmp_path):
+    path = tmp_path / 'run.jsonl'
+    store = CheckpointStore(path, range_rows=2)
+    store.map_ranges([0, 1], ['a', 'b'], compute_counting([]))
+    store.close()
+
+    calls = []
+    store = CheckpointStore(path, range_rows=2)
+    store.map_ranges([2], ['c'], compute_counting(calls))
+    store.close()
+    assert calls == ['c']
+
+    calls = []
+    store = CheckpointStore(path, range_rows=2, resume=True)
+    assert store.map_ranges([0, 1, 2], ['a', 'b', 'c'], compute_counting(calls)) == ['A', 'B', 'C']
+    assert calls == []
+    store.close()
+
+def test_line_cut_short_is_dropped(tmp_path):
+    path = tmp_path / 'run.jsonl'
+    store = CheckpointStore(path, range_rows=2)
+    store.map_ranges([0, 1, 2], ['a', 'b', 'c'], compute_counting([]))
+    store.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"start": 4, "end"')
+
+    store = CheckpointStore(path, range_rows=2)
+    store.close()
+    assert path.read_text(encoding='utf-8').endswith('}\n')
+
+    calls = []
+    store = CheckpointStore(path, range_rows=2, resume=True)
+    assert store.map_ranges([0, 1, 2], ['a', 'b', 'c'], compute_counting(calls)) == ['A', 'B', 'C']
+    assert calls == []
+    store.close()
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+from pathlib import Path
+import clean
+from functions import add_beta_classes, clean_description
+
+REPO = Path(__file__).resolve().parent.parent
+DIRTY = '<span style="font-size: 12pt;">Etui <b>pancernik</b></span>'
+
+def test_cleans_a_file_to_a_file(tmp_path):
+    source, target = tmp_path / 'in.html', tmp_path / 'out.html'
+    source.write_text(DIRTY, encoding='utf-8')
+    assert clean.main([str(source), '-o', str(target), '--beta-classes']) == 0
+    assert target.read_text(encoding='utf-8') == add_beta_classes(clean_description(DIRTY))
+
+def test_missing_file_fails(tmp_path):
+    assert clean.main([str(tmp_path / 'missing.html')]) == 1
+
+def test_starts_without_pandas_or_files(tmp_path):
+    code = ('import runpy, sys; sys.argv = ["clean.py", "--html", sys.argv[1]]\n'
+            'try:\n    runpy.run_path("clean.py", run_name="__main__")\n'
+            'except SystemExit:\n    pass\n'
+            'print(sorted(name for name in ("pandas", "numpy", "openpyxl") if name in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code, DIRTY], cwd=REPO, capture_output=True, text=True, check=True)
+    cleaned, imported = result.stdout.splitlines()
+    assert cleaned == clean_description(DIRTY)
+    assert imported == '[]'
@@ -0,0 +1,24 @@
+from functions import clean_description
+
+def test_preserved_block_inside_empty_img_is_kept(tree_path):
+    # html.parser nests the iframe inside the second, src-less img
+    html = '<img><img /><iframe src="x"></iframe>'
+    assert clean_description(html) == '<p><img><iframe src="x"></iframe></img></p>'
+
+def test_preserved_block_keeps_its_paragraph(tree_path):
+    html = '<p><span style="color:red"><iframe src="x"></iframe></span></p>'
+    assert clean_description(html) == '<p><iframe src="x"></iframe></p>'
+
+def test_blank_string_left_by_unwrapped_pre_in_h3_is_collapsed(tree_path):
+    assert clean_description('<h3><a>x</a><pre>\t</pre></h3>') == '<h3><em><a>x</a> </em></h3>'
+
+def test_void_tag_with_children_in_h3_is_parsed_again(tree_path):
+    # html.parser puts the text in the self-closed <img/>; parsing the h3 content again takes it out
+    html = '<h3>a<img src="a"><img src="b"/>x</h3>'
+    assert clean_description(html) == '<h3><em>a<p><img src="a"/></p><p><img src="b"/></p>x</em></h3>'
+
+def test_preserved_block_in_reparsed_h3_is_kept(tree_path):
+    html = '<h3>a<img src="a"><img src="b"/>x<iframe src="y"></iframe></h3>'
+    assert clean_description(html) == (
+        '<h3><em>a<p><img src="a"/></p><p><img src="b"/></p>x<iframe src="y"></iframe></em></h3>'
+    )
@@ -0,0 +1,43 @@
+from cache import DescriptionCache
+from checkpoint import CheckpointStore
+from config import GUARD_CONFIG
+from functions import clean_description
+from guards import PassedThrough
+from manifest import DeltaManifest
+
+NESTED = '<div>' * 30 + '<span style="color:red">x</span><iframe src="y"></iframe>' + '</div>' * 30
+
+def passed_through(monkeypatch):
+    monkeypatch.setitem(GUARD_CONFIG, 'max_depth', 10)
+    # The preserved iframe keeps the token sanitizer from cleaning it
+    result = clean_description(NESTED, 'P1')
+    assert isinstance(result, PassedThrough)
+    assert result == NESTED
+    return result
+
+def test_passthrough_is_not_cached(monkeypatch, tmp_path):
+    result = passed_through(monkeypatch)
+    cache = DescriptionCache(tmp_path / 'cache.sqlite')
+    cache.put_many('clean_html', [(NESTED, result), ('<p>a</p>', '<p>a</p>')])
+    assert cache.get_many('clean_html', [NESTED, '<p>a</p>']) == {'<p>a</p>': '<p>a</p>'}
+    cache.close()
+
+def test_passthrough_is_not_recorded(monkeypatch, tmp_path):
+    result = passed_through(monkeypatch)
+    manifest = DeltaManifest('job', tmp_path)
+    manifest.entries['P1'] = ['raw', 'cleaned']
+    assert manifest.record(['P1', 'P2'], [NESTED, 'b'], [result, 'b']) == [False, True]
+    assert list(manifest.entries) == ['P2']
+
+def test_passthrough_is_not_checkpointed(monkeypatch, tmp_path):
+    result = passed_through(monkeypatch)
+    path = tmp_path / 'run.jsonl'
+    store = CheckpointStore(path, range_rows=10)
+    store.map_ranges([0, 1], ['a', NESTED], lambda items: [item if item == 'a' else result for item in items])
+    store.close()
+
+    calls = []
+    store = CheckpointStore(path, range_rows=10, resume=True)
+    store.map_ranges([0, 1], ['a', NESTED], lambda items: calls.extend(items) or items)
+    store.close()
+    assert calls == [NESTED]
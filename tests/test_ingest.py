@@ -0,0 +1,28 @@
+import pandas as pd
+from config import INGEST_CONFIG
+from ingest import read_options
+
+CSV = 'product_code;title;description;ean;stock\n007;Etui;<p>a</p>;05901234123457;3\n'
+
+def read(path, pipeline):
+    return pd.read_csv(path, delimiter=';', **read_options(path, pipeline))
+
+def test_pipelines_read_every_column_by_default(tmp_path):
+    path = tmp_path / 'offers.csv'
+    path.write_text(CSV, encoding='utf-8')
+    assert list(read(path, 'all_offers').columns) == ['product_code', 'title', 'description', 'ean', 'stock']
+
+def test_projection_reads_listed_columns_as_text(monkeypatch, tmp_path):
+    path = tmp_path / 'offers.csv'
+    path.write_text(CSV, encoding='utf-8')
+    monkeypatch.setitem(INGEST_CONFIG['columns'], 'all_offers', ['product_code', 'description', 'ean', 'missing'])
+    df = read(path, 'all_offers')
+    assert list(df.columns) == ['product_code', 'description', 'ean']
+    assert df.loc[0, 'product_code'] == '007'
+    assert df.loc[0, 'ean'] == '05901234123457'
+
+def test_reads_descriptions_spanning_lines(tmp_path):
+    path = tmp_path / 'offers.csv'
+    path.write_text('product_code;description\n007;"<p>a</p>\n<p>""b""</p>"\n', encoding='utf-8')
+    df = read(path, 'all_offers')
+    assert df['description'].tolist() == ['<p>a</p>\n<p>"b"</p>']
@@ -0,0 +1,60 @@
+import pandas as pd
+import main
+from config import CHECKPOINT_CONFIG, PAGE_WEIGHT_CONFIG
+from guards import PassedThrough
+from manifest import DeltaManifest
+
+def saved_manifest(directory, page_weight=False):
+    manifest = DeltaManifest('job', directory, page_weight)
+    manifest.changed(['P1'], ['<p>a</p>'])
+    manifest.record(['P1'], ['<p>a</p>'], ['<p>a</p>'])
+    manifest.save()
+    return manifest
+
+def test_page_weight_mode_changes_reprocess_everything(monkeypatch, tmp_path):
+    saved_manifest(tmp_path)
+    assert DeltaManifest('job', tmp_path).changed(['P1'], ['<p>a</p>']) == [False]
+
+    saved_manifest(tmp_path, page_weight=True)
+    assert DeltaManifest('job', tmp_path).changed(['P1'], ['<p>a</p>']) == [True]
+    assert DeltaManifest('job', tmp_path, page_weight=True).changed(['P1'], ['<p>a</p>']) == [False]
+
+    monkeypatch.setitem(PAGE_WEIGHT_CONFIG, 'minify', False)
+    assert DeltaManifest('job', tmp_path, page_weight=True).changed(['P1'], ['<p>a</p>']) == [True]
+
+def test_changed_and_record(tmp_path):
+    manifest = DeltaManifest('job', tmp_path)
+    assert manifest.changed(['P1', 'P2'], ['<p>a</p>', '<span>b</span>']) == [True, True]
+    assert manifest.record(['P1', 'P2'], ['<p>a</p>', '<span>b</span>'],
+                           ['<p>a</p>', PassedThrough('<span>b</span>')]) == [True, False]
+    manifest.save()
+
+    manifest = DeltaManifest('job', tmp_path)
+    # Rows passed through over a resource limit are processed again
+    assert manifest.changed(['P1', 'P2', 'P3'], ['<p>a</p>', '<span>b</span>', None]) == [False, True, True]
+    # A new source description with the same cleaned output is not written again
+    assert manifest.record(['P1'], ['<p> a</p>'], ['<p>a</p>']) == [False]
+    assert (manifest.processed, manifest.skipped, manifest.written) == (2, 1, 0)
+
+def test_second_run_writes_only_changed_rows(monkeypatch, tmp_path):
+    input_file = tmp_path / 'offers.csv'
+    output_file = tmp_path / 'ready.csv'
+    offers = pd.DataFrame({
+        'product_code': ['P1', 'P2', 'P3'], 'title': ['Etui'] * 3, 'ean': [''] * 3,
+        'description': ['<span>a</span>', '<p><span>b</span></p>', '<span style="x">c</span>'],
+    })
+    monkeypatch.setattr(main, 'load_processed_eans', lambda offline=None: set())
+    monkeypatch.setattr(main, 'open_manifest', lambda job, enabled=None, page_weight=False:
+                        DeltaManifest(job, tmp_path / 'manifests', page_weight))
+    monkeypatch.setitem(CHECKPOINT_CONFIG, 'directory', tmp_path / 'checkpoints')
+
+    def run(descriptions):
+        offers.assign(description=descriptions).to_csv(input_file, sep=';', index=False)
+        main.generate_clean_descriptions(str(input_file), str(output_file), workers=1, use_cache=False,
+                                         output_format='csv', delta=True)
+        return pd.read_csv(output_file, sep=';', dtype=str)['product_code'].tolist()
+
+    assert run(offers['description']) == ['P1', 'P2', 'P3']
+    assert run(offers['description']) == []
+    # P2 changes but cleans to what it did before, P3 cleans to something new
+    assert run(['<span>a</span>', '<span>b</span>', '<span>d</span>']) == ['P3']
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from ingest import has_pyarrow
+from output import OUTPUT_FORMATS, output_path, write_table
+from shoper import read_output
+from streaming import StreamingTableWriter
+
+FORMATS = [pytest.param(name, marks=pytest.mark.skipif(name == 'parquet' and not has_pyarrow(), reason='needs pyarrow'))
+           for name in OUTPUT_FORMATS]
+
+def rows() -> pd.DataFrame:
+    return pd.DataFrame({
+        'product_code': ['007', 'A;1', 'B2'],
+        'description': ['<p>Ładowanie "x";\ny</p>', None, '<p>b</p>'],
+        'new_description': ['<p>Ładowanie</p>', '', '<p>b</p>'],
+    })
+
+@pytest.mark.parametrize('output_format', FORMATS)
+def test_written_rows_read_back(tmp_path, output_format):
+    written = write_table(rows(), tmp_path / 'out.xlsx', output_format)
+    path = output_path(tmp_path / 'out.xlsx', output_format)
+    assert written['path'] == str(path) and written['rows'] == 3
+    df = read_output(path)
+    assert list(df['product_code']) == ['007', 'A;1', 'B2']
+    assert df.loc[0, 'description'] == '<p>Ładowanie "x";\ny</p>'
+    assert pd.isna(df.loc[1, 'description'])
+
+@pytest.mark.parametrize('output_format', FORMATS)
+def test_streamed_chunks_match_a_single_write(tmp_path, output_format):
+    df = rows()
+    whole = write_table(df, tmp_path / 'whole.xlsx', output_format)['path']
+    streamed = output_path(tmp_path / 'streamed.xlsx', output_format)
+    with StreamingTableWriter(streamed) as writer:
+        writer.write(df.iloc[:2])
+        writer.write(df.iloc[2:])
+    assert writer.rows_written == 3
+    pd.testing.assert_frame_equal(read_output(streamed), read_output(whole))
+
+def test_parquet_chunks_with_differently_typed_columns(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'out.parquet'
+    with StreamingTableWriter(path) as writer:
+        writer.write(pd.DataFrame({'product_code': pd.Series([], dtype=object), 'ean': pd.Series([], dtype=float)}))
+        writer.write(pd.DataFrame({'product_code': ['A'], 'ean': [float('nan')]}))
+        writer.write(pd.DataFrame({'product_code': ['B', 'C'], 'ean': ['0590', 5901]}))
+    df = pd.read_parquet(path)
+    assert list(df['product_code']) == ['A', 'B', 'C']
+    assert df['ean'].isna().tolist() == [True, False, False] and list(df['ean'][1:]) == ['0590', '5901']
@@ -0,0 +1,30 @@
+from benchmark import generate_corpus
+from functions import clean_description
+from pageweight import optimize_description
+
+def test_whitespace_next_to_inline_tags_is_kept():
+    assert optimize_description('<p>a <br/> b</p>') == '<p>a <br/> b</p>'
+    assert optimize_description('<p>x <iframe src="y"></iframe> z</p>') == '<p>x <iframe loading="lazy" src="y"></iframe> z</p>'
+
+def test_whitespace_next_to_block_tags_is_dropped():
+    assert optimize_description('<h3> a  b </h3>\n<p> <strong>c</strong><strong>d</strong> </p>') \
+        == '<h3>a b</h3><p><strong>cd</strong></p>'
+
+def test_preserved_blocks_are_copied_as_they_are():
+    block = ('<div class="product-info">\n  <p>a  b</p><!-- c --><div>  <strong>x</strong><strong>y</strong></div>\n'
+             ' <a href="h" target="_self">l</a></div>')
+    assert optimize_description(block + '\n<p>  q  </p>') == block + '<p>q</p>'
+
+def test_preserved_iframes_only_get_lazy_loading():
+    html = '<div class="fx-iframeContainer"> <iframe src="v"> </iframe> </div> <p> a </p>'
+    assert (optimize_description(html)
+            == '<div class="fx-iframeContainer"> <iframe loading="lazy" src="v"> </iframe> </div><p>a</p>')
+
+def test_attributes_are_added_in_the_order_the_cleaner_writes():
+    assert (optimize_description('<p><img alt="b" src="a"/><iframe src="v" width="3"></iframe></p>')
+            == '<p><img alt="b" decoding="async" loading="lazy" src="a"/><iframe loading="lazy" src="v" width="3"></iframe></p>')
+
+def test_cleaning_optimised_output_again_keeps_it():
+    for html in generate_corpus(100):
+        optimized = optimize_description(clean_description(html))
+        assert clean_description(optimized) == optimized
@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pytest
+import main
+from benchmark import generate_corpus
+from config import CHECKPOINT_CONFIG
+from metrics import StageMetrics
+
+@pytest.fixture(scope='module')
+def offers():
+    descriptions = generate_corpus(120) + [None, '', '<p>ready</p>', '<span>x</span>']
+    return pd.DataFrame({
+        'product_code': [f'P{i:03d}' for i in range(len(descriptions))],
+        'title': ['Etui'] * len(descriptions),
+        'ean': [''] * len(descriptions),
+        'description': descriptions,
+    })
+
+def test_parallel_cleaning_matches_serial(offers):
+    serial = main.clean_descriptions(offers, 'description', 'product_code', workers=1)
+    assert main.clean_descriptions(offers, 'description', 'product_code', workers=2, chunk_size=16) == serial
+
+    stage_metrics = StageMetrics()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        shared = main.clean_descriptions(offers, 'description', 'product_code', workers=2, chunk_size=16,
+                                         stage_metrics=stage_metrics, executor=executor)
+    assert shared == serial
+    assert stage_metrics.counters['clean_html.documents'] > 0
+
+def test_parallel_analysis_matches_serial(offers):
+    serial = main.analyze_descriptions(offers, 'description', 'product_code', workers=1)
+    assert main.analyze_descriptions(offers, 'description', 'product_code', workers=2, chunk_size=16) == serial
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_parallel_pipeline_output_matches_serial(monkeypatch, tmp_path, offers, stream):
+    input_file = tmp_path / 'offers.csv'
+    offers.to_csv(input_file, sep=';', index=False)
+    monkeypatch.setattr(main, 'load_processed_eans', lambda offline=None: set())
+    monkeypatch.setitem(CHECKPOINT_CONFIG, 'directory', tmp_path / 'checkpoints')
+    outputs = []
+    for workers in (1, 2):
+        output_file = tmp_path / f'ready-{workers}.csv'
+        main.generate_clean_descriptions(str(input_file), str(output_file), workers=workers, chunk_size=16,
+                                         use_cache=False, stream=stream, stream_rows=50, output_format='csv',
+                                         delta=False)
+        outputs.append(output_file.read_text(encoding='utf-8'))
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count('P0') > 50
@@ -0,0 +1,60 @@
+"""The shortcuts past the tree path must give the same output as the tree path alone."""
+import random
+import pytest
+import metrics
+from benchmark import generate_corpus
+from config import FAST_PATH_CONFIG, FRAGMENT_CACHE_CONFIG, SANITIZER_CONFIG
+from functions import clean_description
+
+SHORTCUTS = {
+    'fast_path': (FAST_PATH_CONFIG, 'clean_html.fast_path'),
+    'token_sanitizer': (SANITIZER_CONFIG, 'clean_html.token_sanitizer'),
+    'fragment_cache': (FRAGMENT_CACHE_CONFIG, 'clean_html.fragment_hits'),
+}
+TEXT = ['etui', 'szkło', ' ', '\n', '\t', '  \n ', 'a&amp;b', '&nbsp;', 'x y', 'Cena&nbsp\n', '&copy ']
+TAGS = ['p', 'h2', 'h3', 'strong', 'em', 'b', 'span', 'div', 'font', 'a', 'ul', 'li', 'ol', 'section',
+        'pre', 'details', 'summary', 'table', 'td', 'hr', 'br', 'img']
+VOID = ['<br>', '<br/>', '<hr>', '<img src="a.jpg">', '<img>', '<img />', '<iframe src="x"></iframe>']
+# Bare entities at the end of the input decode differently from elsewhere
+TRAILING_ENTITIES = ['<span>x</span>Cena&nbsp\n', '<b>x</b>&copy ', '<p>a</p>\n<p>b</p>\nc&amp \n']
+ATTRS = ['', ' style="color:red"', ' class="c"', ' href="/x" target="_blank"', ' class="product-info"',
+         ' class="fx-iframeContainer"', ' src="s.png"']
+
+def random_markup(rng: random.Random, depth: int = 0) -> str:
+    parts = []
+    for _ in range(rng.randint(1, 4)):
+        roll = rng.random()
+        if depth < 5 and roll < 0.45:
+            tag = rng.choice(TAGS)
+            close = f'</{tag}>' if rng.random() < 0.9 else ''
+            parts.append(f'<{tag}{rng.choice(ATTRS)}>{random_markup(rng, depth + 1)}{close}')
+        elif roll < 0.65:
+            parts.append(rng.choice(VOID))
+        else:
+            parts.append(rng.choice(TEXT))
+    return ''.join(parts)
+
+@pytest.fixture(scope='module')
+def documents():
+    rng = random.Random(0)
+    return generate_corpus(60) + TRAILING_ENTITIES + [random_markup(rng) for _ in range(600)]
+
+def clean_all(monkeypatch, documents, shortcut=None):
+    for name, (config, _) in SHORTCUTS.items():
+        monkeypatch.setitem(config, 'enabled', name == shortcut)
+    stage_metrics = metrics.StageMetrics()
+    with metrics.collecting(stage_metrics):
+        results = [clean_description(html, 'P1') for html in documents]
+    return results, stage_metrics.counters
+
+@pytest.mark.parametrize('shortcut', list(SHORTCUTS))
+def test_shortcut_matches_tree_path(monkeypatch, documents, shortcut):
+    expected, _ = clean_all(monkeypatch, documents)
+    # Cleaned output goes through the pipeline again, it is what the fast path accepts
+    documents = documents + expected
+    expected = expected + clean_all(monkeypatch, expected)[0]
+
+    results, counters = clean_all(monkeypatch, documents, shortcut)
+    assert counters.get(SHORTCUTS[shortcut][1], 0) > 50
+    differing = [(html, want, got) for html, want, got in zip(documents, expected, results) if want != got]
+    assert differing == []
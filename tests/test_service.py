@@ -0,0 +1,72 @@
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import pytest
+from functions import clean_description
+from service import CleaningService, ServiceError, ServiceRequestHandler, serve_stdio
+
+DIRTY = '<div style="color: red"><span>Etui <b>pancernik</b></span><br><br></div>'
+
+def test_stdio_answers_every_line():
+    requests = [
+        {'id': 1, 'op': 'clean_html', 'document': DIRTY},
+        {'id': 2, 'op': 'clean_html', 'documents': [DIRTY, '<p>a</p>']},
+        {'id': 3, 'op': 'nope', 'document': DIRTY},
+    ]
+    stdin = io.StringIO('\n'.join(json.dumps(request) for request in requests) + '\nnot json\n{"op": "metrics"}\n')
+    stdout = io.StringIO()
+    serve_stdio(CleaningService(), stdin, stdout)
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    assert responses[0]['id'] == 1 and responses[0]['result'] == clean_description(DIRTY)
+    assert responses[1]['results'] == [clean_description(DIRTY), '<p>a</p>']
+    assert responses[2] == {'error': responses[2]['error'], 'status': 404, 'id': 3}
+    assert responses[3]['status'] == 400
+    assert responses[4]['operations']['clean_html']['documents'] == 3
+
+def test_batches_over_the_limit_are_refused():
+    with pytest.raises(ServiceError) as error:
+        CleaningService(max_batch=2).handle({'op': 'clean_html', 'documents': ['a', 'b', 'c']})
+    assert error.value.status == 413
+
+def post(url, body):
+    request = urllib.request.Request(url, json.dumps(body).encode('utf-8'), method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, dict(response.headers), json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), json.loads(e.read())
+
+@pytest.fixture
+def http_service():
+    servers = []
+
+    def start(service):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), ServiceRequestHandler)
+        server.daemon_threads = True
+        server.service = service
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_http_cleans_on_the_operation_path(http_service):
+    url = http_service(CleaningService())
+    status, _, body = post(f'{url}/clean_html', {'id': 'a', 'document': DIRTY})
+    assert status == 200
+    assert body['id'] == 'a' and body['result'] == clean_description(DIRTY)
+
+def test_http_refuses_requests_over_the_pending_limit(http_service):
+    service = CleaningService(max_pending=1)
+    service.pending.acquire()   # a request in progress
+    url = http_service(service)
+    status, headers, _ = post(f'{url}/clean_html', {'document': DIRTY})
+    assert status == 503 and headers['Retry-After'] == '1'
+    assert service.metrics()['rejected'] == 1
@@ -0,0 +1,75 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import pytest
+import main
+from sheets import SheetSnapshot, load_processed_eans, normalize_ean
+
+SHEET = b'ean,name\n5901234123457,Etui\n0012345678905,Kabel\n'
+
+@pytest.fixture
+def sheet_server():
+    """Serve the sheet with an ETag, answering 304 when the client already has it."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(dict(self.headers))
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', '"v1"')
+            self.send_header('Content-Length', str(len(SHEET)))
+            self.end_headers()
+            self.wfile.write(SHEET)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/export', requests
+    server.shutdown()
+
+def test_snapshot_is_downloaded_only_when_stale_or_changed(sheet_server, tmp_path):
+    url, requests = sheet_server
+    snapshot = SheetSnapshot(url, tmp_path / 'sheet.csv', max_age_hours=1, timeout=5)
+    assert snapshot.read()['ean'].tolist() == ['5901234123457', '0012345678905']
+    assert len(requests) == 1
+
+    # A fresh snapshot is read without asking the server
+    snapshot.read()
+    assert len(requests) == 1
+
+    # A stale one is revalidated with its ETag; the unchanged sheet is not sent again
+    stale = snapshot.path.stat().st_mtime - 2 * 3600
+    os.utime(snapshot.path, (stale, stale))
+    assert snapshot.read()['name'].tolist() == ['Etui', 'Kabel']
+    assert len(requests) == 2 and requests[1]['If-None-Match'] == '"v1"'
+    assert snapshot.is_fresh()
+
+def test_previous_snapshot_is_used_when_the_download_fails(sheet_server, tmp_path):
+    url, _ = sheet_server
+    SheetSnapshot(url, tmp_path / 'sheet.csv', timeout=5).refresh()
+    snapshot = SheetSnapshot('http://127.0.0.1:1/export', tmp_path / 'sheet.csv', max_age_hours=0, timeout=5)
+    assert load_processed_eans(snapshot=snapshot) == {'5901234123457', '0012345678905'}
+    assert load_processed_eans(offline=True, snapshot=SheetSnapshot(url, tmp_path / 'none.csv')) is None
+
+def test_normalize_ean():
+    assert normalize_ean(5901234123457.0) == '5901234123457'
+    assert normalize_ean('0012345678905') == '0012345678905'
+    assert normalize_ean(float('nan')) == normalize_ean(None) == normalize_ean('nan') == ''
+
+def test_offers_with_processed_eans_are_skipped():
+    offers = pd.DataFrame({
+        'product_code': [1, 2, 3, 4],
+        'title': ['Etui', 'Kabel', 'Szkło', 'Ładowarka'],
+        'description': ['<span>a</span>', '<span>b</span>', '<span>c</span>', '<p>d</p>'],
+        'ean': [5901234123457.0, 12345678905.0, float('nan'), 4006381333931.0],
+    })
+    selected = main.select_offers_to_clean(offers, {'5901234123457', '4006381333931'})
+    assert selected['product_code'].tolist() == ['2', '3']
+    assert main.select_offers_to_clean(offers, set())['product_code'].tolist() == ['1', '2', '3']
@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+import main
+from config import CHECKPOINT_CONFIG
+from shoper import MockShoper, PushLog, ShoperClient, ShoperPush, serve_mock
+
+CODES = [f'P{i:03d}' for i in range(60)]
+
+@pytest.fixture
+def shop():
+    mock = MockShoper(CODES[:55], bucket_size=2, leak_rate=20, retry_after=0.02)
+    server = serve_mock(mock)
+    yield mock, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+def open_push(url, tmp_path):
+    return ShoperPush(ShoperClient(url, 'id', 'secret', max_retries=20, backoff_seconds=0.01), PushLog(tmp_path / 'push.sqlite'))
+
+def output_rows():
+    return pd.DataFrame({
+        'product_code': CODES,
+        'description': ['<p>old</p>'] * len(CODES),
+        'new_description': [f'<p>new {code}</p>' for code in CODES],
+    })
+
+def description(mock, code):
+    return mock.by_code[code]['translations']['pl_PL']['description']
+
+def test_push_retries_rate_limited_calls(shop, tmp_path):
+    mock, url = shop
+    df = output_rows()
+    df.loc[1, 'new_description'] = '<p>old</p>'
+    pusher = open_push(url, tmp_path)
+    try:
+        assert pusher.push(df) == {'pushed': 54, 'skipped': 0, 'missing': 5, 'failed': 0}
+        assert pusher.client.retries > 0
+    finally:
+        pusher.close()
+    assert mock.updates == 54
+    assert description(mock, 'P000') == '<p>new P000</p>'
+    assert description(mock, 'P001') == ''
+
+def test_rerun_skips_descriptions_pushed_before(shop, tmp_path):
+    mock, url = shop
+    df = output_rows()
+    pusher = open_push(url, tmp_path)
+    try:
+        pusher.push(df)
+        assert pusher.push(df)['skipped'] == 55
+        df.loc[0, 'new_description'] = '<p>newer</p>'
+        assert pusher.push(df)['pushed'] == 1
+    finally:
+        pusher.close()
+    assert mock.updates == 56
+    assert description(mock, 'P000') == '<p>newer</p>'
+
+def test_pipeline_pushes_once_after_the_output_is_saved(monkeypatch, tmp_path):
+    input_file = tmp_path / 'offers.csv'
+    output_file = tmp_path / 'ready.csv'
+    pd.DataFrame({
+        'product_code': CODES[:4], 'title': ['Etui'] * 4, 'ean': [''] * 4,
+        'description': [f'<p><span>{code}</span></p>' for code in CODES[:4]],
+    }).to_csv(input_file, sep=';', index=False)
+    pushes = []
+
+    class RecordingPush:
+        def push(self, df, code_column, description_column, new_column):
+            pushes.append((output_file.exists(), list(df[code_column])))
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(main, 'open_shoper_push', lambda enabled: RecordingPush())
+    monkeypatch.setattr(main, 'load_processed_eans', lambda offline=None: set())
+    monkeypatch.setitem(CHECKPOINT_CONFIG, 'directory', tmp_path / 'checkpoints')
+    main.generate_clean_descriptions(str(input_file), str(output_file), workers=1, output_format='csv',
+                                     stream=True, stream_rows=2, push=True)
+    assert pushes == [(True, CODES[:4])]